@@ -0,0 +1,321 @@
+"""
+Benchmarks for Shared Interest scoring, binarization and dataset loading.
+
+Run from the repository root:
+    python -m benchmarks.benchmark                    # compare to the baseline
+    python -m benchmarks.benchmark --update-baseline  # record a new baseline
+
+Each case reports its throughput in instances per second and the peak memory
+allocated while it runs. The baseline is machine specific, so it is written
+to benchmarks/baseline.json, which is not checked in; record one on the
+machine that runs the comparison. The command exits with status 1 if any case
+is slower or allocates more than its baseline by more than the tolerance.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from PIL import Image
+
+from shared_interest.box_scoring import box_shared_interest
+from shared_interest.datasets.box_geometry import rasterize_boxes
+from shared_interest.scoring_functions import SCORING_FUNCTIONS
+from shared_interest.shared_interest import shared_interest
+from shared_interest import util
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+BATCH_SIZES = (16, 64)
+RESOLUTIONS = (64, 224)
+DTYPES = ('float32', 'float64')
+SALIENCY_KINDS = ('binary', 'continuous')
+
+ANNOTATION = """<annotation>
+    <size><width>%d</width><height>%d</height><depth>3</depth></size>
+    <object><bndbox>
+        <xmin>%d</xmin><ymin>%d</ymin><xmax>%d</xmax><ymax>%d</ymax>
+    </bndbox></object>
+</annotation>"""
+
+
+def scoring_cases(batch_sizes, resolutions, dtypes):
+    """
+    Yields (name, num_instances, function) cases for every registered score
+        over the sweep. Continuous saliency is only swept for scores that
+        accept it.
+    """
+    for batch_size, resolution, dtype, kind in itertools.product(
+            batch_sizes, resolutions, dtypes, SALIENCY_KINDS):
+        ground_truth, saliency = _features(batch_size, resolution, dtype)
+        if kind == 'binary':
+            saliency = (saliency > 0.5).astype(dtype)
+        for score, scoring_function in SCORING_FUNCTIONS.items():
+            if kind == 'continuous' and scoring_function.binary_saliency:
+                continue
+            name = 'score/%s/b%d/r%d/%s/%s' %(score, batch_size, resolution,
+                                              dtype, kind)
+            yield name, batch_size, (
+                lambda ground_truth=ground_truth, saliency=saliency,
+                score=score: shared_interest(ground_truth, saliency,
+                                             score=score))
+        if kind == 'binary':
+            name = 'score/all/b%d/r%d/%s/%s' %(batch_size, resolution, dtype,
+                                               kind)
+            yield name, batch_size, (
+                lambda ground_truth=ground_truth, saliency=saliency:
+                shared_interest(ground_truth, saliency, score='all'))
+
+
+def box_cases(batch_sizes, resolutions, dtypes):
+    """
+    Yields (name, num_instances, function) cases that score ground truth
+        boxes with box_shared_interest and, for comparison, with
+        shared_interest on the rasterized boxes.
+    """
+    for batch_size, resolution, dtype, kind in itertools.product(
+            batch_sizes, resolutions, dtypes, SALIENCY_KINDS):
+        boxes = _boxes(batch_size, resolution)
+        _, saliency = _features(batch_size, resolution, dtype)
+        score = 'all'
+        if kind == 'binary':
+            saliency = (saliency > 0.5).astype(dtype)
+        else:
+            score = 'saliency_coverage'
+        suffix = '%s/b%d/r%d/%s/%s' %(score, batch_size, resolution, dtype,
+                                      kind)
+        yield 'box/' + suffix, batch_size, (
+            lambda boxes=boxes, saliency=saliency, score=score:
+            box_shared_interest(boxes, saliency, score=score))
+        yield 'box_dense/' + suffix, batch_size, (
+            lambda boxes=boxes, saliency=saliency, score=score,
+            resolution=resolution: shared_interest(
+                np.stack([rasterize_boxes(instance_boxes, resolution,
+                                          resolution)
+                          for instance_boxes in boxes]),
+                saliency, score=score))
+
+
+def binarization_cases(batch_sizes, resolutions, dtypes):
+    """Yields (name, num_instances, function) cases for the binarizers."""
+    for batch_size, resolution, dtype in itertools.product(
+            batch_sizes, resolutions, dtypes):
+        _, saliency = _features(batch_size, resolution, dtype)
+        suffix = 'b%d/r%d/%s' %(batch_size, resolution, dtype)
+        yield 'binarize_percentile/' + suffix, batch_size, (
+            lambda saliency=saliency: util.binarize_percentile(saliency, 0.8))
+        yield 'binarize_std/' + suffix, batch_size, (
+            lambda saliency=saliency: util.binarize_std(saliency, 1))
+        yield 'binarize/' + suffix, batch_size, (
+            lambda saliency=saliency: util.binarize(saliency, percentile=0.8,
+                                                    dtype=dtype))
+
+
+def dataset_cases(directory, num_images=64, image_size=256):
+    """
+    Yields (name, num_instances, function) cases that load every item of a
+        synthetic ImageNet tree written to directory.
+    """
+    # torch is only needed for the dataset cases.
+    from torchvision import transforms
+    from shared_interest.datasets.annotation_index import build_annotation_index
+    from shared_interest.datasets.imagenet import ImageNet
+
+    image_path, ground_truth_path = _write_dataset(directory, num_images,
+                                                   image_size)
+    index_path = os.path.join(directory, 'index')
+    build_annotation_index(ground_truth_path, index_path)
+    transform = transforms.Compose([transforms.Resize(224),
+                                    transforms.CenterCrop(224),
+                                    transforms.ToTensor()])
+    ground_truth_transform = transforms.Compose([
+        transforms.Lambda(lambda ground_truth: ground_truth.unsqueeze(0)),
+        transforms.Resize(224, transforms.InterpolationMode.NEAREST),
+        transforms.CenterCrop(224)])
+    datasets = {
+        'xml': ImageNet(image_path, ground_truth_path, transform,
+                        ground_truth_transform),
+        'index': ImageNet(image_path, ground_truth_path, transform,
+                          annotation_index=index_path,
+                          ground_truth_resize=224, ground_truth_crop=224),
+    }
+    for source, dataset in datasets.items():
+        yield 'dataset/%s/n%d/r%d' %(source, num_images, image_size), \
+            num_images, (lambda dataset=dataset:
+                         [dataset[i] for i in range(len(dataset))])
+
+
+def run_case(function, num_instances, repeats):
+    """
+    Times function and measures its peak allocation.
+
+    Args:
+    function: the case to run, taking no arguments.
+    num_instances: the number of instances function processes per call.
+    repeats: the number of timed calls. The fastest one is reported.
+
+    Returns: A dictionary with 'throughput' in instances per second and
+        'peak_bytes', the peak memory traced by tracemalloc during one call.
+    """
+    function()  # Warm up caches and lazy imports.
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'throughput': num_instances / min(times),
+            'peak_bytes': peak_bytes}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns the regressions of results against baseline as a list of
+        messages. A case regresses if its throughput is lower, or its peak
+        memory higher, than the baseline by more than tolerance (a fraction).
+        Cases missing from the baseline are not compared.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]
+        if result['throughput'] < expected['throughput'] * (1 - tolerance):
+            regressions.append(
+                '%s: throughput %.1f/s is below the baseline %.1f/s'
+                %(name, result['throughput'], expected['throughput']))
+        if result['peak_bytes'] > expected['peak_bytes'] * (1 + tolerance):
+            regressions.append(
+                '%s: peak memory %d bytes is above the baseline %d bytes'
+                %(name, result['peak_bytes'], expected['peak_bytes']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='the baseline JSON file.')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='write the results to the baseline file instead \
+                        of comparing against it.')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='the allowed fractional regression.')
+    parser.add_argument('--repeats', type=int, default=5,
+                        help='the number of timed calls per case.')
+    parser.add_argument('--filter', default='',
+                        help='only run cases whose name contains this.')
+    parser.add_argument('--quick', action='store_true',
+                        help='run the smallest batch size and resolution.')
+    parser.add_argument('--skip-dataset', action='store_true',
+                        help='skip the dataset loading cases.')
+    args = parser.parse_args(argv)
+
+    batch_sizes, resolutions = BATCH_SIZES, RESOLUTIONS
+    if args.quick:
+        batch_sizes, resolutions = BATCH_SIZES[:1], RESOLUTIONS[:1]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        cases = itertools.chain(
+            scoring_cases(batch_sizes, resolutions, DTYPES),
+            box_cases(batch_sizes, resolutions, DTYPES),
+            binarization_cases(batch_sizes, resolutions, DTYPES),
+            () if args.skip_dataset else dataset_cases(directory))
+        for name, num_instances, function in cases:
+            if args.filter not in name:
+                continue
+            results[name] = run_case(function, num_instances, args.repeats)
+            print('%-56s %12.1f/s %10.1f MiB'
+                  %(name, results[name]['throughput'],
+                    results[name]['peak_bytes'] / 2**20))
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.isfile(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print('Wrote %d results to %s.' %(len(results), args.baseline))
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        print('No baseline at %s; run with --update-baseline to record one.'
+              %args.baseline)
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print('REGRESSION ' + regression)
+    return 1 if regressions else 0
+
+
+def _features(batch_size, resolution, dtype):
+    """Returns random ground truth boxes and saliency of the given size."""
+    random_state = np.random.RandomState(0)
+    ground_truth = np.zeros((batch_size, resolution, resolution), dtype=dtype)
+    for i in range(batch_size):
+        top, left = random_state.randint(0, resolution // 2, size=2)
+        height, width = random_state.randint(1, resolution // 2, size=2)
+        ground_truth[i, top:top + height, left:left + width] = 1
+    saliency = random_state.rand(batch_size, resolution,
+                                 resolution).astype(dtype)
+    return ground_truth, saliency
+
+
+def _boxes(batch_size, resolution, max_boxes=3):
+    """
+    Returns a list of batch_size random (num_boxes, 4) arrays of boxes, some
+        of which overlap or extend past the image.
+    """
+    random_state = np.random.RandomState(0)
+    boxes = []
+    for _ in range(batch_size):
+        num_boxes = random_state.randint(1, max_boxes + 1)
+        corners = random_state.randint(-resolution // 8, resolution * 9 // 8,
+                                       size=(num_boxes, 2, 2))
+        boxes.append(np.concatenate([corners.min(axis=1),
+                                     corners.max(axis=1)], axis=1))
+    return boxes
+
+
+def _write_dataset(directory, num_images, image_size, num_labels=4):
+    """
+    Writes a synthetic ImageFolder of random images and one-box ImageNet
+        annotations, and returns the image path and the ground truth path.
+    """
+    random_state = np.random.RandomState(0)
+    image_path = os.path.join(directory, 'images')
+    ground_truth_path = os.path.join(directory, 'annotations')
+    for i in range(num_images):
+        label = str(i % num_labels)
+        os.makedirs(os.path.join(image_path, label), exist_ok=True)
+        os.makedirs(os.path.join(ground_truth_path, label), exist_ok=True)
+        pixels = random_state.randint(0, 256, (image_size, image_size, 3))
+        Image.fromarray(pixels.astype(np.uint8)).save(
+            os.path.join(image_path, label, 'image_%d.JPEG' %i))
+        xmin, ymin = random_state.randint(0, image_size // 2, size=2)
+        xmax, ymax = random_state.randint(image_size // 2, image_size, size=2)
+        with open(os.path.join(ground_truth_path, label,
+                               'image_%d.xml' %i), 'w') as f:
+            f.write(ANNOTATION %(image_size, image_size, xmin, ymin, xmax,
+                                 ymax))
+    return image_path, ground_truth_path
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,5 +7,7 @@ setup(name='shared_interest',
       author='Angie Boggust',
       author_email='aboggust@mit.edu',
       license='MIT',
-      packages=['shared_interest'],
+      packages=['shared_interest', 'shared_interest.datasets'],
+      entry_points={'console_scripts': [
+          'shared-interest=shared_interest.cli:main']},
       zip_safe=False)
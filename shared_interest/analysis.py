@@ -0,0 +1,131 @@
+"""Vectorized grouped analysis of Shared Interest scores."""
+
+import numpy as np
+
+
+# The recurring patterns of model behavior from the Shared Interest paper.
+# Correct and incorrect predictions have one pattern each per rule in
+# categorize, in that order.
+PATTERNS = ('human_aligned', 'sufficient_subset', 'sufficient_context',
+            'context_dependent', 'confuser', 'insufficient_subset',
+            'context_confusion', 'distractor')
+
+
+def categorize(scores, labels, predictions, iou_threshold=0.5,
+               saliency_coverage_threshold=0.5,
+               ground_truth_coverage_threshold=0.5):
+    """
+    Assigns every instance to a recurring pattern by thresholding its scores.
+        The first matching rule decides the pattern:
+        1. high IoU Coverage: human_aligned if correct, else confuser.
+        2. high Saliency Coverage: sufficient_subset if correct, else
+           insufficient_subset.
+        3. high Ground Truth Coverage: sufficient_context if correct, else
+           context_confusion.
+        4. otherwise: context_dependent if correct, else distractor.
+
+    Args:
+    scores: A dictionary mapping 'iou_coverage', 'saliency_coverage', and
+        'ground_truth_coverage' to arrays of size (num_instances), as returned
+        by shared_interest with score='all'.
+    labels: An array of size (num_instances) of labels.
+    predictions: An array of size (num_instances) of predicted labels.
+    iou_threshold: The IoU Coverage at or above which it is high.
+    saliency_coverage_threshold: The Saliency Coverage at or above which it is
+        high.
+    ground_truth_coverage_threshold: The Ground Truth Coverage at or above
+        which it is high.
+
+    Returns: An int8 numpy array of size (num_instances) of indices into
+        PATTERNS.
+    """
+    correct = np.asarray(labels) == np.asarray(predictions)
+    rule = np.select(
+        [np.asarray(scores['iou_coverage']) >= iou_threshold,
+         np.asarray(scores['saliency_coverage'])
+         >= saliency_coverage_threshold,
+         np.asarray(scores['ground_truth_coverage'])
+         >= ground_truth_coverage_threshold],
+        [0, 1, 2], default=3)
+    return np.where(correct, rule, rule + 4).astype(np.int8)
+
+
+def group_statistics(values, *keys, quantiles=(0.25, 0.5, 0.75), bins=10,
+                     value_range=(0, 1)):
+    """
+    Computes statistics of values per group with segmented reductions, without
+        looping over the groups. NaN values, such as scores of empty masks, are
+        left out of every statistic.
+
+    Args:
+    values: An array of size (num_instances) of values, such as scores.
+    *keys: One or more arrays of size (num_instances) whose combined values
+        define the groups, such as labels and correctness.
+    quantiles: The quantiles to compute per group, interpolated linearly like
+        np.quantile. Defaults to (0.25, 0.5, 0.75).
+    bins: The number of equal-width histogram bins. Defaults to 10.
+    value_range: The (min, max) range of the histogram. Values outside it are
+        not counted. Defaults to (0, 1).
+
+    Returns: A dictionary with:
+        'groups': a tuple of arrays of size (num_groups) holding each group's
+            key values, in sorted order.
+        'count', 'mean', 'std', 'min', 'max': arrays of size (num_groups).
+        'quantiles': an array of size (num_groups, len(quantiles)).
+        'histogram': an int64 array of size (num_groups, bins).
+        'bin_edges': an array of size (bins + 1).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    keys = [np.asarray(key) for key in keys]
+    finite = ~np.isnan(values)
+    values = values[finite]
+    keys = [key[finite] for key in keys]
+
+    # Factorize the keys into one dense group code per instance.
+    codes = np.zeros(len(values), dtype=np.int64)
+    key_values = []
+    for key in keys:
+        unique, inverse = np.unique(key, return_inverse=True)
+        codes = codes * len(unique) + inverse.reshape(-1)
+        key_values.append(unique)
+    group_codes, groups = np.unique(codes, return_inverse=True)
+    groups = groups.reshape(-1)
+    num_groups = len(group_codes)
+    group_keys = []
+    for unique in reversed(key_values):
+        group_keys.append(unique[group_codes % len(unique)])
+        group_codes = group_codes // len(unique)
+    group_keys = tuple(reversed(group_keys))
+
+    count = np.bincount(groups, minlength=num_groups)
+    mean = np.bincount(groups, weights=values, minlength=num_groups) / count
+    squared_error = (values - mean[groups]) ** 2
+    std = np.sqrt(np.bincount(groups, weights=squared_error,
+                              minlength=num_groups) / count)
+
+    # Sort by group, then value, so each group is a sorted segment.
+    order = np.lexsort((values, groups))
+    sorted_values = values[order]
+    starts = np.cumsum(count) - count
+    minimum = sorted_values[starts]
+    maximum = sorted_values[starts + count - 1]
+    positions = starts[:, None] + np.asarray(quantiles)[None, :] \
+        * (count[:, None] - 1)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.minimum(lower + 1, (starts + count - 1)[:, None])
+    fraction = positions - lower
+    group_quantiles = sorted_values[lower] + \
+        (sorted_values[upper] - sorted_values[lower]) * fraction
+
+    low, high = value_range
+    bin_edges = np.linspace(low, high, bins + 1)
+    in_range = (values >= low) & (values <= high)
+    bin_index = np.minimum(((values[in_range] - low) / (high - low)
+                            * bins).astype(np.int64), bins - 1)
+    histogram = np.bincount(groups[in_range] * bins + bin_index,
+                            minlength=num_groups * bins)
+    histogram = histogram.reshape(num_groups, bins)
+
+    return {'groups': group_keys, 'count': count, 'mean': mean, 'std': std,
+            'min': minimum, 'max': maximum, 'quantiles': group_quantiles,
+            'histogram': histogram, 'bin_edges': bin_edges}
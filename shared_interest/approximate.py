@@ -0,0 +1,196 @@
+"""Approximate Shared Interest scores with error bounds from pooled tiles."""
+
+import collections
+import numpy as np
+
+from shared_interest import backend
+from shared_interest import scoring_functions
+from shared_interest.shared_interest import _convert_to_numpy, _is_binary
+from shared_interest.shared_interest import _score_names
+from shared_interest.shared_interest import shared_interest
+
+
+ApproximateScores = collections.namedtuple(
+    'ApproximateScores', ['estimate', 'lower', 'upper', 'refined'])
+
+
+@backend.accepts_tensors
+def approximate_shared_interest(ground_truth_features, saliency_features,
+                                score='iou_coverage', tile_size=8,
+                                refine_threshold=None):
+    """
+    Returns estimates and guaranteed bounds of the Shared Interest scores,
+        computed from tile_size x tile_size tiles instead of single features.
+        Each tile keeps only its ground truth count, its saliency sum, and its
+        largest saliency value, which bound the intersection of the tile:
+            max(0, saliency_sum - (area - ground_truth_count) * max_saliency)
+            <= intersection
+            <= min(saliency_sum, ground_truth_count * max_saliency)
+        The estimate assumes the saliency of a tile is spread uniformly over
+        it. The ground truth size and saliency mass are exact, and every score
+        computed from them grows with the intersection, so the bounds of the
+        intersection give bounds of the scores.
+
+    Args:
+    ground_truth_features: A binary array of size (batch_size, height, width)
+        representing the ground truth features.
+    saliency_features: An array of size (batch_size, height, width)
+        representing the saliency features, as in shared_interest.
+    score: A score name, a list of score names, or 'all'. Only scores
+        registered with ('intersection', denominator) statistics can be
+        bounded.
+    tile_size: The height and width of the tiles. Tiles at the bottom and
+        right edges may be smaller. Defaults to 8.
+    refine_threshold: None, a score threshold, or a dictionary mapping score
+        names to thresholds. Instances whose bounds of a score contain its
+        threshold are rescored exactly with shared_interest, so every instance
+        is classified against the threshold correctly. Defaults to None.
+
+    Raises:
+        ValueError if a score cannot be bounded.
+        ValueError if ground_truth_features is not binary, or saliency is not
+            binary and a score requires binary saliency.
+
+    Returns: An ApproximateScores tuple of numpy arrays of size (batch_size):
+        the estimate, lower and upper bounds, and whether each instance was
+        refined, in which case all three equal its exact score. If score is a
+        list or 'all', a dictionary mapping each score name to its
+        ApproximateScores.
+    """
+    ground_truth_features = _convert_to_numpy(ground_truth_features)
+    saliency_features = _convert_to_numpy(saliency_features)
+    ground_truth_features = scoring_functions._dense(ground_truth_features)
+    saliency_features = scoring_functions._dense(saliency_features)
+    score_names = _score_names(score)
+    for name in score_names:
+        statistics = scoring_functions.SCORING_FUNCTIONS[name].statistics
+        if statistics is None or statistics[0] != 'intersection':
+            raise ValueError('%s cannot be bounded from tiles.' %(name))
+    if ground_truth_features.shape != saliency_features.shape:
+        raise ValueError('ground_truth_features and saliency_features must \
+                         be the same shape.')
+    if not _is_binary(ground_truth_features):
+        raise ValueError('ground_truth_features must be binary array.')
+    saliency_is_binary = _is_binary(saliency_features)
+    if not saliency_is_binary:
+        if any(scoring_functions.SCORING_FUNCTIONS[name].binary_saliency
+               for name in score_names):
+            raise ValueError('Non-binary saliency features can only use \
+                             saliency_coverage score.')
+        saliency_features = np.abs(saliency_features)
+
+    area, ground_truth_count, saliency_sum, saliency_max = _tile_statistics(
+        ground_truth_features, saliency_features, tile_size,
+        saliency_is_binary)
+    ground_truth_size = ground_truth_count.sum(axis=(1, 2))
+    saliency_mass = saliency_sum.sum(axis=(1, 2))
+    lower = np.maximum(
+        saliency_sum - (area - ground_truth_count) * saliency_max, 0)
+    upper = np.minimum(saliency_sum, ground_truth_count * saliency_max)
+    estimate = np.clip(ground_truth_count * saliency_sum / area, lower, upper)
+    intersections = [intersection.sum(axis=(1, 2))
+                     for intersection in (estimate, lower, upper)]
+
+    results = {}
+    for name in score_names:
+        estimate, lower, upper = [
+            scoring_functions._scores_from_statistics(
+                {'intersection': intersection,
+                 'union': ground_truth_size + saliency_mass - intersection,
+                 'ground_truth_size': ground_truth_size,
+                 'saliency_mass': saliency_mass}, [name])[name]
+            for intersection in intersections]
+        results[name] = [estimate, lower, upper]
+
+    # Refine every instance whose bounds contain a threshold.
+    refined = np.zeros(len(ground_truth_features), dtype=bool)
+    if refine_threshold is not None:
+        for name in score_names:
+            threshold = refine_threshold
+            if isinstance(refine_threshold, dict):
+                if name not in refine_threshold:
+                    continue
+                threshold = refine_threshold[name]
+            _, lower, upper = results[name]
+            refined |= (lower <= threshold) & (upper >= threshold) \
+                & (lower != upper)
+    if refined.any():
+        exact = shared_interest(ground_truth_features[refined],
+                                saliency_features[refined],
+                                score=score_names, validate=False)
+        for name in score_names:
+            for values in results[name]:
+                values[refined] = exact[name]
+
+    results = {name: ApproximateScores(*values, refined.copy())
+               for name, values in results.items()}
+    if isinstance(score, str) and score != 'all':
+        return results[score]
+    return results
+
+
+def _tile_statistics(ground_truth_features, saliency_features, tile_size,
+                     saliency_is_binary):
+    """
+    Pools the features into tiles.
+
+    Returns: The number of features in each tile as an array of size
+        (1, tiles_high, tiles_wide), and the ground truth count, saliency sum,
+        and saliency maximum of each tile as float64 arrays of size
+        (batch_size, tiles_high, tiles_wide). The maximum of binary saliency is
+        1 exactly where its sum is positive, so it is not pooled.
+    """
+    height, width = ground_truth_features.shape[1:]
+    row_sizes = np.diff(np.append(np.arange(0, height, tile_size), height))
+    column_sizes = np.diff(np.append(np.arange(0, width, tile_size), width))
+    area = np.outer(row_sizes, column_sizes)[None]
+
+    # Binary bool and uint8 features are counted exactly in the smallest
+    # integer type that holds a whole tile, to keep the pooling memory-light.
+    # Other integer features are summed exactly in int64 where they cast to
+    # it safely.
+    def count_dtype(features, is_binary):
+        if is_binary and features.dtype in (np.bool_, np.uint8) \
+                and tile_size < 256:
+            return np.uint16
+        if features.dtype == bool or (np.issubdtype(features.dtype, np.integer)
+                                      and np.can_cast(features.dtype,
+                                                      np.int64)):
+            return np.int64
+        return np.float64
+
+    ground_truth_count = _pool(np.add, ground_truth_features, tile_size,
+                               count_dtype(ground_truth_features, True))
+    ground_truth_count = ground_truth_count.astype(np.float64, copy=False)
+    saliency_sum = _pool(np.add, saliency_features, tile_size,
+                         count_dtype(saliency_features, saliency_is_binary))
+    saliency_sum = saliency_sum.astype(np.float64, copy=False)
+    if saliency_is_binary:
+        saliency_max = (saliency_sum > 0).astype(np.float64)
+    else:
+        saliency_max = _pool(np.maximum, saliency_features, tile_size,
+                             saliency_features.dtype).astype(np.float64)
+    return area, ground_truth_count, saliency_sum, saliency_max
+
+
+def _pool(ufunc, features, tile_size, dtype):
+    """
+    Reduces the tile_size x tile_size tiles of a (batch_size, height, width)
+        array with ufunc. Each axis is reduced by combining its tile_size
+        strided phases, so every step works on whole contiguous rows instead
+        of reducing many short segments.
+    """
+    pooled = features
+    for axis in [1, 2]:
+        index = [slice(None)] * 3
+        index[axis] = slice(0, None, tile_size)
+        result = pooled[tuple(index)].astype(dtype)
+        for phase in range(1, min(tile_size, pooled.shape[axis])):
+            index[axis] = slice(phase, None, tile_size)
+            part = pooled[tuple(index)]
+            # The last tile is short when tile_size does not divide the axis.
+            target = [slice(None)] * 3
+            target[axis] = slice(0, part.shape[axis])
+            ufunc(result[tuple(target)], part, out=result[tuple(target)])
+        pooled = result
+    return pooled
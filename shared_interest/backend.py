@@ -0,0 +1,67 @@
+"""Zero-copy handling of PyTorch tensors passed to Shared Interest."""
+
+import functools
+import sys
+import numpy as np
+
+
+def is_tensor(array):
+    """
+    Checks if array is a torch.Tensor. torch is never imported here: if it has
+    not been imported by the caller, array cannot be a tensor.
+    """
+    torch = sys.modules.get('torch')
+    return torch is not None and isinstance(array, torch.Tensor)
+
+
+def to_numpy(array):
+    """
+    Returns a numpy view of a CPU tensor, sharing its memory. Tensors on other
+    devices are copied to the CPU first. Other inputs are returned unchanged.
+    """
+    if is_tensor(array):
+        return array.detach().cpu().numpy()
+    return array
+
+
+def from_numpy(result, reference):
+    """
+    Returns result as a tensor on the device of reference. numpy arrays on the
+    CPU are wrapped without copying. Dictionaries and namedtuples are converted
+    value by value and results that are not numpy arrays are returned
+    unchanged.
+    """
+    if isinstance(result, dict):
+        return {key: from_numpy(value, reference)
+                for key, value in result.items()}
+    if isinstance(result, tuple) and hasattr(result, '_fields'):
+        return type(result)(*[from_numpy(value, reference)
+                              for value in result])
+    if not isinstance(result, np.ndarray):
+        return result
+    torch = sys.modules['torch']
+    return torch.from_numpy(np.ascontiguousarray(result)).to(reference.device)
+
+
+def accepts_tensors(function):
+    """
+    Decorates a numpy function so it also accepts torch tensors. Tensor
+    arguments are passed to function as numpy views and, if any argument was
+    a tensor, the result is returned as a tensor on that tensor's device.
+    An out= tensor must be on the CPU, since a copy of a tensor on another
+    device would receive the result instead of the tensor itself.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        tensors = [value for value in list(args) + list(kwargs.values())
+                   if is_tensor(value)]
+        if not tensors:
+            return function(*args, **kwargs)
+        out = kwargs.get('out')
+        if is_tensor(out) and out.device.type != 'cpu':
+            raise ValueError('out must be a CPU tensor, not a %s tensor.'
+                             %(out.device.type))
+        args = [to_numpy(value) for value in args]
+        kwargs = {key: to_numpy(value) for key, value in kwargs.items()}
+        return from_numpy(function(*args, **kwargs), tensors[0])
+    return wrapper
@@ -0,0 +1,291 @@
+"""Shared Interest scoring for ground truth given as bounding boxes."""
+
+import collections
+import numpy as np
+
+from shared_interest import backend
+from shared_interest import scoring_functions
+from shared_interest.datasets.box_geometry import clip_boxes
+from shared_interest.shared_interest import _convert_to_numpy, _is_binary
+from shared_interest.shared_interest import _score_names
+
+
+ObjectScores = collections.namedtuple('ObjectScores', ['scores', 'offsets'])
+
+# The grid of a chunk of instances: the instance of each box in the chunk,
+# the grid indices of each box's edges, the sorted edges of each instance of
+# size (chunk_size, num_edges) and the saliency sums at their corners of size
+# (chunk_size, num_edges, num_edges), where corners[i, y, x] is the sum of
+# saliency[i, :ys[i, y], :xs[i, x]].
+_Grid = collections.namedtuple('_Grid', ['instances', 'boxes', 'ys', 'xs',
+                                         'corners'])
+
+# The number of instances whose saliency is summed at once.
+_CHUNK_SIZE = 16
+
+
+@backend.accepts_tensors
+def box_shared_interest(boxes, saliency_features, score='iou_coverage',
+                        offsets=None):
+    """
+    Returns the Shared Interest score for ground truth given as a union of
+        axis-aligned boxes per instance. The scores match shared_interest on
+        the rasterized ground truth mask, but the mask is never built: the
+        saliency in the ground truth is read from saliency sums at the corners
+        of the grid cut by the box edges and the ground truth size from the
+        box geometry.
+
+    Args:
+    boxes: A list of length batch_size of integer arrays of size
+        (num_boxes, 4). Each row is (xmin, ymin, xmax, ymax) in the pixel
+        coordinates of the saliency and covers rows ymin:ymax and columns
+        xmin:xmax, like ImageNet._create_ground_truth. If offsets is given,
+        boxes is instead a single array of size (total_boxes, 4).
+    saliency_features: An array of size (batch_size, height, width) representing
+        the saliency features. Binary or continuous, as in shared_interest.
+    score: A score name, a list of score names, or 'all'. See shared_interest.
+    offsets: None or an integer array of size (batch_size + 1) such that the
+        boxes of instance i are boxes[offsets[i]:offsets[i + 1]]. Defaults to
+        None.
+
+    Raises:
+        ValueError if score is not a valid scoring function.
+        ValueError if saliency_features is not binary and the score is not
+            'saliency_coverage'.
+        ValueError if the number of instances in boxes and saliency_features
+            differ.
+
+    Returns:
+    A numpy array of size (batch_size) of floating point shared interest scores.
+        If score is a list or 'all', a dictionary mapping each score name to
+        its numpy array of size (batch_size).
+    """
+    saliency_features = _convert_to_numpy(saliency_features)
+    score_names = _score_names(score)
+    boxes, offsets = _as_ragged(boxes, offsets)
+    if len(offsets) - 1 != saliency_features.shape[0]:
+        raise ValueError('boxes and saliency_features must have the same \
+                         number of instances.')
+    saliency_is_binary = _is_binary(saliency_features)
+    if not saliency_is_binary and score_names != ['saliency_coverage']:
+        raise ValueError('Non-binary saliency features can only use \
+                         saliency_coverage score.')
+
+    batch_size, height, width = saliency_features.shape
+    boxes = clip_boxes(boxes, height, width)
+    boxes[:, 2:] = np.maximum(boxes[:, 2:], boxes[:, :2])
+    intersection = np.zeros(batch_size)
+    ground_truth_size = np.zeros(batch_size)
+    saliency_mass = np.zeros(batch_size)
+    for instance_slice, _, grid in _grids(boxes, offsets, saliency_features,
+                                          saliency_is_binary):
+        intersection[instance_slice], ground_truth_size[instance_slice] = \
+            _union_statistics(grid)
+        saliency_mass[instance_slice] = grid.corners[:, -1, -1]
+    statistics = {'intersection': intersection,
+                  'union': ground_truth_size + saliency_mass - intersection,
+                  'ground_truth_size': ground_truth_size,
+                  'saliency_mass': saliency_mass}
+
+    results = scoring_functions._scores_from_statistics(statistics,
+                                                        score_names)
+    if isinstance(score, str) and score != 'all':
+        return results[score]
+    return results
+
+
+@backend.accepts_tensors
+def object_shared_interest(boxes, saliency_features, score='iou_coverage',
+                           offsets=None):
+    """
+    Returns the Shared Interest score of every object of every instance, where
+        each box is scored as the whole ground truth of its object. The scores
+        of a box match shared_interest on the mask of that box alone, but all
+        boxes of the batch are scored at once from lookups into the saliency
+        sums at the corners of the grid cut by the box edges, without a loop
+        over boxes.
+
+    Args:
+    boxes: The boxes of each instance in either of the forms accepted by
+        box_shared_interest.
+    saliency_features: An array of size (batch_size, height, width) representing
+        the saliency features. Binary or continuous, as in shared_interest.
+    score: A score name, a list of score names, or 'all'. See shared_interest.
+    offsets: None or an integer array of size (batch_size + 1) such that the
+        boxes of instance i are boxes[offsets[i]:offsets[i + 1]]. Defaults to
+        None.
+
+    Raises:
+        ValueError if score is not a valid scoring function.
+        ValueError if saliency_features is not binary and the score is not
+            'saliency_coverage'.
+        ValueError if the number of instances in boxes and saliency_features
+            differ.
+
+    Returns:
+    An ObjectScores tuple of a numpy array of size (total_boxes) of floating
+        point shared interest scores and an int64 array of size
+        (batch_size + 1) of offsets, such that the scores of the objects of
+        instance i are scores[offsets[i]:offsets[i + 1]], in box order. If
+        score is a list or 'all', the scores are a dictionary mapping each
+        score name to its numpy array of size (total_boxes). Tensor inputs
+        give tensor scores and offsets.
+    """
+    saliency_features = _convert_to_numpy(saliency_features)
+    score_names = _score_names(score)
+    boxes, offsets = _as_ragged(boxes, offsets)
+    if len(offsets) - 1 != saliency_features.shape[0]:
+        raise ValueError('boxes and saliency_features must have the same \
+                         number of instances.')
+    saliency_is_binary = _is_binary(saliency_features)
+    if not saliency_is_binary and score_names != ['saliency_coverage']:
+        raise ValueError('Non-binary saliency features can only use \
+                         saliency_coverage score.')
+
+    height, width = saliency_features.shape[1:]
+    boxes = clip_boxes(boxes, height, width)
+    boxes[:, 2:] = np.maximum(boxes[:, 2:], boxes[:, :2])
+    intersection = np.zeros(len(boxes))
+    saliency_mass = np.zeros(len(boxes))
+    for _, box_slice, grid in _grids(boxes, offsets, saliency_features,
+                                     saliency_is_binary):
+        x_min, y_min, x_max, y_max = grid.boxes.T
+        corners, instances = grid.corners, grid.instances
+        intersection[box_slice] = (corners[instances, y_max, x_max]
+                                   - corners[instances, y_min, x_max]
+                                   - corners[instances, y_max, x_min]
+                                   + corners[instances, y_min, x_min])
+        saliency_mass[box_slice] = corners[instances, -1, -1]
+    x_min, y_min, x_max, y_max = boxes.T
+    ground_truth_size = ((x_max - x_min) * (y_max - y_min)).astype(np.float64)
+    statistics = {'intersection': intersection,
+                  'union': ground_truth_size + saliency_mass - intersection,
+                  'ground_truth_size': ground_truth_size,
+                  'saliency_mass': saliency_mass}
+
+    results = scoring_functions._scores_from_statistics(statistics,
+                                                        score_names)
+    if isinstance(score, str) and score != 'all':
+        return ObjectScores(results[score], offsets)
+    return ObjectScores(results, offsets)
+
+
+def _as_ragged(boxes, offsets):
+    """Returns boxes as one (total_boxes, 4) array and per-instance offsets."""
+    if offsets is None:
+        boxes = [np.asarray(instance_boxes, dtype=np.int64).reshape(-1, 4)
+                 for instance_boxes in boxes]
+        offsets = np.concatenate([[0], np.cumsum(
+            [len(instance_boxes) for instance_boxes in boxes])])
+        boxes = np.concatenate(boxes) if boxes else np.zeros((0, 4))
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    if offsets[0] != 0 or offsets[-1] != len(boxes) \
+            or (np.diff(offsets) < 0).any():
+        raise ValueError('offsets must be non-decreasing from 0 to the number \
+                         of boxes.')
+    return boxes, offsets
+
+
+def _grids(boxes, offsets, saliency_features, saliency_is_binary):
+    """
+    Yields the instance slice, box slice and _Grid of each chunk of
+        _CHUNK_SIZE instances.
+
+    The edges of an instance's boxes cut its saliency into a grid of at most
+        (2 * num_boxes + 1)^2 cells that are each either inside or outside of
+        every box, so a box or a union of boxes is scored exactly from the
+        saliency sums at the grid corners without rasterizing it. The corner
+        sums of a chunk are two batched matrix products of the saliency with
+        the indicators of the rows above and the columns left of each edge,
+        so only the corners are written, never a full summed-area table.
+
+    Args:
+    boxes: An integer array of size (total_boxes, 4) of clipped boxes with
+        xmax >= xmin and ymax >= ymin.
+    offsets: An integer array of size (batch_size + 1) of box offsets.
+    saliency_features: An array of size (batch_size, height, width) of binary
+        or non-negative saliency features.
+    saliency_is_binary: Whether saliency_features is binary.
+    """
+    batch_size, height, width = saliency_features.shape
+    # float32 sums of binary features are exact below 2^24 features.
+    if saliency_features.dtype == np.float32 or \
+            (saliency_is_binary and height * width < 2**24):
+        dtype = np.float32
+    else:
+        dtype = np.float64
+    buffer = np.empty((min(_CHUNK_SIZE, batch_size), height, width),
+                      dtype=dtype)
+    for start in range(0, batch_size, _CHUNK_SIZE):
+        end = min(start + _CHUNK_SIZE, batch_size)
+        box_slice = slice(offsets[start], offsets[end])
+        chunk = buffer[:end - start]
+        if saliency_is_binary:
+            np.copyto(chunk, saliency_features[start:end], casting='unsafe')
+        else:
+            np.abs(saliency_features[start:end], out=chunk, casting='unsafe')
+        chunk_offsets = offsets[start:end + 1] - offsets[start]
+        grid = _chunk_grid(boxes[box_slice], chunk_offsets, chunk)
+        yield slice(start, end), box_slice, grid
+
+
+def _chunk_grid(boxes, offsets, saliency_features):
+    """
+    Returns the _Grid of the boxes of a chunk of instances. Instances with
+        fewer boxes than the most in the chunk are padded with edges at 0,
+        which only cut empty cells.
+    """
+    batch_size, height, width = saliency_features.shape
+    counts = np.diff(offsets)
+    instances = np.repeat(np.arange(batch_size), counts)
+    slots = np.arange(len(boxes)) - offsets[instances]
+    num_edges = 2 * counts.max(initial=0) + 2
+    grid_boxes = np.empty_like(boxes)
+    edges = []
+    for axis, size in enumerate([width, height]):
+        axis_edges = np.zeros((batch_size, num_edges), dtype=np.int64)
+        axis_edges[:, 1] = size
+        axis_edges[instances, 2 + 2 * slots] = boxes[:, axis]
+        axis_edges[instances, 3 + 2 * slots] = boxes[:, axis + 2]
+        axis_edges.sort(axis=1)
+        # Locate every box edge with one search of the sorted rows laid end
+        # to end.
+        shift = (size + 1) * np.arange(batch_size)
+        flat_edges = (axis_edges + shift[:, None]).ravel()
+        for column in [axis, axis + 2]:
+            grid_boxes[:, column] = np.searchsorted(
+                flat_edges, boxes[:, column] + shift[instances]) \
+                - num_edges * instances
+        edges.append(axis_edges)
+    xs, ys = edges
+
+    dtype = saliency_features.dtype
+    above = (np.arange(height) < ys[:, :, None]).astype(dtype)
+    left = (np.arange(width) < xs[:, :, None]).astype(dtype)
+    corners = np.matmul(np.matmul(above, saliency_features),
+                        left.transpose(0, 2, 1)).astype(np.float64)
+    return _Grid(instances, grid_boxes, ys, xs, corners)
+
+
+def _union_statistics(grid):
+    """
+    Returns the saliency inside and the area of the union of the boxes of
+        each instance of a _Grid.
+    """
+    batch_size, num_edges, _ = grid.corners.shape
+    x_min, y_min, x_max, y_max = grid.boxes.T
+    # Mark the cells covered by each box with a 2D difference array.
+    coverage = np.zeros((batch_size, num_edges, num_edges), dtype=np.int32)
+    np.add.at(coverage, (grid.instances, y_min, x_min), 1)
+    np.add.at(coverage, (grid.instances, y_min, x_max), -1)
+    np.add.at(coverage, (grid.instances, y_max, x_min), -1)
+    np.add.at(coverage, (grid.instances, y_max, x_max), 1)
+    covered = np.cumsum(np.cumsum(coverage, axis=1), axis=2)[:, :-1, :-1] > 0
+
+    corners = grid.corners
+    cell_sums = (corners[:, 1:, 1:] - corners[:, :-1, 1:]
+                 - corners[:, 1:, :-1] + corners[:, :-1, :-1])
+    cell_areas = np.diff(grid.ys)[:, :, None] * np.diff(grid.xs)[:, None, :]
+    return ((cell_sums * covered).sum(axis=(1, 2)),
+            (cell_areas * covered).sum(axis=(1, 2)).astype(np.float64))
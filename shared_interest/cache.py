@@ -0,0 +1,326 @@
+"""Memoization of Shared Interest scores and binarization."""
+
+import collections
+import hashlib
+import os
+import threading
+import uuid
+import numpy as np
+
+from shared_interest import backend
+from shared_interest import util
+from shared_interest.masks import PackedMask, RLEMask
+from shared_interest.shared_interest import _convert_to_numpy, _score_names
+from shared_interest.shared_interest import shared_interest
+
+
+class ScoreCache:
+    """
+    Caches Shared Interest scores and binarized saliency per instance, keyed
+        by the parameters of the call and either caller-supplied instance ids
+        or, without ids, a BLAKE2b hash of each instance's features. Only the
+        instances of a batch that miss the cache are computed, in one batched
+        call.
+
+    Ids are the fast path: a hit then costs a dictionary lookup. Hashing
+        reads every feature, at about the cost of scoring or binarizing it, so
+        without ids the cache only pays off for calls that cost more than a
+        pass over their inputs.
+
+    Results live in an in-memory LRU tier bounded in bytes and, if a
+        directory is given, in an on-disk tier that outlives the process. The
+        disk tier stores the results of each batch of misses as one segment
+        of stacked values, and evicts its least recently used segments once
+        it grows past its size limit.
+    """
+
+    def __init__(self, max_bytes=2**28, directory=None, max_disk_bytes=2**32):
+        """
+        Args:
+        max_bytes: the size limit of the in-memory tier in bytes. Defaults to
+            256 MiB.
+        directory: None or the directory of the on-disk tier. Defaults to
+            None.
+        max_disk_bytes: the size limit of the on-disk tier in bytes. Defaults
+            to 4 GiB.
+        """
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = collections.OrderedDict()
+        self._memory_bytes = 0
+        # Segment name to (size in bytes, keys), in least recently used order.
+        self._segments = collections.OrderedDict()
+        # Key to (segment name, row) of its value on disk.
+        self._disk = {}
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0,
+                       'evictions': 0, 'disk_evictions': 0}
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            files = [entry for entry in os.scandir(directory)
+                     if entry.name.endswith('.keys.npy')]
+            for entry in sorted(files, key=lambda entry: entry.stat().st_mtime):
+                segment = entry.name[:-len('.keys.npy')]
+                try:
+                    keys = np.load(entry.path).astype(str).tolist()
+                    size = entry.stat().st_size + os.path.getsize(
+                        self._segment_file(segment, 'values'))
+                except (OSError, ValueError):
+                    continue
+                self._add_segment(segment, keys, size)
+
+    @backend.accepts_tensors
+    def shared_interest(self, ground_truth_features, saliency_features,
+                        score='iou_coverage', ids=None, **kwargs):
+        """
+        Returns shared_interest(ground_truth_features, saliency_features,
+            score, **kwargs), computing only the instances that miss the cache.
+            Keyword arguments such as validate and workers are passed on, and
+            all but workers, which does not change the scores, are part of
+            the key.
+
+        ids: None or a sequence of batch_size ids, such as (dataset index,
+            saliency method) tuples, that identify the features of each
+            instance. Instances are then keyed by their ids instead of hashing
+            their features, so a hit costs a dictionary lookup; the caller
+            must give different features different ids. Defaults to None.
+        """
+        ground_truth_features = _convert_to_numpy(ground_truth_features)
+        saliency_features = _convert_to_numpy(saliency_features)
+        score_names = _score_names(score)
+        if ground_truth_features.shape != saliency_features.shape:
+            raise ValueError('ground_truth_features and saliency_features must \
+                             be the same shape.')
+        parameters = ('shared_interest', tuple(score_names),
+                      sorted((name, value) for name, value in kwargs.items()
+                             if name != 'workers'))
+        if ids is not None:
+            keys = _id_keys(parameters, ids, len(saliency_features))
+        else:
+            keys = [_key(parameters, ground_truth_digest, saliency_digest)
+                    for ground_truth_digest, saliency_digest
+                    in zip(_instance_digests(ground_truth_features),
+                           _instance_digests(saliency_features))]
+
+        def compute(missing):
+            scores = shared_interest(ground_truth_features[missing],
+                                     saliency_features[missing],
+                                     score=score_names, **kwargs)
+            return np.stack([scores[name] for name in score_names], axis=1)
+
+        values = self._lookup(keys, compute)
+        values = np.stack(values) if values \
+            else np.zeros((0, len(score_names)))
+        if isinstance(score, str) and score != 'all':
+            return values[:, 0]
+        return {name: values[:, i] for i, name in enumerate(score_names)}
+
+    @backend.accepts_tensors
+    def binarize_percentile(self, batch, percentile, packed=False, ids=None):
+        """
+        Returns util.binarize_percentile(batch, percentile, packed). ids are
+            as in shared_interest.
+        """
+        return self._binarize(util.binarize_percentile, batch, packed, ids,
+                              percentile=percentile)
+
+    @backend.accepts_tensors
+    def binarize_std(self, batch, num_std=1, packed=False, ids=None):
+        """
+        Returns util.binarize_std(batch, num_std, packed). ids are as in
+            shared_interest.
+        """
+        return self._binarize(util.binarize_std, batch, packed, ids,
+                              num_std=num_std)
+
+    @property
+    def stats(self):
+        """
+        A dictionary of the instance 'hits' in memory, 'disk_hits', 'misses',
+            'evictions' from each tier, and the current 'entries', 'bytes',
+            'disk_entries', 'disk_segments' and 'disk_bytes'.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({'entries': len(self._memory),
+                          'bytes': self._memory_bytes,
+                          'disk_entries': len(self._disk),
+                          'disk_segments': len(self._segments),
+                          'disk_bytes': self._disk_bytes})
+        return stats
+
+    def clear(self):
+        """Removes every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            while self._segments:
+                self._evict_segment()
+
+    def _binarize(self, binarize, batch, packed, ids, **parameters):
+        """Caches the packed rows of a binarizer's masks per instance."""
+        batch = np.asarray(batch)
+        if len(batch) == 0:
+            mask = PackedMask.pack(np.zeros(batch.shape, dtype=bool))
+            return mask if packed else mask.unpack()
+        parameters = (binarize.__name__, sorted(parameters.items()))
+        if ids is not None:
+            keys = _id_keys(parameters, ids, len(batch))
+        else:
+            keys = [_key(parameters, digest)
+                    for digest in _instance_digests(batch)]
+
+        def compute(missing):
+            return binarize(batch[missing], packed=True,
+                            **dict(parameters[1])).bits
+
+        mask = PackedMask(np.stack(self._lookup(keys, compute)), batch.shape)
+        if packed:
+            return mask
+        return mask.unpack()
+
+    def _lookup(self, keys, compute):
+        """
+        Returns the cached values of keys, calling compute with the indices of
+            the missing keys to compute their values as one array.
+        """
+        values = [None] * len(keys)
+        on_disk = collections.defaultdict(list)
+        with self._lock:
+            for i, key in enumerate(keys):
+                value = self._memory.get(key)
+                if value is not None:
+                    self._memory.move_to_end(key)
+                    self._stats['hits'] += 1
+                    values[i] = value
+                elif key in self._disk:
+                    on_disk[self._disk[key][0]].append(i)
+
+        # Read each segment's hits with one memory-mapped gather.
+        for segment, indices in on_disk.items():
+            with self._lock:
+                rows = [self._disk.get(keys[i], (None,))[-1] for i in indices]
+                if segment not in self._segments or None in rows:
+                    continue
+                self._segments.move_to_end(segment)
+            try:
+                stored = np.load(self._segment_file(segment, 'values'),
+                                 mmap_mode='r')
+                stored = np.array(stored[rows])
+                os.utime(self._segment_file(segment, 'keys'))
+            except (OSError, ValueError, IndexError):
+                continue
+            for i, value in zip(indices, stored):
+                self._add_to_memory(keys[i], value)
+                values[i] = value
+            with self._lock:
+                self._stats['disk_hits'] += len(indices)
+
+        missing = [i for i, value in enumerate(values) if value is None]
+        with self._lock:
+            self._stats['misses'] += len(missing)
+        if missing:
+            computed = np.asarray(compute(np.array(missing)))
+            for i, value in zip(missing, computed):
+                value = np.array(value)
+                self._add_to_memory(keys[i], value)
+                values[i] = value
+            if self.directory is not None:
+                self._write_segment([keys[i] for i in missing], computed)
+        return values
+
+    def _write_segment(self, keys, values):
+        """Stores a batch of computed values as one segment on disk."""
+        segment = uuid.uuid4().hex
+        values_file = self._segment_file(segment, 'values')
+        keys_file = self._segment_file(segment, 'keys')
+        # The keys file is written last, so only whole segments are loaded.
+        np.save(values_file, values)
+        with open(keys_file + '.tmp', 'wb') as f:
+            np.save(f, np.array(keys, dtype=bytes))
+        os.replace(keys_file + '.tmp', keys_file)
+        size = os.path.getsize(values_file) + os.path.getsize(keys_file)
+        with self._lock:
+            self._add_segment(segment, keys, size)
+            while self._disk_bytes > self.max_disk_bytes and self._segments:
+                self._stats['disk_evictions'] += len(
+                    self._evict_segment())
+
+    def _add_segment(self, segment, keys, size):
+        """Indexes a segment's keys. Newer segments shadow older ones."""
+        self._segments[segment] = (size, keys)
+        self._disk_bytes += size
+        for row, key in enumerate(keys):
+            self._disk[key] = (segment, row)
+
+    def _evict_segment(self):
+        """Deletes the least recently used segment and returns its keys."""
+        segment, (size, keys) = self._segments.popitem(last=False)
+        self._disk_bytes -= size
+        evicted = [key for key in keys if self._disk.get(key, (None,))[0]
+                   == segment]
+        for key in evicted:
+            del self._disk[key]
+        for part in ['keys', 'values']:
+            try:
+                os.remove(self._segment_file(segment, part))
+            except OSError:
+                pass
+        return evicted
+
+    def _add_to_memory(self, key, value):
+        """Adds value to the in-memory tier, evicting the oldest entries."""
+        with self._lock:
+            if key in self._memory:
+                self._memory_bytes -= self._memory.pop(key).nbytes
+            self._memory[key] = value
+            self._memory_bytes += value.nbytes
+            while self._memory_bytes > self.max_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted.nbytes
+                self._stats['evictions'] += 1
+
+    def _segment_file(self, segment, part):
+        """Returns the path of a segment's 'keys' or 'values' file."""
+        return os.path.join(self.directory, '%s.%s.npy' %(segment, part))
+
+
+def _instance_digests(features):
+    """Returns the BLAKE2b digest of each instance's dtype, shape and data."""
+    if isinstance(features, PackedMask):
+        prefix, rows = ('packed', features.shape[1:]), features.bits
+    elif isinstance(features, RLEMask):
+        prefix = ('rle', features.shape[1:])
+        rows = [features.counts[start:end] for start, end
+                in zip(features.offsets[:-1], features.offsets[1:])]
+    else:
+        rows = np.ascontiguousarray(features)
+        prefix = (rows.dtype.str, rows.shape[1:])
+    prefix = repr(prefix).encode()
+    digests = []
+    for row in rows:
+        digest = hashlib.blake2b(prefix, digest_size=16)
+        digest.update(row)
+        digests.append(digest.digest())
+    return digests
+
+
+def _id_keys(parameters, ids, batch_size):
+    """Returns the cache keys of caller-supplied instance ids."""
+    # numpy scalars are keyed like the Python values they hold.
+    ids = [instance_id.item() if isinstance(instance_id, np.generic)
+           else instance_id for instance_id in ids]
+    if len(ids) != batch_size:
+        raise ValueError('ids must have one id per instance.')
+    return [_key(parameters, b'id', repr(instance_id).encode())
+            for instance_id in ids]
+
+
+def _key(parameters, *digests):
+    """Combines call parameters and instance digests into a hex cache key."""
+    key = hashlib.blake2b(repr(parameters).encode(), digest_size=16)
+    for digest in digests:
+        key.update(digest)
+    return key.hexdigest()
@@ -0,0 +1,299 @@
+"""
+Command-line Shared Interest scoring of saliency shards, resumable by chunk.
+
+Example:
+    shared-interest --saliency saliency_*.npy --images imagenet/val \
+        --annotations imagenet/annotations --resize 256 --crop 224 \
+        --binarize std --score all --output results/
+
+Scores are written one chunk of instances at a time to the output directory,
+and checkpoint.json records the finished chunks. Rerunning the same command
+after an interruption scores only the unfinished chunks. When every chunk is
+done, the chunks are merged into scores.npz.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import numpy as np
+
+from shared_interest import util
+from shared_interest.datasets.annotation_index import AnnotationIndex
+from shared_interest.datasets.annotation_index import parse_annotation
+from shared_interest.datasets.box_geometry import rasterize_boxes
+from shared_interest.datasets.box_geometry import transform_boxes
+from shared_interest.datasets.file_index import load_file_index
+from shared_interest.scoring_functions import SCORING_FUNCTIONS
+from shared_interest.shared_interest import _is_binary, _score_names
+from shared_interest.shared_interest import shared_interest
+
+
+def main(argv=None):
+    """Runs the command. Returns the process exit status."""
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n\n')[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__.split('\n\n', 1)[1])
+    parser.add_argument('--saliency', nargs='+', required=True,
+                        help='.npy saliency shards of size (num_instances, \
+                        height, width) or (num_instances, channels, height, \
+                        width), concatenated in the given order.')
+    ground_truth = parser.add_mutually_exclusive_group(required=True)
+    ground_truth.add_argument('--ground-truth',
+                              help='a .npy binary ground truth array of size \
+                              (num_instances, height, width).')
+    ground_truth.add_argument('--images',
+                              help='an ImageFolder image directory. The \
+                              saliency rows follow its image order.')
+    parser.add_argument('--annotations',
+                        help='with --images, the ImageNet annotation XML \
+                        directory or an index from build_annotation_index.')
+    parser.add_argument('--resize', type=int,
+                        help='with --images, the size the ground truth is \
+                        resized to, as in torchvision Resize.')
+    parser.add_argument('--crop', type=int,
+                        help='with --images, the size the ground truth is \
+                        center cropped to, as in torchvision CenterCrop.')
+    parser.add_argument('--binarize', choices=['none', 'percentile', 'std'],
+                        default='none',
+                        help='how to binarize the saliency. Defaults to none.')
+    parser.add_argument('--percentile', type=float, default=0.8,
+                        help='the util.binarize_percentile percentile.')
+    parser.add_argument('--num-std', type=float, default=1,
+                        help='the util.binarize_std number of deviations.')
+    parser.add_argument('--score', nargs='+', default=['all'],
+                        help='the registered scores to compute, or all. \
+                        Registered: %s.' %(', '.join(SCORING_FUNCTIONS)))
+    parser.add_argument('--output', required=True,
+                        help='the output directory.')
+    parser.add_argument('--chunk-size', type=int, default=1024,
+                        help='the number of instances scored and written at a \
+                        time. Defaults to 1024.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='the number of threads to binarize and score \
+                        each chunk on.')
+    args = parser.parse_args(argv)
+    if args.images is not None and args.annotations is None:
+        parser.error('--images requires --annotations.')
+    if args.chunk_size < 1:
+        parser.error('--chunk-size must be a positive integer.')
+    score = args.score[0] if args.score == ['all'] else args.score
+    try:
+        score_names = _score_names(score)
+    except ValueError as error:
+        parser.error(str(error))
+
+    saliency = ShardedArray(args.saliency)
+    # Check that unbinarized saliency suits the scores on the first chunk,
+    # before anything is written to the output directory.
+    binary_scores = [name for name in score_names
+                     if SCORING_FUNCTIONS[name].binary_saliency]
+    if args.binarize == 'none' and binary_scores:
+        first_chunk = saliency[0:min(args.chunk_size, len(saliency))]
+        if first_chunk.ndim == 4:
+            first_chunk = util.flatten(first_chunk)
+        if not _is_binary(first_chunk):
+            parser.error('--score %s requires binary saliency; binarize it \
+                         with --binarize percentile or std.'
+                         %(' '.join(binary_scores)))
+    if args.ground_truth is not None:
+        ground_truth = np.load(args.ground_truth, mmap_mode='r')
+        if len(ground_truth) != len(saliency):
+            parser.error('--ground-truth has %d instances but --saliency has \
+                         %d.' %(len(ground_truth), len(saliency)))
+    else:
+        ground_truth = AnnotationGroundTruth(
+            args.images, args.annotations,
+            os.path.join(args.output, 'file_index'), args.resize, args.crop)
+        if len(ground_truth) != len(saliency):
+            parser.error('%s has %d images but --saliency has %d instances.'
+                         %(args.images, len(ground_truth), len(saliency)))
+
+    try:
+        checkpoint = Checkpoint(args.output, {
+            'saliency': [os.path.abspath(path) for path in args.saliency],
+            'ground_truth': os.path.abspath(args.ground_truth or args.images),
+            'annotations': args.annotations and os.path.abspath(
+                args.annotations),
+            'resize': args.resize, 'crop': args.crop,
+            'binarize': args.binarize, 'percentile': args.percentile,
+            'num_std': args.num_std, 'score': score_names,
+            'num_instances': len(saliency), 'chunk_size': args.chunk_size})
+    except ValueError as error:
+        parser.error(str(error))
+    num_chunks = -(-len(saliency) // args.chunk_size)
+    for chunk in range(num_chunks):
+        if checkpoint.is_done(chunk):
+            continue
+        start = chunk * args.chunk_size
+        end = min(start + args.chunk_size, len(saliency))
+        chunk_saliency = saliency[start:end]
+        if chunk_saliency.ndim == 4:
+            chunk_saliency = util.flatten(chunk_saliency)
+        if args.binarize == 'percentile':
+            chunk_saliency = util.binarize_percentile(
+                chunk_saliency, args.percentile, workers=args.workers)
+        elif args.binarize == 'std':
+            chunk_saliency = util.binarize_std(chunk_saliency, args.num_std,
+                                               workers=args.workers)
+        try:
+            scores = shared_interest(np.asarray(ground_truth[start:end]),
+                                     chunk_saliency, score=score_names,
+                                     workers=args.workers)
+        except ValueError as error:
+            parser.error('chunk %d: %s' %(chunk, error))
+        checkpoint.write_chunk(chunk, scores)
+        print('Scored instances %d to %d of %d.' %(start, end, len(saliency)),
+              flush=True)
+
+    merged = checkpoint.merge(num_chunks)
+    print('Wrote %s.' %(merged))
+    return 0
+
+
+class ShardedArray:
+    """Memory-mapped .npy shards read as one array along the batch axis."""
+
+    def __init__(self, paths):
+        self.shards = [np.load(path, mmap_mode='r') for path in paths]
+        if len({shard.shape[1:] for shard in self.shards}) > 1:
+            raise ValueError('Saliency shards must have the same instance \
+                             shape.')
+        self.offsets = np.concatenate(
+            [[0], np.cumsum([len(shard) for shard in self.shards])])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, rows):
+        """Returns the rows of the slice rows as one numpy array."""
+        start, end, _ = rows.indices(len(self))
+        parts = []
+        for shard, offset in zip(self.shards, self.offsets):
+            if offset < end and offset + len(shard) > start:
+                parts.append(shard[max(start - offset, 0):end - offset])
+        return np.concatenate(parts)
+
+
+class AnnotationGroundTruth:
+    """
+    ImageNet ground truth masks of an ImageFolder tree, rasterized from the
+        bounding boxes at the output resolution without loading any image.
+    """
+
+    def __init__(self, image_path, annotations, file_index_path, resize=None,
+                 crop=None):
+        """
+        Args:
+        image_path: the ImageFolder image directory.
+        annotations: the annotation XML directory or an AnnotationIndex path.
+        file_index_path: where the image file index is kept.
+        resize: None or the ground truth resize, as in ImageNet.
+        crop: None or the ground truth crop, as in ImageNet.
+        """
+        self.file_index = load_file_index(image_path, file_index_path)
+        self.keys = self.file_index.keys()
+        self.resize = resize
+        self.crop = crop
+        self.annotation_path = annotations
+        self.annotation_index = None
+        if os.path.isfile(os.path.join(annotations, 'keys.npy')):
+            self.annotation_index = AnnotationIndex(annotations)
+            self.rows = self.annotation_index.find(self.keys)
+
+    def __len__(self):
+        return len(self.file_index)
+
+    def __getitem__(self, rows):
+        """Returns the masks of the slice rows as a uint8 array."""
+        masks = []
+        for i in range(*rows.indices(len(self))):
+            boxes, height, width = self._annotation(i)
+            boxes, (height, width) = transform_boxes(
+                boxes, (height, width), resize=self.resize, crop=self.crop)
+            masks.append(rasterize_boxes(boxes, height, width))
+        if len({mask.shape for mask in masks}) > 1:
+            raise ValueError('Ground truth masks have different sizes; set \
+                             --crop to score images of different sizes.')
+        return np.stack(masks)
+
+    def _annotation(self, i):
+        """Returns the boxes, height and width of image i."""
+        if self.annotation_index is not None:
+            if self.rows[i] < 0:
+                raise IOError('No annotation data for %s.' %(self.keys[i]))
+            return self.annotation_index.annotation(self.rows[i])
+        annotation = parse_annotation(os.path.join(
+            self.annotation_path, '%s.xml' %(self.keys[i])))
+        boxes = np.array([[coordinate['xmin'], coordinate['ymin'],
+                           coordinate['xmax'], coordinate['ymax']]
+                          for coordinate in annotation['coordinates']],
+                         dtype=np.int64).reshape(-1, 4)
+        return boxes, int(annotation['height']), int(annotation['width'])
+
+
+class Checkpoint:
+    """
+    The chunk files and checkpoint.json of an output directory. The
+        checkpoint records the run's configuration, so a rerun with different
+        options does not mix its scores with the earlier ones.
+    """
+
+    def __init__(self, output, configuration):
+        self.output = output
+        os.makedirs(output, exist_ok=True)
+        self.path = os.path.join(output, 'checkpoint.json')
+        self.fingerprint = hashlib.blake2b(json.dumps(
+            configuration, sort_keys=True).encode(), digest_size=16).hexdigest()
+        self.state = {'configuration': configuration,
+                      'fingerprint': self.fingerprint, 'done': []}
+        if os.path.isfile(self.path):
+            with open(self.path) as f:
+                state = json.load(f)
+            if state['fingerprint'] != self.fingerprint:
+                raise ValueError('%s was written with different options; use \
+                                 a new output directory.' %(self.path))
+            self.state = state
+        self._done = set(self.state['done'])
+
+    def is_done(self, chunk):
+        """Returns True if chunk was written by this or an earlier run."""
+        return chunk in self._done and os.path.isfile(self._chunk_file(chunk))
+
+    def write_chunk(self, chunk, scores):
+        """Atomically writes the scores of a chunk and records it as done."""
+        chunk_file = self._chunk_file(chunk)
+        _atomic_write(chunk_file, lambda f: np.savez(f, **scores))
+        self._done.add(chunk)
+        self.state['done'] = sorted(self._done)
+        _atomic_write(self.path, lambda f: f.write(
+            json.dumps(self.state).encode()))
+
+    def merge(self, num_chunks):
+        """Concatenates every chunk into scores.npz and returns its path."""
+        merged_file = os.path.join(self.output, 'scores.npz')
+        chunks = []
+        for chunk in range(num_chunks):
+            with np.load(self._chunk_file(chunk)) as scores:
+                chunks.append(dict(scores))
+        merged = {name: np.concatenate([scores[name] for scores in chunks])
+                  for name in self.state['configuration']['score']}
+        _atomic_write(merged_file, lambda f: np.savez(f, **merged))
+        return merged_file
+
+    def _chunk_file(self, chunk):
+        """Returns the path of a chunk's scores."""
+        return os.path.join(self.output, 'scores_%06d.npz' %(chunk))
+
+
+def _atomic_write(path, write):
+    """Calls write with a temporary binary file, then moves it to path."""
+    with open(path + '.tmp', 'wb') as f:
+        write(f)
+    os.replace(path + '.tmp', path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Dataset for ImageNet with annotations. Import ImageNet from
+shared_interest.datasets.imagenet, which loads this module, and torch, on first
+use.
+"""
+
+import os
+import numpy as np
+import torch
+from torchvision.datasets import ImageFolder, VisionDataset
+from torchvision.datasets.folder import default_loader
+
+from shared_interest import instrumentation
+from shared_interest.datasets.annotation_index import AnnotationIndex
+from shared_interest.datasets.annotation_index import parse_annotation
+from shared_interest.datasets.box_geometry import rasterize_boxes
+from shared_interest.datasets.box_geometry import transform_boxes
+from shared_interest.datasets.file_index import IMG_EXTENSIONS, FileIndex
+from shared_interest.datasets.file_index import load_file_index
+
+
+class ImageNet(ImageFolder):
+    """Extends ImageFolder dataset to include ground truth annotations."""
+
+    def __init__(self, image_path, ground_truth_path, image_transform=None,
+                 ground_truth_transform=None, annotation_index=None,
+                 ground_truth_resize=None, ground_truth_crop=None,
+                 file_index=None):
+        """
+        Extends the parent class with annotation information.
+
+        Additional Args:
+        image_path: the path to the ImageNet images. This folder must be
+            formatted in ImageFolder style (i.e. label/imagename.jpeg)
+        ground_truth_path: the path to the ImageNet annotations. This folder
+            must be formated in ImageFolder style (i.e., label/imagename.xml).
+            Unused if annotation_index is given.
+        image_transform: a pytorch transform to apply to the images or None.
+            Defaults to None.
+        ground_truth_transform: a pytorch transform to apply to the ground
+            truth annotations or None. Defaults to None.
+        annotation_index: an AnnotationIndex, the path to one built with
+            build_annotation_index, or None to parse the annotation XML files
+            on every access. Defaults to None.
+        ground_truth_resize: None, an int, or a (height, width) tuple. If
+            given, the boxes are resized like torchvision's Resize with
+            nearest interpolation before the mask is built. Defaults to None.
+        ground_truth_crop: None, an int, or a (height, width) tuple. If given,
+            the boxes are center cropped like torchvision's CenterCrop before
+            the mask is built. Defaults to None.
+        file_index: None, a FileIndex, or the directory of one. If a directory
+            is given, the index is loaded from it, and built or rebuilt first
+            if it is missing or the image tree changed. The samples are then
+            read from the index instead of walking image_path, and they are
+            not copied into a list, so workers share the memory-mapped index.
+            Defaults to None.
+
+        If ground_truth_resize or ground_truth_crop is given, the ground truth
+        is rasterized directly at the output size as a uint8 mask, matching
+        the nearest-neighbour transform of the full-size mask without building
+        it. They cannot be combined with ground_truth_transform.
+
+        """
+        if ground_truth_transform is not None and (
+                ground_truth_resize is not None
+                or ground_truth_crop is not None):
+            raise ValueError('ground_truth_transform cannot be combined with \
+                             ground_truth_resize or ground_truth_crop.')
+        if isinstance(file_index, (str, os.PathLike)):
+            file_index = load_file_index(image_path, file_index)
+        if file_index is not None:
+            self._init_from_file_index(image_path, file_index, image_transform)
+        else:
+            super().__init__(image_path, transform=image_transform)
+        self.ground_truth_transform = ground_truth_transform
+        self.ground_truth_path = ground_truth_path
+        self.ground_truth_resize = ground_truth_resize
+        self.ground_truth_crop = ground_truth_crop
+        if isinstance(annotation_index, (str, os.PathLike)):
+            annotation_index = AnnotationIndex(annotation_index)
+        self.annotation_index = annotation_index
+        if annotation_index is not None:
+            if isinstance(self.samples, FileIndex):
+                keys = self.samples.keys()
+            else:
+                keys = ['%s/%s' %self._image_key(image_path)
+                        for image_path, _ in self.imgs]
+            self._annotation_rows = annotation_index.find(keys)
+
+    def __getitem__(self, index):
+        """Returns the image, ground_truth mask, and label of the image."""
+        image, _ = super().__getitem__(index)
+        image_path, _ = self.imgs[index]
+        label, image_name = self._image_key(image_path)
+
+        boxes, height, width = self._get_annotation(index, label, image_name)
+        if self.ground_truth_resize is not None \
+                or self.ground_truth_crop is not None:
+            boxes, (height, width) = transform_boxes(
+                boxes, (height, width), resize=self.ground_truth_resize,
+                crop=self.ground_truth_crop)
+            ground_truth = torch.from_numpy(rasterize_boxes(boxes, height,
+                                                            width))
+            return image, ground_truth, int(label)
+
+        ground_truth = self._create_ground_truth(boxes, height, width)
+        if self.ground_truth_transform is not None:
+            ground_truth = self.ground_truth_transform(ground_truth).squeeze(0)
+
+        return image, ground_truth, int(label)
+
+    def _init_from_file_index(self, image_path, file_index, image_transform):
+        """
+        Sets the attributes ImageFolder.__init__ sets, from a FileIndex instead
+            of a walk of the image tree.
+        """
+        VisionDataset.__init__(self, image_path, transform=image_transform)
+        self.loader = default_loader
+        self.extensions = IMG_EXTENSIONS
+        self.classes = file_index.classes
+        self.class_to_idx = file_index.class_to_idx
+        self.samples = file_index
+        self.imgs = file_index
+        self.targets = file_index.targets
+
+    def _image_key(self, image_path):
+        """Returns the label and image name of an image path."""
+        image_name = image_path.strip().split('/')[-1].split('.')[0]
+        label = image_path.strip().split('/')[-2]
+        return label, image_name
+
+    def _get_annotation(self, index, label, image_name):
+        """Returns the boxes, height, and width annotating the image."""
+        if self.annotation_index is not None:
+            row = self._annotation_rows[index]
+            if row < 0:
+                raise IOError('No annotation data for %s/%s.' %(label,
+                                                                image_name))
+            return self.annotation_index.annotation(row)
+
+        ground_truth_file = os.path.join(self.ground_truth_path, label, '%s.xml' %image_name)
+        annotation = self._parse_xml(ground_truth_file)
+        boxes = np.array([[coordinate['xmin'], coordinate['ymin'],
+                           coordinate['xmax'], coordinate['ymax']]
+                          for coordinate in annotation['coordinates']],
+                         dtype=np.int64).reshape(-1, 4)
+        return boxes, int(annotation['height']), int(annotation['width'])
+
+    def _create_ground_truth(self, boxes, height, width):
+        """Creates a binary groudn truth mask based on the ImageNet annotations."""
+        with instrumentation.stage('imagenet.ground_truth'):
+            ground_truth = torch.zeros((height, width))
+            for x_min, y_min, x_max, y_max in boxes:
+                ground_truth[y_min:y_max, x_min:x_max] = 1
+        return ground_truth
+
+    def _parse_xml(self, ground_truth_file):
+        """Parse ImageNet annotation XML file."""
+        with instrumentation.stage('imagenet.parse_xml'):
+            return parse_annotation(ground_truth_file)
@@ -0,0 +1,153 @@
+"""Compact, memory-mappable index of ImageNet bounding box annotations."""
+
+import os
+import xml.etree.ElementTree as ET
+import numpy as np
+
+
+class AnnotationIndex:
+    """
+    Array-backed ImageNet annotations. The index is a directory of .npy files:
+        keys.npy: sorted 'label/imagename' keys of size (num_images).
+        sizes.npy: int32 (height, width) of each image, size (num_images, 2).
+        offsets.npy: int64 offsets of size (num_images + 1) such that the boxes
+            of image i are boxes[offsets[i]:offsets[i + 1]].
+        boxes.npy: int32 (xmin, ymin, xmax, ymax) boxes, size (num_boxes, 4).
+    The files are memory-mapped, so DataLoader workers share the same pages
+    instead of holding copies.
+    """
+
+    def __init__(self, index_path, mmap_mode='r'):
+        """
+        Args:
+        index_path: the directory written by build_annotation_index.
+        mmap_mode: the mmap_mode used to load the arrays, or None to load them
+            into memory. Defaults to 'r'.
+        """
+        self.index_path = index_path
+        self.mmap_mode = mmap_mode
+        self._load()
+
+    def _load(self):
+        """Loads the index arrays."""
+        arrays = {name: np.load(os.path.join(self.index_path, '%s.npy' %name),
+                                mmap_mode=self.mmap_mode)
+                  for name in ['keys', 'sizes', 'offsets', 'boxes']}
+        self.keys = arrays['keys']
+        self.sizes = arrays['sizes']
+        self.offsets = arrays['offsets']
+        self.boxes = arrays['boxes']
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getstate__(self):
+        # Pickle the location rather than the arrays so workers re-map them.
+        return {'index_path': self.index_path, 'mmap_mode': self.mmap_mode}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._load()
+
+    def find(self, keys):
+        """
+        Returns the rows of the given 'label/imagename' keys, or -1 for keys
+        that have no annotation.
+        """
+        keys = np.asarray(keys, dtype=str)
+        if len(self.keys) == 0:
+            return np.full(keys.shape, -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(np.asarray(self.keys[rows]) == keys, rows, -1)
+
+    def annotation(self, row):
+        """
+        Returns the boxes as an array of size (num_boxes, 4), the height and the
+        width of the image at row.
+        """
+        start, end = self.offsets[row], self.offsets[row + 1]
+        height, width = self.sizes[row]
+        return np.asarray(self.boxes[start:end]), int(height), int(width)
+
+    def gather(self, rows):
+        """
+        Returns the annotations of several rows at once as ragged arrays: the
+        boxes as an int64 array of size (total_boxes, 4), offsets of size
+        (num_rows + 1) such that the boxes of rows[i] are
+        boxes[offsets[i]:offsets[i + 1]], and the (height, width) of each row
+        as an array of size (num_rows, 2).
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = np.asarray(self.offsets[rows])
+        counts = np.asarray(self.offsets[rows + 1]) - starts
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        box_rows = np.arange(offsets[-1]) + np.repeat(starts - offsets[:-1],
+                                                      counts)
+        return (np.asarray(self.boxes[box_rows], dtype=np.int64).reshape(-1, 4),
+                offsets, np.asarray(self.sizes[rows]))
+
+
+def build_annotation_index(ground_truth_path, index_path):
+    """
+    Parses every ImageNet annotation once and saves them as an AnnotationIndex.
+
+    Args:
+    ground_truth_path: the path to the ImageNet annotations. This folder must
+        be formated in ImageFolder style (i.e., label/imagename.xml).
+    index_path: the directory to write the index to. It is created if needed.
+
+    Returns: The AnnotationIndex loaded from index_path.
+    """
+    keys, sizes, counts, boxes = [], [], [], []
+    for label in sorted(os.listdir(ground_truth_path)):
+        label_path = os.path.join(ground_truth_path, label)
+        if not os.path.isdir(label_path):
+            continue
+        for file_name in sorted(os.listdir(label_path)):
+            if not file_name.endswith('.xml'):
+                continue
+            annotation = parse_annotation(os.path.join(label_path, file_name))
+            keys.append('%s/%s' %(label, file_name[:-len('.xml')]))
+            sizes.append((int(annotation['height']), int(annotation['width'])))
+            counts.append(len(annotation['coordinates']))
+            boxes.extend((coordinate['xmin'], coordinate['ymin'],
+                          coordinate['xmax'], coordinate['ymax'])
+                         for coordinate in annotation['coordinates'])
+
+    keys = np.array(keys, dtype=str)
+    sizes = np.array(sizes, dtype=np.int32).reshape(-1, 2)
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    boxes = np.array(boxes, dtype=np.int32).reshape(-1, 4)
+
+    # Sort by key so lookups can binary search the memory-mapped keys.
+    order = np.argsort(keys, kind='stable')
+    box_order = np.concatenate([np.arange(offsets[i], offsets[i + 1])
+                                for i in order] + [np.zeros(0, dtype=np.int64)])
+    counts = np.diff(offsets)[order]
+    arrays = {'keys': keys[order],
+              'sizes': sizes[order],
+              'offsets': np.concatenate([[0], np.cumsum(counts)]).astype(
+                  np.int64),
+              'boxes': boxes[box_order.astype(np.int64)]}
+
+    os.makedirs(index_path, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(index_path, '%s.npy' %name), array)
+    return AnnotationIndex(index_path)
+
+
+def parse_annotation(ground_truth_file):
+    """Parse ImageNet annotation XML file."""
+    if not os.path.isfile(ground_truth_file):
+        raise IOError('No annotation data for %s.' %(ground_truth_file))
+    tree = ET.parse(ground_truth_file)
+    root = tree.getroot()
+    bboxes = [obj.find('bndbox') for obj in root.findall('object')]
+    coords = [{'xmin': int(bbox.find('xmin').text),
+               'ymin': int(bbox.find('ymin').text),
+               'xmax': int(bbox.find('xmax').text),
+               'ymax': int(bbox.find('ymax').text), } for bbox in bboxes]
+    height = root.find('size').find('height').text
+    width = root.find('size').find('width').text
+    return {'coordinates': coords, 'height': height, 'width': width}
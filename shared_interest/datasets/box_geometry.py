@@ -0,0 +1,104 @@
+"""Resize and center-crop geometry applied directly to bounding boxes."""
+
+import numpy as np
+
+
+def transform_boxes(boxes, image_size, resize=None, crop=None):
+    """
+    Maps boxes through a nearest-neighbour resize followed by a center crop.
+    Rasterizing the returned boxes at the returned size gives exactly the mask
+    that torchvision's Resize(resize, interpolation=NEAREST) followed by
+    CenterCrop(crop) produces from the full-size tensor mask.
+
+    Args:
+    boxes: An integer array of size (num_boxes, 4) of (xmin, ymin, xmax, ymax)
+        boxes covering rows ymin:ymax and columns xmin:xmax.
+    image_size: The (height, width) of the image the boxes annotate.
+    resize: None, an int, or a (height, width) tuple, following torchvision's
+        Resize. An int resizes the shorter edge to that size and keeps the
+        aspect ratio. Defaults to None.
+    crop: None, an int, or a (height, width) tuple, following torchvision's
+        CenterCrop. Defaults to None.
+
+    Returns: The transformed boxes and the (height, width) of the output.
+    """
+    boxes = clip_boxes(np.asarray(boxes, dtype=np.int64).reshape(-1, 4),
+                       *image_size)
+    if resize is not None:
+        output_size = resized_size(image_size, resize)
+        boxes = resize_boxes(boxes, image_size, output_size)
+        image_size = output_size
+    if crop is not None:
+        crop_size = (crop, crop) if isinstance(crop, int) else tuple(crop)
+        boxes = center_crop_boxes(boxes, image_size, crop_size)
+        image_size = crop_size
+    return boxes, tuple(image_size)
+
+
+def resized_size(image_size, size):
+    """Returns the (height, width) torchvision's Resize(size) resizes to."""
+    if not isinstance(size, int):
+        return tuple(size)
+    height, width = image_size
+    short, long = (width, height) if width <= height else (height, width)
+    new_short, new_long = size, int(size * long / short)
+    return (new_long, new_short) if width <= height else (new_short, new_long)
+
+
+def nearest_indices(input_size, output_size):
+    """
+    Returns the input index sampled by each output index when resizing an axis
+    with torch's 'nearest' interpolation, which computes the scale and the
+    source indices in single precision.
+    """
+    if input_size == output_size:
+        return np.arange(output_size)
+    scale = np.float32(input_size) / np.float32(output_size)
+    indices = np.floor(np.arange(output_size, dtype=np.float32) * scale)
+    return np.minimum(indices.astype(np.int64), input_size - 1)
+
+
+def resize_boxes(boxes, image_size, output_size):
+    """
+    Returns the boxes covering the output features whose nearest-neighbour
+    source features are covered by boxes.
+    """
+    rows = nearest_indices(image_size[0], output_size[0])
+    columns = nearest_indices(image_size[1], output_size[1])
+    # The source indices are non-decreasing, so each box maps to the run of
+    # output indices whose source lies in [min, max).
+    return np.stack([np.searchsorted(columns, boxes[:, 0]),
+                     np.searchsorted(rows, boxes[:, 1]),
+                     np.searchsorted(columns, boxes[:, 2]),
+                     np.searchsorted(rows, boxes[:, 3])], axis=1)
+
+
+def center_crop_boxes(boxes, image_size, crop_size):
+    """
+    Returns the boxes in the coordinates of torchvision's CenterCrop, which
+    zero pads axes that are smaller than the crop.
+    """
+    offsets = []
+    for size, crop in zip(image_size, crop_size):
+        if size >= crop:
+            offsets.append(int(round((size - crop) / 2.0)))
+        else:
+            offsets.append(-((crop - size) // 2))
+    top, left = offsets
+    boxes = boxes - np.array([left, top, left, top])
+    return clip_boxes(boxes, *crop_size)
+
+
+def clip_boxes(boxes, height, width):
+    """Clips (xmin, ymin, xmax, ymax) boxes to an image of height and width."""
+    return np.clip(boxes, 0, [width, height, width, height])
+
+
+def rasterize_boxes(boxes, height, width, dtype=np.uint8):
+    """
+    Returns a binary mask of size (height, width) set to 1 inside the boxes.
+    """
+    mask = np.zeros((height, width), dtype=dtype)
+    for x_min, y_min, x_max, y_max in clip_boxes(boxes, height, width):
+        mask[y_min:y_max, x_min:x_max] = 1
+    return mask
@@ -0,0 +1,154 @@
+"""Persisted, validated index of the image files of an ImageFolder tree."""
+
+import json
+import os
+import numpy as np
+
+
+# torchvision's IMG_EXTENSIONS, copied so the index does not import torch.
+IMG_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.ppm', '.bmp', '.pgm', '.tif',
+                  '.tiff', '.webp')
+
+
+class FileIndex:
+    """
+    Array-backed list of the samples of an ImageFolder tree. The index is a
+        directory of:
+        names.npy: utf-8 'label/.../filename' paths relative to the image
+            root, as a fixed-width bytes array of size (num_images).
+        targets.npy: int32 class index of each image, size (num_images).
+        manifest.json: the image root, extensions, classes, and the mtime of
+            every directory that was walked.
+    Adding, removing or renaming a file changes the mtime of its directory,
+        so the index is validated with one stat per directory instead of one
+        per file. The arrays are memory-mapped and the index is pickled by
+        path, so DataLoader workers share it instead of copying the samples.
+    """
+
+    def __init__(self, index_path, mmap_mode='r'):
+        """
+        Args:
+        index_path: the directory written by build_file_index.
+        mmap_mode: the mmap_mode used to load the arrays, or None to load them
+            into memory. Defaults to 'r'.
+        """
+        self.index_path = index_path
+        self.mmap_mode = mmap_mode
+        self._load()
+
+    def _load(self):
+        """Loads the manifest and the index arrays."""
+        with open(os.path.join(self.index_path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        self.root = self.manifest['root']
+        self.classes = self.manifest['classes']
+        self.class_to_idx = {label: i for i, label in enumerate(self.classes)}
+        self.names = np.load(os.path.join(self.index_path, 'names.npy'),
+                             mmap_mode=self.mmap_mode)
+        self.targets = np.load(os.path.join(self.index_path, 'targets.npy'),
+                               mmap_mode=self.mmap_mode)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getstate__(self):
+        # Pickle the location rather than the arrays so workers re-map them.
+        return {'index_path': self.index_path, 'mmap_mode': self.mmap_mode}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._load()
+
+    def __getitem__(self, index):
+        """Returns the (path, target) sample at index, like ImageFolder."""
+        return (os.path.join(self.root, self.names[index].decode('utf-8')),
+                int(self.targets[index]))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def keys(self):
+        """
+        Returns the 'label/imagename' key of every image, where label is the
+            image's directory, as used to look up its annotation.
+        """
+        names = np.char.decode(np.asarray(self.names), 'utf-8')
+        directories, _, file_names = np.char.rpartition(names, '/').T
+        labels = np.char.rpartition(directories, '/')[:, 2]
+        image_names = np.char.partition(file_names, '.')[:, 0]
+        return np.char.add(np.char.add(labels, '/'), image_names)
+
+    def is_current(self):
+        """Returns True if no directory of the tree changed since indexing."""
+        try:
+            return all(os.stat(os.path.join(self.root, directory)).st_mtime_ns
+                       == mtime for directory, mtime
+                       in self.manifest['mtimes'].items())
+        except OSError:
+            return False
+
+
+def build_file_index(image_path, index_path, extensions=IMG_EXTENSIONS):
+    """
+    Walks an ImageFolder tree once and saves its samples as a FileIndex. The
+        samples are in the same order as torchvision's ImageFolder.
+
+    Args:
+    image_path: the root of the images, formatted in ImageFolder style (i.e.
+        label/imagename.jpeg).
+    index_path: the directory to write the index to. It is created if needed.
+    extensions: the lowercase file extensions to include. Defaults to
+        IMG_EXTENSIONS.
+
+    Raises:
+        FileNotFoundError if image_path has no class folders.
+
+    Returns: The FileIndex loaded from index_path.
+    """
+    root = os.path.abspath(image_path)
+    classes = sorted(entry.name for entry in os.scandir(root)
+                     if entry.is_dir())
+    if not classes:
+        raise FileNotFoundError("Couldn't find any class folder in %s."
+                                %(image_path))
+    mtimes = {'.': os.stat(root).st_mtime_ns}
+    names, targets = [], []
+    for target, label in enumerate(classes):
+        for directory, _, file_names in sorted(
+                os.walk(os.path.join(root, label), followlinks=True)):
+            relative_directory = os.path.relpath(directory, root)
+            mtimes[relative_directory] = os.stat(directory).st_mtime_ns
+            for file_name in sorted(file_names):
+                if file_name.lower().endswith(tuple(extensions)):
+                    names.append(os.path.join(relative_directory,
+                                              file_name).encode('utf-8'))
+                    targets.append(target)
+
+    os.makedirs(index_path, exist_ok=True)
+    np.save(os.path.join(index_path, 'names.npy'),
+            np.array(names, dtype=bytes) if names else np.zeros(0, dtype='S1'))
+    np.save(os.path.join(index_path, 'targets.npy'),
+            np.array(targets, dtype=np.int32))
+    manifest = {'root': root, 'extensions': list(extensions),
+                'classes': classes, 'mtimes': mtimes}
+    with open(os.path.join(index_path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+    return FileIndex(index_path)
+
+
+def load_file_index(image_path, index_path, extensions=IMG_EXTENSIONS):
+    """
+    Returns the FileIndex at index_path, rebuilding it first if it is missing,
+        was built for another root or extensions, or any directory of the tree
+        changed since it was built.
+
+    Args: See build_file_index.
+    """
+    if os.path.isfile(os.path.join(index_path, 'manifest.json')):
+        index = FileIndex(index_path)
+        if index.root == os.path.abspath(image_path) \
+                and index.manifest['extensions'] == list(extensions) \
+                and index.is_current():
+            return index
+    return build_file_index(image_path, index_path, extensions)
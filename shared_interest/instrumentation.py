@@ -0,0 +1,211 @@
+"""Opt-in per-stage timing and memory instrumentation."""
+
+import contextlib
+import json
+import threading
+import time
+import tracemalloc
+
+
+class Recorder:
+    """
+    Accumulates the call count, wall time, bytes processed and peak memory of
+        each instrumented stage. Stages may run in several threads and may be
+        nested; the time of a nested stage is also counted in the enclosing
+        stage.
+    """
+
+    def __init__(self, trace_memory=False):
+        """
+        Args:
+        trace_memory: If True, traces allocations with tracemalloc to record
+            the peak memory allocated by each stage. Tracing slows every
+            allocation down, so it is off by default.
+        """
+        self.trace_memory = trace_memory
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def report(self):
+        """
+        Returns a dictionary mapping each stage name to a dictionary of its
+            'count', total 'seconds', total 'bytes' of input, and largest
+            'peak_bytes' allocated during one call (0 unless trace_memory).
+        """
+        with self._lock:
+            return {name: dict(stage) for name, stage in self._stages.items()}
+
+    def to_json(self, path=None):
+        """Returns the report as a JSON string, also writing it to path."""
+        report = json.dumps(self.report(), indent=2, sort_keys=True)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(report)
+        return report
+
+    def reset(self):
+        """Clears the recorded stages."""
+        with self._lock:
+            self._stages.clear()
+
+    def _add(self, name, seconds, nbytes, peak_bytes):
+        """Adds one call of a stage."""
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = {'count': 0, 'seconds': 0.0,
+                                              'bytes': 0, 'peak_bytes': 0}
+            stage['count'] += 1
+            stage['seconds'] += seconds
+            stage['bytes'] += nbytes
+            stage['peak_bytes'] = max(stage['peak_bytes'], peak_bytes)
+
+    def _memory_stack(self):
+        """Returns this thread's stack of [start, peak] of open stages."""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+
+class _Stage:
+    """Times one call of a stage for a Recorder."""
+
+    __slots__ = ('recorder', 'name', 'nbytes', 'start')
+
+    def __init__(self, recorder, name, nbytes):
+        self.recorder = recorder
+        self.name = name
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        if self.recorder.trace_memory and tracemalloc.is_tracing():
+            # tracemalloc has one peak, so save the enclosing stage's peak
+            # before resetting it for this stage.
+            current, peak = tracemalloc.get_traced_memory()
+            stack = self.recorder._memory_stack()
+            if stack:
+                stack[-1][1] = max(stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            stack.append([current, current])
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        peak_bytes = 0
+        if self.recorder.trace_memory and tracemalloc.is_tracing():
+            stack = self.recorder._memory_stack()
+            start, peak = stack.pop()
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            peak_bytes = peak - start
+            if stack:
+                stack[-1][1] = max(stack[-1][1], peak)
+        self.recorder._add(self.name, seconds, self.nbytes, peak_bytes)
+        return False
+
+
+class _NullStage:
+    """The stage returned while instrumentation is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+_recorder = None
+# Whether enable started tracemalloc, so disable stops it.
+_started_tracing = False
+
+
+def stage(name, *arrays):
+    """
+    Returns a context manager that records one call of the named stage, or a
+        shared no-op context manager while instrumentation is disabled.
+
+    Args:
+    name: the stage name, such as 'shared_interest.validate'.
+    *arrays: the inputs the stage processes. Their nbytes are added to the
+        stage's bytes; inputs without nbytes count as 0.
+    """
+    recorder = _recorder
+    if recorder is None:
+        return _NULL_STAGE
+    return _Stage(recorder, name,
+                  sum(getattr(array, 'nbytes', 0) for array in arrays))
+
+
+def enable(trace_memory=False):
+    """
+    Turns instrumentation on globally with a new Recorder and returns it.
+
+    Args:
+    trace_memory: If True, also records peak memory per stage, starting
+        tracemalloc if it is not already tracing. disable stops it again.
+        Defaults to False.
+    """
+    global _recorder, _started_tracing
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracing = True
+    _recorder = Recorder(trace_memory=trace_memory)
+    return _recorder
+
+
+def disable():
+    """
+    Turns instrumentation off and returns the Recorder that was active. Stops
+        tracemalloc if enable started it.
+    """
+    global _recorder, _started_tracing
+    recorder, _recorder = _recorder, None
+    if _started_tracing:
+        tracemalloc.stop()
+        _started_tracing = False
+    return recorder
+
+
+def is_enabled():
+    """Returns True if instrumentation is on."""
+    return _recorder is not None
+
+
+@contextlib.contextmanager
+def instrument(trace_memory=False):
+    """
+    Records the instrumented stages that run inside the with block.
+
+        with instrumentation.instrument() as recorder:
+            shared_interest(ground_truth, saliency)
+        print(recorder.report())
+
+    Args:
+    trace_memory: If True, also records peak memory per stage. tracemalloc is
+        started for the block if it is not already tracing. Defaults to False.
+
+    Yields: The Recorder of the block. The recorder that was active before
+        the block, if any, is restored afterwards.
+    """
+    global _recorder
+    previous = _recorder
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    _recorder = Recorder(trace_memory=trace_memory)
+    try:
+        yield _recorder
+    finally:
+        _recorder = previous
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def report():
+    """Returns the report of the global Recorder, or {} if disabled."""
+    return {} if _recorder is None else _recorder.report()
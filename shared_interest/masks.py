@@ -0,0 +1,246 @@
+"""Compact binary mask representations for Shared Interest."""
+
+import numpy as np
+
+
+# Number of set bits in every possible byte, used when numpy does not provide
+# a native popcount.
+_POPCOUNT_TABLE = np.array([bin(value).count('1') for value in range(256)],
+                           dtype=np.uint8)
+
+
+class PackedMask:
+    """
+    A batch of binary masks stored eight features to a byte. Each instance is
+        flattened and packed with np.packbits along the spatial axis, and the
+        packed bytes are zero padded to a whole number of 64-bit words so set
+        operations and popcounts can run on words instead of features.
+    """
+
+    def __init__(self, bits, shape):
+        """
+        Args:
+        bits: A uint8 numpy array of size (batch_size, num_bytes) holding the
+            packed masks. num_bytes must be a multiple of 8 and large enough to
+            hold every feature of an instance.
+        shape: The unpacked shape of the batch, (batch_size, height, width).
+        """
+        shape = tuple(shape)
+        num_features = int(np.prod(shape[1:]))
+        if bits.dtype != np.uint8 or bits.ndim != 2:
+            raise ValueError('bits must be a 2D uint8 array.')
+        if bits.shape[0] != shape[0] or bits.shape[1] % 8 != 0 \
+                or bits.shape[1] * 8 < num_features:
+            raise ValueError('bits of shape %s cannot hold masks of shape %s.'
+                             %(str(bits.shape), str(shape)))
+        self.bits = bits
+        self.shape = shape
+
+    @classmethod
+    def pack(cls, mask):
+        """
+        Packs a dense binary mask.
+
+        Args:
+        mask: A binary array of size (batch_size, height, width). Non-zero
+            values are treated as 1.
+
+        Returns: A PackedMask holding the same features as mask.
+        """
+        mask = np.asarray(mask)
+        batch_size = mask.shape[0]
+        flat = mask.reshape(batch_size, int(np.prod(mask.shape[1:])))
+        if flat.dtype != bool:
+            flat = flat != 0
+        num_bytes = -(-flat.shape[1] // 8)
+        bits = np.zeros((batch_size, -(-num_bytes // 8) * 8), dtype=np.uint8)
+        bits[:, :num_bytes] = np.packbits(flat, axis=1)
+        return cls(bits, mask.shape)
+
+    def unpack(self):
+        """Returns the masks as a dense uint8 array of size self.shape."""
+        num_features = int(np.prod(self.shape[1:]))
+        flat = np.unpackbits(self.bits, axis=1)[:, :num_features]
+        return flat.reshape(self.shape)
+
+    def count(self):
+        """Returns the number of features set in each instance."""
+        return _popcount(self.bits)
+
+    def intersection_count(self, other):
+        """Returns the number of features set in both self and other."""
+        self._check_compatible(other)
+        return _popcount(np.bitwise_and(self.bits, other.bits))
+
+    def union_count(self, other):
+        """Returns the number of features set in either of self and other."""
+        self._check_compatible(other)
+        return _popcount(np.bitwise_or(self.bits, other.bits))
+
+    @property
+    def nbytes(self):
+        """The number of bytes used to store the packed masks."""
+        return self.bits.nbytes
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        """Returns the PackedMask of the instances selected by index."""
+        bits = self.bits[index]
+        if bits.ndim != 2:
+            raise IndexError('PackedMask can only be indexed along the batch \
+                             axis with slices or arrays.')
+        return PackedMask(bits, (bits.shape[0],) + self.shape[1:])
+
+    def _check_compatible(self, other):
+        """Raises a ValueError if other does not hold masks like self."""
+        if not isinstance(other, PackedMask) or other.shape != self.shape:
+            raise ValueError('Packed masks must have the same shape.')
+
+
+class RLEMask:
+    """
+    A batch of binary masks stored as run lengths, like COCO's uncompressed
+        RLE. Each instance is flattened in column-major order and stored as the
+        lengths of its alternating runs of 0s and 1s, starting with a run of
+        0s that may be empty. The runs of all instances are concatenated into
+        one array with offsets to each instance's runs, so masks made of a few
+        large regions take space, and are scored in time, proportional to
+        their number of runs rather than their number of features.
+    """
+
+    def __init__(self, counts, offsets, shape):
+        """
+        Args:
+        counts: An int64 numpy array of the run lengths of every instance,
+            concatenated.
+        offsets: An int64 numpy array of size (batch_size + 1). The runs of
+            instance i are counts[offsets[i]:offsets[i + 1]].
+        shape: The decoded shape of the batch, (batch_size, height, width).
+        """
+        shape = tuple(shape)
+        counts = np.asarray(counts, dtype=np.int64)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        if offsets.shape != (shape[0] + 1,) or offsets[0] != 0 \
+                or offsets[-1] != len(counts):
+            raise ValueError('offsets must index the runs of %d instances.'
+                             %(shape[0]))
+        self.counts = counts
+        self.offsets = offsets
+        self.shape = shape
+
+    @classmethod
+    def encode(cls, mask):
+        """
+        Run-length encodes a dense binary mask.
+
+        Args:
+        mask: A binary array of size (batch_size, height, width). Non-zero
+            values are treated as 1.
+
+        Returns: An RLEMask holding the same features as mask.
+        """
+        mask = np.asarray(mask)
+        batch_size = mask.shape[0]
+        flat = mask.transpose(0, 2, 1).reshape(batch_size, -1) != 0
+        num_features = flat.shape[1]
+
+        # A run ends wherever the value changes. Padding every row with a
+        # leading 0 and a trailing flipped value makes the first run a run of
+        # 0s and ends the last run at num_features.
+        padded = np.empty((batch_size, num_features + 2), dtype=bool)
+        padded[:, 0] = False
+        padded[:, 1:-1] = flat
+        padded[:, -1] = ~padded[:, -2]
+        rows, ends = np.nonzero(padded[:, 1:] != padded[:, :-1])
+        starts = np.empty_like(ends)
+        starts[1:] = ends[:-1]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = rows[1:] != rows[:-1]
+        starts[first] = 0
+        offsets = np.zeros(batch_size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=batch_size), out=offsets[1:])
+        return cls(ends - starts, offsets, mask.shape)
+
+    def decode(self):
+        """Returns the masks as a dense uint8 array of size self.shape."""
+        batch_size, height, width = self.shape
+        values = (np.arange(len(self.counts)) - np.repeat(
+            self.offsets[:-1], np.diff(self.offsets))) % 2
+        flat = np.repeat(values.astype(np.uint8), self.counts)
+        return flat.reshape(batch_size, width, height).transpose(0, 2, 1)
+
+    def count(self):
+        """Returns the number of features set in each instance."""
+        return np.add.reduceat(self._ones(), self.offsets[:-1]) \
+            if len(self.counts) else np.zeros(len(self), dtype=np.int64)
+
+    def intersection_count(self, other):
+        """
+        Returns the number of features set in both self and other, found by
+            merging the run ends of the two masks instead of decoding them.
+        """
+        self._check_compatible(other)
+        # Cumulative run lengths place every run end on one axis spanning
+        # the whole batch, so all instances are merged at once.
+        self_ends = np.cumsum(self.counts)
+        other_ends = np.cumsum(other.counts)
+        ends = np.union1d(self_ends, other_ends)
+        ends = ends[ends > 0]
+        lengths = np.diff(ends, prepend=0)
+        self_values = self._run_values()[np.searchsorted(self_ends, ends)]
+        other_values = other._run_values()[np.searchsorted(other_ends, ends)]
+        num_features = self.shape[1] * self.shape[2]
+        return np.bincount((ends - 1) // num_features,
+                           weights=lengths * (self_values & other_values),
+                           minlength=len(self)).astype(np.int64)
+
+    def union_count(self, other):
+        """Returns the number of features set in either of self and other."""
+        return self.count() + other.count() - self.intersection_count(other)
+
+    @property
+    def nbytes(self):
+        """The number of bytes used to store the run lengths."""
+        return self.counts.nbytes + self.offsets.nbytes
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        """Returns the RLEMask of the instances selected by index."""
+        rows = np.arange(len(self))[index]
+        if rows.ndim != 1:
+            raise IndexError('RLEMask can only be indexed along the batch \
+                             axis with slices or arrays.')
+        lengths = self.offsets[rows + 1] - self.offsets[rows]
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        runs = np.arange(offsets[-1]) + np.repeat(
+            self.offsets[rows] - offsets[:-1], lengths)
+        return RLEMask(self.counts[runs], offsets,
+                       (len(rows),) + self.shape[1:])
+
+    def _run_values(self):
+        """Returns 1 for every run of 1s and 0 for every run of 0s."""
+        return ((np.arange(len(self.counts)) - np.repeat(
+            self.offsets[:-1], np.diff(self.offsets))) % 2).astype(bool)
+
+    def _ones(self):
+        """Returns the run lengths with the runs of 0s zeroed."""
+        return self.counts * self._run_values()
+
+    def _check_compatible(self, other):
+        """Raises a ValueError if other does not hold masks like self."""
+        if not isinstance(other, RLEMask) or other.shape != self.shape:
+            raise ValueError('RLE masks must have the same shape.')
+
+
+def _popcount(words):
+    """Returns the number of set bits in each row of a 2D uint8 array."""
+    if hasattr(np, 'bitwise_count'):
+        counts = np.bitwise_count(np.ascontiguousarray(words).view(np.uint64))
+    else:
+        counts = _POPCOUNT_TABLE[words]
+    return np.sum(counts, axis=1, dtype=np.int64)
@@ -0,0 +1,65 @@
+"""Parallel execution of batch functions over shards of the batch axis."""
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from shared_interest.masks import PackedMask, RLEMask
+
+
+def map_shards(function, arrays, workers, collect=True, **kwargs):
+    """
+    Splits arrays along the batch axis into contiguous shards, calls function
+        on each shard in a thread pool, and concatenates the results in order.
+        numpy releases the GIL in its array operations, so shards of the
+        memory-bound scoring and binarization run concurrently. Each instance
+        is computed exactly as in a serial call, so results are identical.
+
+    Args:
+    function: A function taking one shard of each array as positional
+        arguments, followed by kwargs.
+    arrays: A list of arrays, PackedMasks or RLEMasks with the same batch
+        size. None entries are passed to every shard as None.
+    workers: The number of shards and worker threads.
+    collect: If False, the results are discarded instead of concatenated, for
+        functions that write into an output array. Defaults to True.
+    **kwargs: Keyword arguments passed to every call of function.
+
+    Returns: The concatenated results. numpy arrays, PackedMasks and RLEMasks
+        are concatenated along the batch axis, and dictionaries are
+        concatenated value by value. None if collect is False.
+    """
+    batch_size = len(next(array for array in arrays if array is not None))
+    bounds = np.linspace(0, batch_size, min(workers, batch_size) + 1)
+    bounds = bounds.astype(int)
+    shards = [[None if array is None else array[start:end]
+               for array in arrays]
+              for start, end in zip(bounds[:-1], bounds[1:])]
+    if len(shards) <= 1:
+        result = function(*arrays, **kwargs)
+        return result if collect else None
+    with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        futures = [executor.submit(function, *shard, **kwargs)
+                   for shard in shards]
+        results = [future.result() for future in futures]
+    if not collect:
+        return None
+    return concatenate_results(results)
+
+
+def concatenate_results(results):
+    """Concatenates per-shard results along the batch axis."""
+    first = results[0]
+    if isinstance(first, dict):
+        return {key: concatenate_results([result[key] for result in results])
+                for key in first}
+    if isinstance(first, PackedMask):
+        bits = np.concatenate([result.bits for result in results])
+        return PackedMask(bits, (len(bits),) + first.shape[1:])
+    if isinstance(first, RLEMask):
+        offsets = [np.zeros(1, dtype=np.int64)]
+        for result in results:
+            offsets.append(result.offsets[1:] + offsets[-1][-1])
+        offsets = np.concatenate(offsets)
+        return RLEMask(np.concatenate([result.counts for result in results]),
+                       offsets, (len(offsets) - 1,) + first.shape[1:])
+    return np.concatenate(results)
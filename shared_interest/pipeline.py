@@ -0,0 +1,179 @@
+"""Overlapped producer/consumer evaluation of saliency and Shared Interest."""
+
+import queue
+import threading
+import time
+
+from shared_interest import backend
+from shared_interest import util
+from shared_interest.shared_interest import shared_interest
+from shared_interest.streaming import concatenate_scores
+
+
+# Put on a queue after the last item, or when a stage fails.
+_DONE = object()
+
+
+def run_pipeline(source, stages, queue_size=2):
+    """
+    Runs source and each stage in its own thread, connected by bounded
+        queues. A stage that gets ahead of the next one blocks once its output
+        queue is full, so at most queue_size items wait between two stages, and
+        the stages overlap: the wall time approaches that of the slowest stage
+        rather than the sum of all stages, as long as the stages release the
+        GIL (numpy, torch, and file reads do).
+
+    Args:
+    source: An iterable of items, such as a DataLoader. It is iterated in the
+        first thread, named 'load'.
+    stages: A list of (name, function) tuples. Each function is called on
+        every output of the previous stage, in order.
+    queue_size: The capacity of each queue between stages. Defaults to 2.
+
+    Raises:
+        The first exception raised by source or a stage. The other stages are
+        stopped before it is raised.
+
+    Returns: A list of the outputs of the last stage in source order, and a
+        dictionary mapping each stage name to a dictionary of its 'items',
+        busy 'seconds', 'wait_seconds' spent blocked on its queues, and
+        'throughput' in items per busy second.
+    """
+    names = ['load'] + [name for name, _ in stages]
+    if len(set(names)) != len(names):
+        raise ValueError('Stage names must be unique and not "load".')
+    queues = [queue.Queue(maxsize=queue_size) for _ in names]
+    stop = threading.Event()
+    errors = []
+    stats = {name: {'items': 0, 'seconds': 0.0, 'wait_seconds': 0.0}
+             for name in names}
+
+    def put(output_queue, item, stage_stats):
+        # Wait for space, giving up if another stage failed.
+        start = time.perf_counter()
+        while not stop.is_set():
+            try:
+                output_queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        stage_stats['wait_seconds'] += time.perf_counter() - start
+
+    def get(input_queue, stage_stats):
+        start = time.perf_counter()
+        while not stop.is_set():
+            try:
+                item = input_queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        else:
+            item = _DONE
+        stage_stats['wait_seconds'] += time.perf_counter() - start
+        return item
+
+    def load():
+        stage_stats = stats['load']
+        try:
+            iterator = iter(source)
+            while not stop.is_set():
+                start = time.perf_counter()
+                item = next(iterator, _DONE)
+                if item is _DONE:
+                    break
+                stage_stats['seconds'] += time.perf_counter() - start
+                stage_stats['items'] += 1
+                put(queues[0], item, stage_stats)
+        except BaseException as error:
+            errors.append(error)
+            stop.set()
+        put(queues[0], _DONE, stage_stats)
+
+    def run_stage(index, name, function):
+        stage_stats = stats[name]
+        try:
+            while True:
+                item = get(queues[index], stage_stats)
+                if item is _DONE:
+                    break
+                start = time.perf_counter()
+                output = function(item)
+                stage_stats['seconds'] += time.perf_counter() - start
+                stage_stats['items'] += 1
+                put(queues[index + 1], output, stage_stats)
+        except BaseException as error:
+            errors.append(error)
+            stop.set()
+        put(queues[index + 1], _DONE, stage_stats)
+
+    threads = [threading.Thread(target=load, name='load', daemon=True)]
+    for index, (name, function) in enumerate(stages):
+        threads.append(threading.Thread(target=run_stage,
+                                        args=(index, name, function),
+                                        name=name, daemon=True))
+    for thread in threads:
+        thread.start()
+
+    results = []
+    while True:
+        item = get(queues[-1], {'wait_seconds': 0.0})
+        if item is _DONE:
+            break
+        results.append(item)
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+    for stage_stats in stats.values():
+        seconds = stage_stats['seconds']
+        stage_stats['throughput'] = stage_stats['items'] / seconds \
+            if seconds > 0 else float('inf')
+    return results, stats
+
+
+def evaluate(batches, saliency_function, score='iou_coverage',
+             preprocess=None, queue_size=2):
+    """
+    Computes saliency and Shared Interest scores for a dataset, overlapping
+        loading, saliency, preprocessing and scoring in a pipeline of threads.
+
+    Args:
+    batches: An iterable of (images, ground_truth, labels) batches, such as a
+        DataLoader over shared_interest.datasets.imagenet.ImageNet.
+    saliency_function: A function taking images and labels and returning
+        saliency of size (batch_size, channels, height, width) or
+        (batch_size, height, width), for example a captum attribution method.
+        Tensors on any device are accepted.
+    score: A score name, a list of score names, or 'all'. See shared_interest.
+    preprocess: None or a function applied to the numpy saliency of size
+        (batch_size, height, width) before scoring, such as
+        util.binarize_std. Defaults to None.
+    queue_size: The capacity of each queue between stages. Defaults to 2.
+
+    Returns: The scores of all instances in the format returned by
+        shared_interest, and the per-stage statistics of run_pipeline, with the
+        stages 'load', 'saliency', 'preprocess', and 'score'.
+    """
+    def saliency_stage(batch):
+        images, ground_truth, labels = batch
+        return saliency_function(images, labels), ground_truth
+
+    def preprocess_stage(batch):
+        saliency, ground_truth = batch
+        saliency = backend.to_numpy(saliency)
+        if saliency.ndim == 4:
+            saliency = util.flatten(saliency)
+        if preprocess is not None:
+            saliency = preprocess(saliency)
+        return saliency, backend.to_numpy(ground_truth)
+
+    def score_stage(batch):
+        saliency, ground_truth = batch
+        return shared_interest(ground_truth, saliency, score=score)
+
+    results, stats = run_pipeline(batches, [('saliency', saliency_stage),
+                                            ('preprocess', preprocess_stage),
+                                            ('score', score_stage)],
+                                  queue_size=queue_size)
+    return concatenate_scores(results, score=score), stats
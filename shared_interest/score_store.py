@@ -0,0 +1,387 @@
+"""Persistent, indexed on-disk store of per-instance Shared Interest scores."""
+
+import json
+import os
+import numpy as np
+
+
+DEFAULT_SCORES = ('iou_coverage', 'ground_truth_coverage', 'saliency_coverage')
+
+# Categorical columns, stored as int32 codes into a vocabulary. Labels and
+# predictions share the 'label' vocabulary so they can be compared by code.
+_CATEGORICAL_COLUMNS = {'image_id': 'image_id', 'label': 'label',
+                        'prediction': 'label', 'method': 'method'}
+
+
+class ScoreStore:
+    """
+    A columnar store of Shared Interest scores. Every row holds an image id, a
+        label, a prediction, a saliency method, and one float64 value per score.
+        Each column is a raw binary file that is memory-mapped for reading,
+        and the vocabularies of the categorical columns are append-only files
+        next to them, so a write only appends its own rows and new values.
+        Queries use per-label and per-method indexes, which save_indexes
+        persists for later sessions. A row is identified by its image id and
+        saliency method: writing the same pair again updates the row in place
+        instead of appending a duplicate.
+    """
+
+    def __init__(self, path, scores=DEFAULT_SCORES):
+        """
+        Opens the store at path, creating it if it does not exist.
+
+        Args:
+        path: the directory of the store.
+        scores: the score columns of a new store. Ignored when opening an
+            existing store. Defaults to DEFAULT_SCORES.
+        """
+        self.path = path
+        manifest_file = os.path.join(path, 'manifest.json')
+        if os.path.isfile(manifest_file):
+            with open(manifest_file) as f:
+                self._manifest = json.load(f)
+        else:
+            os.makedirs(path, exist_ok=True)
+            self._manifest = {'num_rows': 0, 'version': 0,
+                              'scores': list(scores),
+                              'vocabulary_sizes': {'image_id': 0, 'label': 0,
+                                                   'method': 0},
+                              'index_versions': {}}
+            self._write_manifest()
+        self._vocabularies = {name: self._read_vocabulary(name)
+                              for name in self._manifest['vocabulary_sizes']}
+        self._codes = {name: {value: code for code, value in enumerate(values)}
+                       for name, values in self._vocabularies.items()}
+        # Sorted runs of (image_id, method) row keys, built on the first lookup.
+        self._key_runs = None
+        # Indexes built in memory since the saved ones are out of date.
+        self._indexes = {}
+
+    @property
+    def scores(self):
+        """The names of the score columns."""
+        return list(self._manifest['scores'])
+
+    def __len__(self):
+        return self._manifest['num_rows']
+
+    def write(self, image_ids, labels, predictions, method, scores):
+        """
+        Writes scores for a batch of instances. Rows whose image id and method
+            are already stored are updated in place; the others are appended.
+
+        Args:
+        image_ids: a sequence of batch_size image ids.
+        labels: a sequence of batch_size labels.
+        predictions: a sequence of batch_size predicted labels.
+        method: the saliency method name, or a sequence of batch_size names.
+        scores: a dictionary mapping every score column to an array of size
+            (batch_size), as returned by shared_interest with a list of scores.
+        """
+        image_ids = np.asarray(image_ids).astype(str)
+        batch_size = len(image_ids)
+        if isinstance(method, str):
+            method = [method] * batch_size
+        columns = {'image_id': image_ids, 'label': labels,
+                   'prediction': predictions, 'method': method}
+        score_values = {}
+        for name in self.scores:
+            if name not in scores:
+                raise ValueError('Missing scores for %s.' %(name))
+            score_values[name] = np.asarray(scores[name], dtype=np.float64)
+        if any(len(values) != batch_size for values
+               in list(columns.values()) + list(score_values.values())):
+            raise ValueError('Every column must have batch_size values.')
+        codes = {name: self._encode(name, values)
+                 for name, values in columns.items()}
+        codes.update(score_values)
+
+        # Update stored rows in place.
+        rows = self._find(codes['image_id'], codes['method'])
+        existing = rows >= 0
+        if existing.any():
+            for name, values in codes.items():
+                column = self._open(name, mode='r+')
+                column[rows[existing]] = values[existing]
+                column.flush()
+                del column
+
+        # Append new rows and values. Files are truncated to the committed
+        # length first, so bytes from an interrupted write are discarded.
+        num_rows = len(self)
+        new_rows = ~existing
+        # Keep only the last write of an (image_id, method) pair in the batch.
+        keys = _row_keys(codes['image_id'], codes['method'])
+        last = np.zeros(batch_size, dtype=bool)
+        _, last_writes = np.unique(keys[::-1], return_index=True)
+        last[batch_size - 1 - last_writes] = True
+        new_rows &= last
+        for name, values in codes.items():
+            with open(self._column_file(name), 'ab') as f:
+                f.truncate(num_rows * values.itemsize)
+                f.write(np.ascontiguousarray(values[new_rows]).tobytes())
+        vocabulary_sizes = self._manifest['vocabulary_sizes']
+        for name in vocabulary_sizes:
+            vocabulary_sizes[name] = self._append_vocabulary(
+                name, vocabulary_sizes[name])
+
+        self._manifest['num_rows'] = num_rows + int(new_rows.sum())
+        self._manifest['version'] += 1
+        self._write_manifest()
+        self._add_keys(keys[new_rows],
+                       np.arange(num_rows, self._manifest['num_rows']))
+
+    def save_indexes(self):
+        """
+        Saves the per-label and per-method indexes of the current rows, so
+            later sessions query them without rebuilding. Until the next
+            save, queries after a write rebuild the indexes in memory.
+        """
+        version = self._manifest['version']
+        index_versions = self._manifest['index_versions']
+        if all(index_versions.get(name) == version
+               for name in ['label', 'method']):
+            return
+        for name in ['label', 'method']:
+            for part, array in zip(['order', 'offsets'], self._index(name)):
+                index_file = self._index_file(name, part)
+                with open(index_file + '.tmp', 'wb') as f:
+                    np.save(f, array)
+                os.replace(index_file + '.tmp', index_file)
+            index_versions[name] = version
+        self._write_manifest()
+
+    def column(self, name):
+        """
+        Returns a column as a read-only memory-mapped array. Categorical
+            columns are returned as int32 codes into vocabulary(name).
+        """
+        return self._open(name)
+
+    def vocabulary(self, name):
+        """Returns the values of a categorical column, indexed by code."""
+        return np.array(self._vocabularies[_CATEGORICAL_COLUMNS[name]],
+                        dtype=str)
+
+    def rows(self, label=None, method=None, correct=None):
+        """
+        Returns the sorted row numbers matching all of the given filters.
+
+        Args:
+        label: None or a label to select.
+        method: None or a saliency method to select.
+        correct: None, or True or False to select rows whose prediction does
+            or does not equal their label.
+        """
+        rows = None
+        for name, value in [('label', label), ('method', method)]:
+            if value is None:
+                continue
+            selected = self._indexed_rows(name, str(value))
+            rows = selected if rows is None else np.intersect1d(
+                rows, selected, assume_unique=True)
+        if rows is None:
+            rows = np.arange(len(self))
+        if correct is not None:
+            matches = (np.asarray(self._open('label')[rows])
+                       == np.asarray(self._open('prediction')[rows]))
+            rows = rows[matches == correct]
+        return rows
+
+    def lowest(self, score, k=10, **filters):
+        """
+        Returns the k rows with the lowest score among the rows selected by
+            the filters of rows(), in increasing score order, as a dictionary
+            of decoded columns.
+        """
+        return self._top_k(score, k, largest=False, **filters)
+
+    def highest(self, score, k=10, **filters):
+        """
+        Returns the k rows with the highest score among the rows selected by
+            the filters of rows(), in decreasing score order, as a dictionary
+            of decoded columns.
+        """
+        return self._top_k(score, k, largest=True, **filters)
+
+    def records(self, rows):
+        """Returns the given rows as a dictionary of decoded column arrays."""
+        rows = np.asarray(rows, dtype=np.int64)
+        records = {'row': rows}
+        for name, column in _CATEGORICAL_COLUMNS.items():
+            # Decode only the distinct codes of the rows, not the vocabulary.
+            codes, inverse = np.unique(np.asarray(self._open(name)[rows]),
+                                       return_inverse=True)
+            vocabulary = self._vocabularies[column]
+            values = np.array([vocabulary[code] for code in codes], dtype=str)
+            records[name] = values[inverse.reshape(-1)]
+        for name in self.scores:
+            records[name] = np.asarray(self._open(name)[rows])
+        return records
+
+    def _top_k(self, score, k, largest, **filters):
+        """Returns the records of the k lowest or highest scoring rows."""
+        if score not in self.scores:
+            raise ValueError('%s is not a score column.' %(score))
+        rows = self.rows(**filters)
+        values = np.asarray(self._open(score)[rows])
+        if largest:
+            values = -values
+        if k < len(rows):
+            candidates = np.argpartition(values, k)[:k]
+        else:
+            candidates = np.arange(len(rows))
+        candidates = candidates[np.argsort(values[candidates], kind='stable')]
+        return self.records(rows[candidates])
+
+    def _indexed_rows(self, name, value):
+        """Returns the rows whose categorical column name equals value."""
+        code = self._codes[_CATEGORICAL_COLUMNS[name]].get(value)
+        if code is None:
+            return np.zeros(0, dtype=np.int64)
+        order, offsets = self._index(name)
+        if code + 1 >= len(offsets):
+            return np.zeros(0, dtype=np.int64)
+        return np.asarray(order[offsets[code]:offsets[code + 1]])
+
+    def _index(self, name):
+        """
+        Returns the index of a categorical column: the rows sorted by code and
+            the offsets of each code's rows. The saved index is used if it is
+            current, and otherwise the index is built in memory. Reads never
+            write to the store.
+        """
+        version = self._manifest['version']
+        if self._manifest['index_versions'].get(name) == version:
+            return (np.load(self._index_file(name, 'order'), mmap_mode='r'),
+                    np.load(self._index_file(name, 'offsets'), mmap_mode='r'))
+        if self._indexes.get(name, (None,))[0] != version:
+            codes = np.asarray(self._open(name))
+            order = np.argsort(codes, kind='stable').astype(np.int64)
+            num_codes = len(self._vocabularies[name])
+            offsets = np.concatenate([[0], np.cumsum(
+                np.bincount(codes, minlength=num_codes))]).astype(np.int64)
+            self._indexes[name] = (version, order, offsets)
+        return self._indexes[name][1:]
+
+    def _find(self, image_codes, method_codes):
+        """Returns the rows of (image_id, method) pairs, or -1 if not stored."""
+        if self._key_runs is None:
+            self._key_runs = []
+            self._add_keys(_row_keys(np.asarray(self._open('image_id')),
+                                     np.asarray(self._open('method'))),
+                           np.arange(len(self)))
+        keys = _row_keys(image_codes, method_codes)
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        for sorted_keys, run_rows in self._key_runs:
+            positions = np.minimum(np.searchsorted(sorted_keys, keys),
+                                   len(sorted_keys) - 1)
+            found = sorted_keys[positions] == keys
+            rows[found] = run_rows[positions[found]]
+        return rows
+
+    def _add_keys(self, keys, rows):
+        """
+        Adds the keys of appended rows to the key lookup as a sorted run.
+            Runs of similar size are merged, like a binary counter, so there
+            are O(log num_rows) runs and each key is merged O(log num_rows)
+            times instead of the whole store being re-sorted on every write.
+        """
+        if self._key_runs is None or len(keys) == 0:
+            return
+        order = np.argsort(keys, kind='stable')
+        run = (keys[order], rows[order])
+        while self._key_runs and len(self._key_runs[-1][0]) <= len(run[0]):
+            previous = self._key_runs.pop()
+            merged_keys = np.concatenate([previous[0], run[0]])
+            # Timsort merges the two sorted halves in linear time.
+            order = np.argsort(merged_keys, kind='stable')
+            run = (merged_keys[order],
+                   np.concatenate([previous[1], run[1]])[order])
+        self._key_runs.append(run)
+
+    def _encode(self, name, values):
+        """Returns the int32 codes of values, extending the vocabulary."""
+        vocabulary_name = _CATEGORICAL_COLUMNS[name]
+        codes = self._codes[vocabulary_name]
+        vocabulary = self._vocabularies[vocabulary_name]
+        encoded = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            value = str(value)
+            if value not in codes:
+                codes[value] = len(vocabulary)
+                vocabulary.append(value)
+            encoded[i] = codes[value]
+        return encoded
+
+    def _open(self, name, mode='r'):
+        """Memory-maps the committed rows of a column."""
+        dtype = np.int32 if name in _CATEGORICAL_COLUMNS else np.float64
+        if len(self) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self._column_file(name), dtype=dtype, mode=mode,
+                         shape=(len(self),))
+
+    def _read_vocabulary(self, name):
+        """Returns the committed values of a vocabulary as a list."""
+        size = self._manifest['vocabulary_sizes'][name]
+        if size == 0:
+            return []
+        ends = np.fromfile(self._vocabulary_file(name, 'offsets'),
+                           dtype=np.int64, count=size)
+        with open(self._vocabulary_file(name, 'values'), 'rb') as f:
+            data = f.read(int(ends[-1]))
+        starts = np.concatenate([[0], ends[:-1]])
+        return [data[start:end].decode('utf-8')
+                for start, end in zip(starts, ends)]
+
+    def _append_vocabulary(self, name, committed_size):
+        """
+        Appends the values of a vocabulary added since committed_size to its
+            files and returns its new size. Values are stored as utf-8 bytes
+            with an int64 file of their end offsets.
+        """
+        vocabulary = self._vocabularies[name]
+        offsets_file = self._vocabulary_file(name, 'offsets')
+        values_file = self._vocabulary_file(name, 'values')
+        committed_bytes = 0
+        if committed_size:
+            committed_bytes = int(np.fromfile(
+                offsets_file, dtype=np.int64, count=committed_size)[-1])
+        new_values = [value.encode('utf-8')
+                      for value in vocabulary[committed_size:]]
+        ends = committed_bytes + np.cumsum([len(value)
+                                            for value in new_values],
+                                           dtype=np.int64)
+        with open(values_file, 'ab') as f:
+            f.truncate(committed_bytes)
+            f.write(b''.join(new_values))
+        with open(offsets_file, 'ab') as f:
+            f.truncate(committed_size * 8)
+            f.write(ends.astype(np.int64).tobytes())
+        return len(vocabulary)
+
+    def _column_file(self, name):
+        """Returns the path of a column's binary file."""
+        return os.path.join(self.path, '%s.bin' %name)
+
+    def _vocabulary_file(self, name, part):
+        """Returns the path of a vocabulary's 'values' or 'offsets' file."""
+        return os.path.join(self.path, '%s_vocabulary_%s.bin' %(name, part))
+
+    def _index_file(self, name, part):
+        """Returns the path of an index's saved 'order' or 'offsets' array."""
+        return os.path.join(self.path, '%s_%s.npy' %(name, part))
+
+    def _write_manifest(self):
+        """Atomically writes the manifest."""
+        manifest_file = os.path.join(self.path, 'manifest.json')
+        with open(manifest_file + '.tmp', 'w') as f:
+            json.dump(self._manifest, f)
+        os.replace(manifest_file + '.tmp', manifest_file)
+
+
+def _row_keys(image_codes, method_codes):
+    """Combines image id and method codes into int64 row keys."""
+    return (np.asarray(image_codes, dtype=np.int64) << 32) \
+        | np.asarray(method_codes, dtype=np.int64)
@@ -1,8 +1,13 @@
 """Scoring functions for Shared Interest."""
 
+import collections
 import numpy as np
 
+from shared_interest import backend
+from shared_interest.masks import PackedMask, RLEMask
 
+
+@backend.accepts_tensors
 def iou_coverage(ground_truth_features, saliency_features):
     """
     Returns the Shared Interest IoU Coverage metric. The result is computed as
@@ -15,13 +20,22 @@ def iou_coverage(ground_truth_features, saliency_features):
         representing the ground truth features.
     saliency_features: A binary array of size (batch_size, height, width)
         representing the saliency features.
+
+    Both arrays may also be PackedMasks or RLEMasks, in which case the
+        intersection and union are counted on the packed words or the runs.
     """
+    ground_truth_features, saliency_features = _common_format(
+        ground_truth_features, saliency_features)
+    if isinstance(ground_truth_features, (PackedMask, RLEMask)):
+        return (ground_truth_features.intersection_count(saliency_features)
+                / ground_truth_features.union_count(saliency_features))
     intersection = np.sum(ground_truth_features * saliency_features, axis=(1,2))
     union = np.sum(np.logical_or(ground_truth_features, saliency_features),
                    axis=(1,2))
     return intersection / union
 
 
+@backend.accepts_tensors
 def saliency_coverage(ground_truth_features, saliency_features):
     """
     Returns the Shared Interest Saliency Coverage metric. The result is computed
@@ -37,12 +51,22 @@ def saliency_coverage(ground_truth_features, saliency_features):
         ground truth and saliency feature sets divided by the size of the
         saliency feature set. If continuous, the method computes the proportion
         of saliency within the ground truth region.
+
+    Both arrays may also be PackedMasks or RLEMasks, in which case the
+        intersection and saliency size are counted on the packed words or the
+        runs.
     """
+    ground_truth_features, saliency_features = _common_format(
+        ground_truth_features, saliency_features)
+    if isinstance(ground_truth_features, (PackedMask, RLEMask)):
+        return (ground_truth_features.intersection_count(saliency_features)
+                / saliency_features.count())
     intersection = np.sum(ground_truth_features * saliency_features, axis=(1,2))
     explanation_saliency = np.sum(saliency_features, axis=(1,2))
     return intersection / explanation_saliency
 
 
+@backend.accepts_tensors
 def ground_truth_coverage(ground_truth_features, saliency_features):
     """
     Returns the Shared Interest Ground Truth Coverage metric. The result is
@@ -55,7 +79,179 @@ def ground_truth_coverage(ground_truth_features, saliency_features):
         representing the ground truth features.
     saliency_features: A binary array of size (batch_size, height, width)
         representing the saliency features.
+
+    Both arrays may also be PackedMasks or RLEMasks, in which case the
+        intersection and ground truth size are counted on the packed words or
+        the runs.
     """
+    ground_truth_features, saliency_features = _common_format(
+        ground_truth_features, saliency_features)
+    if isinstance(ground_truth_features, (PackedMask, RLEMask)):
+        return (ground_truth_features.intersection_count(saliency_features)
+                / ground_truth_features.count())
     intersection = np.sum(ground_truth_features * saliency_features, axis=(1,2))
     ground_truth_saliency = np.sum(ground_truth_features, axis=(1,2))
     return intersection / ground_truth_saliency
+
+
+ScoringFunction = collections.namedtuple(
+    'ScoringFunction', ['function', 'binary_saliency', 'statistics'])
+
+# Registered scoring functions, keyed by score name.
+SCORING_FUNCTIONS = {}
+
+
+def register_scoring_function(name, function=None, binary_saliency=True,
+                              statistics=None):
+    """
+    Registers a vectorized scoring function so shared_interest and the other
+        scoring entry points can use it by name. Can be used as a decorator by
+        omitting function.
+
+    Args:
+    name: The score name to register the function under.
+    function: A function taking ground truth and saliency arrays of size
+        (batch_size, height, width) and returning a numpy array of size
+        (batch_size) of scores.
+    binary_saliency: If True, the function requires binary saliency. Defaults
+        to True.
+    statistics: None or a (numerator, denominator) tuple of statistic names
+        from _set_statistics ('intersection', 'union', 'ground_truth_size',
+        'saliency_mass'). If given, the score is computed from the statistics
+        shared by all scores in a fused call instead of by calling function.
+        Defaults to None.
+
+    Returns: function.
+    """
+    if function is None:
+        return lambda function: register_scoring_function(
+            name, function, binary_saliency=binary_saliency,
+            statistics=statistics)
+    SCORING_FUNCTIONS[name] = ScoringFunction(function, binary_saliency,
+                                              statistics)
+    return function
+
+
+register_scoring_function('iou_coverage', iou_coverage,
+                          statistics=('intersection', 'union'))
+register_scoring_function('saliency_coverage', saliency_coverage,
+                          binary_saliency=False,
+                          statistics=('intersection', 'saliency_mass'))
+register_scoring_function('ground_truth_coverage', ground_truth_coverage,
+                          statistics=('intersection', 'ground_truth_size'))
+
+
+def _set_statistics(ground_truth_features, saliency_features):
+    """
+    Computes the per-instance statistics shared by the scoring functions in a
+        single pass: the intersection of the ground truth and saliency, their
+        union, the size of the ground truth and the total saliency. The union
+        is derived from the other statistics, so it is only meaningful when the
+        saliency is binary.
+
+    Args:
+    ground_truth_features: A binary array of size (batch_size, height, width)
+        representing the ground truth features.
+    saliency_features: An array of size (batch_size, height, width)
+        representing the saliency features.
+
+    Returns: A dictionary mapping each statistic name to a float64 numpy array
+        of size (batch_size).
+    """
+    ground_truth_features, saliency_features = _common_format(
+        ground_truth_features, saliency_features)
+    if isinstance(ground_truth_features, (PackedMask, RLEMask)):
+        intersection = ground_truth_features.intersection_count(
+            saliency_features).astype(np.float64)
+        ground_truth_size = ground_truth_features.count().astype(np.float64)
+        saliency_mass = saliency_features.count().astype(np.float64)
+        return {'intersection': intersection,
+                'union': ground_truth_size + saliency_mass - intersection,
+                'ground_truth_size': ground_truth_size,
+                'saliency_mass': saliency_mass}
+    batch_size = ground_truth_features.shape[0]
+    ground_truth = ground_truth_features.reshape(batch_size, -1)
+    saliency = saliency_features.reshape(batch_size, -1)
+    intersection = np.einsum('ij,ij->i', ground_truth, saliency,
+                             dtype=np.float64)
+    ground_truth_size = np.sum(ground_truth, axis=1, dtype=np.float64)
+    saliency_mass = np.sum(saliency, axis=1, dtype=np.float64)
+    union = ground_truth_size + saliency_mass - intersection
+    return {'intersection': intersection, 'union': union,
+            'ground_truth_size': ground_truth_size,
+            'saliency_mass': saliency_mass}
+
+
+def _fused_scores(ground_truth_features, saliency_features, scores):
+    """
+    Computes several Shared Interest scores from one pass over the inputs.
+        Registered scores without statistics are computed by their functions.
+
+    Args:
+    ground_truth_features: A binary array of size (batch_size, height, width)
+        representing the ground truth features.
+    saliency_features: An array of size (batch_size, height, width)
+        representing the saliency features.
+    scores: A list of registered score names.
+
+    Returns: A dictionary mapping each score name to a numpy array of size
+        (batch_size).
+    """
+    fused = [score for score in scores
+             if SCORING_FUNCTIONS[score].statistics is not None]
+    results = {}
+    if fused:
+        statistics = _set_statistics(ground_truth_features, saliency_features)
+        results.update(_scores_from_statistics(statistics, fused))
+    for score in scores:
+        if score not in results:
+            results[score] = SCORING_FUNCTIONS[score].function(
+                ground_truth_features, saliency_features)
+    return {score: results[score] for score in scores}
+
+
+def _scores_from_statistics(statistics, scores):
+    """
+    Computes Shared Interest scores from precomputed set statistics.
+
+    Args:
+    statistics: A dictionary of per-instance statistics in the format returned
+        by _set_statistics.
+    scores: A list of registered score names.
+
+    Raises:
+        ValueError if a score was not registered with statistics.
+
+    Returns: A dictionary mapping each score name to a numpy array of size
+        (batch_size).
+    """
+    results = {}
+    for score in scores:
+        if SCORING_FUNCTIONS[score].statistics is None:
+            raise ValueError('%s cannot be computed from set statistics.'
+                             %(score))
+        numerator, denominator = SCORING_FUNCTIONS[score].statistics
+        results[score] = statistics[numerator] / statistics[denominator]
+    return results
+
+
+def _common_format(ground_truth_features, saliency_features):
+    """
+    Returns the features in a common representation. PackedMasks and RLEMasks
+        are kept if both inputs use the same one, and decoded to dense arrays
+        otherwise.
+    """
+    compact_types = (PackedMask, RLEMask)
+    if isinstance(ground_truth_features, compact_types) \
+            and type(ground_truth_features) is type(saliency_features):
+        return ground_truth_features, saliency_features
+    return _dense(ground_truth_features), _dense(saliency_features)
+
+
+def _dense(features):
+    """Decodes a PackedMask or RLEMask to a dense array."""
+    if isinstance(features, PackedMask):
+        return features.unpack()
+    if isinstance(features, RLEMask):
+        return features.decode()
+    return features
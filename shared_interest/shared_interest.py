@@ -1,13 +1,23 @@
 """Shared Interest method"""
 
-import inspect
 import numpy as np
 
+from shared_interest import backend
+from shared_interest import instrumentation
+from shared_interest import parallel
 from shared_interest import scoring_functions
+from shared_interest.masks import PackedMask, RLEMask
 
 
+# The number of features _is_binary checks at a time, small enough for its
+# temporary to stay in cache.
+_BLOCK_FEATURES = 2**16
+
+
+@backend.accepts_tensors
 def shared_interest(ground_truth_features, saliency_features,
-                    score='iou_coverage'):
+                    score='iou_coverage', validate=True,
+                    workers=None):
     """
     Returns the Shared Interest score for the given ground truth and saliency
         features.
@@ -15,58 +25,137 @@ def shared_interest(ground_truth_features, saliency_features,
     Args:
     ground_truth_features: A binay array of size (batch_size, height, width)
         representing the ground truth features. 1 represents features in the
-        ground truth and 0 represents features not in the ground truth.
+        ground truth and 0 represents features not in the ground truth. Can
+        also be a PackedMask or an RLEMask.
     saliency_features: An array of size (batch_size, height, width) representing
         the saliency features. If the array is binary (contains only 0s and 1s),
         set-based scoring is used and all scoring functions will work. If the
         array is continuous, only saliency_coverage scoring can be used and the
         proportion of saliency in the ground truth region will be returned.
+        Binary saliency can also be a PackedMask or an RLEMask.
     score: One of the strings: 'iou_coverage', 'ground_truth_coverage', or
-        'saliency_coverage' indicating which scoring function to use.
+        'saliency_coverage' indicating which scoring function to use. Can also
+        be a list of these strings or 'all' to compute several scores from a
+        single pass over the inputs. Any name registered with
+        scoring_functions.register_scoring_function can be used.
+    validate: If True, checks that the features are binary where required.
+        bool arrays, PackedMasks, and RLEMasks cannot hold other values and
+        are not scanned; other arrays are checked in a single pass. Set to
+        False to skip validation for trusted input, in which case
+        saliency_features is assumed binary whenever a score requires it.
+        Defaults to True.
+    workers: None or the number of threads to score shards of the batch on.
+        The scores are identical to a serial call. Defaults to None.
 
     Raises:
         ValueError if score is not a valid scoring function.
         ValueError if saliency_features is no binary (contains values other
-            than 0 or 1) and the score is not 'saliency_coverage'.
+            than 0 or 1) and a score requires binary saliency.
         ValueError if ground_truth_features is not binary.
 
+    Both features may also be torch tensors. CPU tensors are scored through
+        zero-copy numpy views and the scores are returned as tensors.
+
     Returns:
     A numpy array of size (batch_size) of floating point shared interest scores.
+        If score is a list or 'all', a dictionary mapping each score name to
+        its numpy array of size (batch_size).
     """
-    ground_truth_features = _convert_to_numpy(ground_truth_features)
-    saliency_features = _convert_to_numpy(saliency_features)
+    with instrumentation.stage('shared_interest.convert',
+                               ground_truth_features, saliency_features):
+        ground_truth_features = _convert_to_numpy(ground_truth_features)
+        saliency_features = _convert_to_numpy(saliency_features)
+    score_names = _score_names(score)
 
     # Check input invariances.
-    if not _is_binary(ground_truth_features):
-        raise ValueError('ground_truth_features must be binary array.')
     if ground_truth_features.shape != saliency_features.shape:
         raise ValueError('ground_truth_features and saliency_features must \
                          be the same shape.')
-    if not _is_binary(saliency_features) and score != 'saliency_coverage':
-        raise ValueError('Non-binary saliency features can only use \
-                         saliency_coverage score.')
+    if workers is not None and workers > 1:
+        return parallel.map_shards(shared_interest,
+                                   [ground_truth_features, saliency_features],
+                                   workers, score=score, validate=validate)
+    requires_binary = any(
+        scoring_functions.SCORING_FUNCTIONS[name].binary_saliency
+        for name in score_names)
+    if validate:
+        with instrumentation.stage('shared_interest.validate',
+                                   ground_truth_features, saliency_features):
+            ground_truth_is_binary = _is_binary(ground_truth_features)
+            saliency_is_binary = _is_binary(saliency_features)
+        if not ground_truth_is_binary:
+            raise ValueError('ground_truth_features must be binary array.')
+        if not saliency_is_binary and requires_binary:
+            raise ValueError('Non-binary saliency features can only use \
+                             saliency_coverage score.')
+    else:
+        saliency_is_binary = requires_binary or _is_trusted(saliency_features)
+
+    # Binary saliency is non-negative, so only continuous saliency needs abs.
+    if not saliency_is_binary:
+        with instrumentation.stage('shared_interest.abs', saliency_features):
+            saliency_features = np.abs(saliency_features)
+
+    # Compute the shared interest scores.
+    with instrumentation.stage('shared_interest.score', ground_truth_features,
+                               saliency_features):
+        if isinstance(score, str) and score != 'all':
+            score_function = scoring_functions.SCORING_FUNCTIONS[score].function
+            return score_function(ground_truth_features, saliency_features)
+        return scoring_functions._fused_scores(ground_truth_features,
+                                               saliency_features, score_names)
 
-    # Get the scoring function from score input.
-    score_functions = dict(inspect.getmembers(scoring_functions,
-                                              inspect.isfunction)
-                          )
-    if score not in score_functions:
-        raise ValueError('%s is not a valid scoring function.' %(score))
-    score_function = score_functions[score]
 
-    # Compute the shared interest score.
-    score = score_function(ground_truth_features, np.abs(saliency_features))
-    return score
+def _score_names(score):
+    """Returns the list of score names requested by score."""
+    score_functions = scoring_functions.SCORING_FUNCTIONS
+    if isinstance(score, str):
+        score_names = list(score_functions) if score == 'all' else [score]
+    else:
+        score_names = list(score)
+    for name in score_names:
+        if name not in score_functions:
+            raise ValueError('%s is not a valid scoring function.' %(name))
+    return score_names
 
 
 def _is_binary(array):
-    """Checks if array only contains 0s and 1s."""
-    return np.isin(array, [0, 1]).all()
+    """
+    Checks if array only contains 0s and 1s in a single pass. Integers are
+        viewed as unsigned, so negative values become large and one max check
+        suffices. Floats are 0 or 1 exactly when x * (x - 1) is 0, which is
+        checked a cache-sized block of instances at a time.
+    """
+    if _is_trusted(array) or array.size == 0:
+        return True
+    if np.issubdtype(array.dtype, np.integer):
+        unsigned = array.view(np.dtype('u%d' %(array.dtype.itemsize)))
+        return bool(unsigned.max() <= 1)
+    if not np.issubdtype(array.dtype, np.floating):
+        return bool(np.isin(array, [0, 1]).all())
+    array = array.reshape((len(array),) + array.shape[1:]) if array.ndim \
+        else array.reshape(1)
+    instance_size = array.size // len(array)
+    block_size = max(1, _BLOCK_FEATURES // max(instance_size, 1))
+    buffer = np.empty((block_size,) + array.shape[1:], dtype=array.dtype)
+    for start in range(0, len(array), block_size):
+        block = array[start:start + block_size]
+        product = buffer[:len(block)]
+        np.subtract(block, 1, out=product)
+        np.multiply(product, block, out=product)
+        # NaNs are truthy, so they are rejected too.
+        if product.any():
+            return False
+    return True
+
+
+def _is_trusted(array):
+    """Checks if array is binary by construction."""
+    return isinstance(array, (PackedMask, RLEMask)) or array.dtype == bool
 
 
 def _convert_to_numpy(array):
     """Converys array to a numpy array if it is not already a numpy array."""
-    if not isinstance(array, np.ndarray):
-        array = np.array(array)
+    if not isinstance(array, (np.ndarray, PackedMask, RLEMask)):
+        array = np.asarray(array)
     return array
-        
\ No newline at end of file
@@ -0,0 +1,132 @@
+"""Bounded-memory Shared Interest scoring over chunked inputs."""
+
+import collections
+import os
+import numpy as np
+
+from shared_interest import backend
+from shared_interest.masks import PackedMask, RLEMask
+from shared_interest.parallel import concatenate_results
+from shared_interest.shared_interest import shared_interest
+
+
+def iter_shared_interest(ground_truth_features, saliency_features,
+                         score='iou_coverage', chunk_size=256):
+    """
+    Yields the Shared Interest scores for the given ground truth and saliency
+        features one chunk of instances at a time, so only one chunk of each
+        input is held in memory.
+
+    Args:
+    ground_truth_features: The binary ground truth features. Either an array
+        of size (num_instances, height, width) such as an np.memmap, the path
+        to a .npy file that is memory-mapped, or an iterable of arrays of size
+        (batch_size, height, width).
+    saliency_features: The saliency features in any of the forms accepted for
+        ground_truth_features. The two inputs do not need to use the same form
+        or batch sizes, but must hold the same number of instances.
+    score: A score name, a list of score names, or 'all'. See shared_interest.
+    chunk_size: The number of instances scored at a time. Defaults to 256.
+
+    Raises:
+        ValueError if the inputs hold different numbers of instances.
+
+    Yields: The shared interest scores of each chunk in the format returned by
+        shared_interest.
+    """
+    ground_truth_chunks = _iter_chunks(ground_truth_features, chunk_size)
+    saliency_chunks = _iter_chunks(saliency_features, chunk_size)
+    sentinel = object()
+    while True:
+        ground_truth_chunk = next(ground_truth_chunks, sentinel)
+        saliency_chunk = next(saliency_chunks, sentinel)
+        if ground_truth_chunk is sentinel and saliency_chunk is sentinel:
+            return
+        if ground_truth_chunk is sentinel or saliency_chunk is sentinel \
+                or len(ground_truth_chunk) != len(saliency_chunk):
+            raise ValueError('ground_truth_features and saliency_features \
+                             must have the same number of instances.')
+        yield shared_interest(ground_truth_chunk, saliency_chunk, score=score)
+
+
+def streaming_shared_interest(ground_truth_features, saliency_features,
+                              score='iou_coverage', chunk_size=256):
+    """
+    Returns the Shared Interest scores for all instances, computed with
+        iter_shared_interest so peak memory is bounded by the chunk size rather
+        than the dataset size.
+
+    Args: See iter_shared_interest.
+
+    Returns: A numpy array of size (num_instances) of shared interest scores.
+        If score is a list or 'all', a dictionary mapping each score name to
+        its numpy array of size (num_instances).
+    """
+    chunks = list(iter_shared_interest(ground_truth_features,
+                                       saliency_features, score=score,
+                                       chunk_size=chunk_size))
+    return concatenate_scores(chunks, score=score)
+
+
+def concatenate_scores(chunks, score='iou_coverage'):
+    """
+    Concatenates per-chunk shared interest scores.
+
+    Args:
+    chunks: A list of chunk scores as returned by shared_interest.
+    score: The score argument the chunks were computed with.
+
+    Returns: The concatenated scores in the format returned by shared_interest.
+    """
+    if isinstance(score, str) and score != 'all':
+        if not chunks:
+            return np.zeros(0)
+        return np.concatenate(chunks)
+    if not chunks:
+        return {}
+    return {name: np.concatenate([chunk[name] for chunk in chunks])
+            for name in chunks[0]}
+
+
+def _iter_chunks(features, chunk_size):
+    """Yields chunks of chunk_size instances from features."""
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be a positive integer.')
+    if isinstance(features, (str, os.PathLike)):
+        features = np.load(features, mmap_mode='r')
+    features = backend.to_numpy(features)
+    if isinstance(features, (np.ndarray, PackedMask, RLEMask)):
+        for start in range(0, len(features), chunk_size):
+            yield features[start:start + chunk_size]
+        return
+
+    # Re-chunk an iterable of batches so both inputs stay aligned.
+    pending, num_pending = collections.deque(), 0
+    for batch in features:
+        if not isinstance(batch, (PackedMask, RLEMask)):
+            batch = np.asarray(batch)
+        pending.append(batch)
+        num_pending += len(batch)
+        while num_pending >= chunk_size:
+            yield _take(pending, chunk_size)
+            num_pending -= chunk_size
+    if num_pending:
+        yield _take(pending, num_pending)
+
+
+def _take(batches, num_instances):
+    """
+    Removes the first num_instances instances from a deque of batches and
+        returns them. Batches are sliced rather than copied, so only a chunk
+        that spans several batches is concatenated.
+    """
+    parts = []
+    while num_instances > 0:
+        batch = batches.popleft()
+        parts.append(batch[:num_instances])
+        if len(batch) > num_instances:
+            batches.appendleft(batch[num_instances:])
+        num_instances -= len(parts[-1])
+    if len(parts) == 1:
+        return parts[0]
+    return concatenate_results(parts)
@@ -0,0 +1,58 @@
+"""Tests for grouped analysis."""
+
+import unittest
+import numpy as np
+
+from shared_interest.analysis import PATTERNS, categorize, group_statistics
+
+
+class TestCategorize(unittest.TestCase):
+    """Tests for categorize."""
+
+    def test_patterns(self):
+        """Tests each rule for correct and incorrect predictions."""
+        scores = {'iou_coverage': np.array([0.8, 0.2, 0.2, 0.1] * 2),
+                  'saliency_coverage': np.array([0.9, 0.9, 0.3, 0.1] * 2),
+                  'ground_truth_coverage': np.array([0.9, 0.2, 0.9, 0.1] * 2)}
+        labels = np.array([1, 1, 1, 1, 1, 1, 1, 1])
+        predictions = np.array([1, 1, 1, 1, 2, 2, 2, 2])
+        patterns = categorize(scores, labels, predictions)
+        self.assertListEqual([PATTERNS[pattern] for pattern in patterns],
+                             ['human_aligned', 'sufficient_subset',
+                              'sufficient_context', 'context_dependent',
+                              'confuser', 'insufficient_subset',
+                              'context_confusion', 'distractor'])
+
+
+class TestGroupStatistics(unittest.TestCase):
+    """Tests for group_statistics."""
+
+    def test_matches_per_group_loop(self):
+        """Tests the segmented statistics against a loop over groups."""
+        random_state = np.random.RandomState(0)
+        values = random_state.rand(500)
+        values[::50] = np.nan
+        labels = random_state.choice(['n01', 'n02', 'n03'], 500)
+        correct = random_state.rand(500) > 0.5
+        statistics = group_statistics(values, labels, correct, bins=5)
+
+        self.assertEqual(len(statistics['count']), 6)
+        for i, (label, is_correct) in enumerate(zip(*statistics['groups'])):
+            selected = (labels == label) & (correct == is_correct) \
+                & ~np.isnan(values)
+            group_values = values[selected]
+            self.assertEqual(statistics['count'][i], len(group_values))
+            self.assertAlmostEqual(statistics['mean'][i], group_values.mean())
+            self.assertAlmostEqual(statistics['std'][i], group_values.std())
+            self.assertEqual(statistics['min'][i], group_values.min())
+            self.assertEqual(statistics['max'][i], group_values.max())
+            self.assertTrue(np.allclose(statistics['quantiles'][i],
+                                        np.quantile(group_values,
+                                                    [0.25, 0.5, 0.75])))
+            self.assertListEqual(
+                statistics['histogram'][i].tolist(),
+                np.histogram(group_values, bins=5, range=(0, 1))[0].tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+"""Tests for the ImageNet annotation index."""
+
+import os
+import pickle
+import tempfile
+import unittest
+import numpy as np
+from PIL import Image
+from torchvision import transforms
+
+from shared_interest.datasets.annotation_index import AnnotationIndex
+from shared_interest.datasets.annotation_index import build_annotation_index
+from shared_interest.datasets.imagenet import ImageNet
+
+
+ANNOTATION = """<annotation>
+    <size><width>%d</width><height>%d</height><depth>3</depth></size>
+    %s
+</annotation>"""
+
+OBJECT = """<object><bndbox>
+    <xmin>%d</xmin><ymin>%d</ymin><xmax>%d</xmax><ymax>%d</ymax>
+</bndbox></object>"""
+
+
+def write_dataset(directory, annotations):
+    """
+    Writes a synthetic ImageFolder of images and ImageNet annotations.
+
+    Args:
+    directory: the directory to write 'images/' and 'annotations/' into.
+    annotations: a dictionary mapping (label, image_name) to a tuple of
+        (height, width, boxes) where boxes is a list of (xmin, ymin, xmax,
+        ymax) tuples.
+
+    Returns: The image path and the ground truth path.
+    """
+    image_path = os.path.join(directory, 'images')
+    ground_truth_path = os.path.join(directory, 'annotations')
+    for (label, image_name), (height, width, boxes) in annotations.items():
+        os.makedirs(os.path.join(image_path, label), exist_ok=True)
+        os.makedirs(os.path.join(ground_truth_path, label), exist_ok=True)
+        Image.new('RGB', (width, height)).save(
+            os.path.join(image_path, label, '%s.JPEG' %image_name))
+        objects = ''.join(OBJECT %box for box in boxes)
+        with open(os.path.join(ground_truth_path, label,
+                               '%s.xml' %image_name), 'w') as f:
+            f.write(ANNOTATION %(width, height, objects))
+    return image_path, ground_truth_path
+
+
+class TestAnnotationIndex(unittest.TestCase):
+    """Tests for AnnotationIndex."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.annotations = {
+            ('1', 'a'): (20, 30, [(0, 0, 10, 10)]),
+            ('1', 'b'): (25, 15, [(2, 3, 8, 20), (5, 5, 15, 25)]),
+            ('10', 'c'): (10, 10, []),
+            ('2', 'd'): (30, 40, [(10, 5, 40, 30)]),
+        }
+        self.image_path, self.ground_truth_path = write_dataset(
+            self.directory.name, self.annotations)
+        self.index_path = os.path.join(self.directory.name, 'index')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_build_and_lookup(self):
+        """Tests building an index and looking up annotations."""
+        index = build_annotation_index(self.ground_truth_path, self.index_path)
+        self.assertEqual(len(index), len(self.annotations))
+        self.assertIsInstance(index.boxes, np.memmap)
+        for (label, image_name), (height, width, boxes) in \
+                self.annotations.items():
+            row, = index.find(['%s/%s' %(label, image_name)])
+            index_boxes, index_height, index_width = index.annotation(row)
+            self.assertEqual((index_height, index_width), (height, width))
+            self.assertListEqual(index_boxes.tolist(),
+                                 [list(box) for box in boxes])
+        self.assertListEqual(index.find(['1/missing', '3/a']).tolist(),
+                             [-1, -1])
+
+        rows = index.find(['2/d', '10/c', '1/b'])
+        boxes, offsets, sizes = index.gather(rows)
+        self.assertListEqual(boxes.tolist(), [[10, 5, 40, 30], [2, 3, 8, 20],
+                                              [5, 5, 15, 25]])
+        self.assertListEqual(offsets.tolist(), [0, 1, 1, 3])
+        self.assertListEqual(sizes.tolist(), [[30, 40], [10, 10], [25, 15]])
+
+        index = pickle.loads(pickle.dumps(AnnotationIndex(self.index_path)))
+        self.assertIsInstance(index.boxes, np.memmap)
+
+    def test_imagenet_with_index(self):
+        """Tests that ImageNet returns the same ground truth with an index."""
+        build_annotation_index(self.ground_truth_path, self.index_path)
+        dataset = ImageNet(self.image_path, self.ground_truth_path)
+        indexed_dataset = ImageNet(self.image_path, None,
+                                   annotation_index=self.index_path)
+        self.assertEqual(len(dataset), len(indexed_dataset))
+        for i in range(len(dataset)):
+            _, ground_truth, label = dataset[i]
+            _, indexed_ground_truth, indexed_label = indexed_dataset[i]
+            self.assertEqual(label, indexed_label)
+            self.assertTrue((ground_truth == indexed_ground_truth).all())
+
+    def test_imagenet_target_resolution(self):
+        """Tests rasterizing the ground truth at the output resolution."""
+        ground_truth_transform = transforms.Compose([
+            transforms.Resize(
+                16, interpolation=transforms.InterpolationMode.NEAREST),
+            transforms.CenterCrop(12)])
+        dataset = ImageNet(self.image_path, self.ground_truth_path,
+                           ground_truth_transform=lambda ground_truth:
+                           ground_truth_transform(ground_truth.unsqueeze(0)))
+        resized_dataset = ImageNet(self.image_path, self.ground_truth_path,
+                                   ground_truth_resize=16,
+                                   ground_truth_crop=12)
+        for i in range(len(dataset)):
+            _, ground_truth, _ = dataset[i]
+            _, resized_ground_truth, _ = resized_dataset[i]
+            self.assertTupleEqual(tuple(resized_ground_truth.shape), (12, 12))
+            self.assertTrue((ground_truth == resized_ground_truth).all())
+
+        with self.assertRaises(ValueError):
+            ImageNet(self.image_path, self.ground_truth_path,
+                     ground_truth_transform=ground_truth_transform,
+                     ground_truth_crop=12)
+
+
+if __name__ == '__main__':
+    unittest.main()
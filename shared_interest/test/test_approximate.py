@@ -0,0 +1,89 @@
+"""Tests for approximate scoring."""
+
+import unittest
+import numpy as np
+
+from shared_interest.approximate import approximate_shared_interest
+from shared_interest.shared_interest import shared_interest
+from shared_interest.util import binarize_std
+
+
+class TestApproximateSharedInterest(unittest.TestCase):
+    """Tests for approximate_shared_interest."""
+
+    def setUp(self):
+        random_state = np.random.RandomState(0)
+        self.ground_truth_features = np.zeros((20, 50, 45))
+        for i in range(20):
+            top, left = random_state.randint(0, 30, size=2)
+            height, width = random_state.randint(1, 20, size=2)
+            self.ground_truth_features[i, top:top + height,
+                                       left:left + width] = 1
+        self.saliency_features = random_state.rand(20, 50, 45) ** 3
+        self.binary_saliency = binarize_std(self.saliency_features)
+
+    def test_bounds(self):
+        """Tests that the bounds contain the exact scores."""
+        for saliency, score in [(self.binary_saliency, 'all'),
+                                (self.saliency_features,
+                                 ['saliency_coverage'])]:
+            expected_scores = shared_interest(self.ground_truth_features,
+                                              saliency, score=score)
+            scores = approximate_shared_interest(self.ground_truth_features,
+                                                 saliency, score=score,
+                                                 tile_size=8)
+            for name, expected in expected_scores.items():
+                self.assertTrue((scores[name].lower <= expected + 1e-12).all())
+                self.assertTrue((scores[name].upper >= expected - 1e-12).all())
+                self.assertTrue((scores[name].lower
+                                 <= scores[name].estimate).all())
+                self.assertTrue((scores[name].estimate
+                                 <= scores[name].upper).all())
+                self.assertFalse(scores[name].refined.any())
+
+    def test_integer_features(self):
+        """Tests int64 features against the same features as floats."""
+        integer_saliency = (self.saliency_features * 5000).astype(int) - 1000
+        for saliency, score in [(self.binary_saliency.astype(int), 'all'),
+                                (integer_saliency, ['saliency_coverage'])]:
+            for tile_size in [8, 300]:
+                scores = approximate_shared_interest(
+                    self.ground_truth_features.astype(int), saliency,
+                    score=score, tile_size=tile_size)
+                expected_scores = approximate_shared_interest(
+                    self.ground_truth_features, saliency.astype(np.float64),
+                    score=score, tile_size=tile_size)
+                for name, expected in expected_scores.items():
+                    for bound, expected_bound in zip(scores[name], expected):
+                        self.assertTrue(np.allclose(bound, expected_bound,
+                                                    equal_nan=True))
+
+    def test_unit_tiles_are_exact(self):
+        """Tests that tiles of one feature give the exact scores."""
+        expected = shared_interest(self.ground_truth_features,
+                                   self.binary_saliency)
+        scores = approximate_shared_interest(self.ground_truth_features,
+                                             self.binary_saliency, tile_size=1)
+        for values in scores[:3]:
+            self.assertTrue(np.allclose(values, expected))
+
+    def test_refine(self):
+        """Tests that refined instances are classified exactly."""
+        threshold = 0.3
+        expected = shared_interest(self.ground_truth_features,
+                                   self.binary_saliency)
+        scores = approximate_shared_interest(self.ground_truth_features,
+                                             self.binary_saliency,
+                                             tile_size=16,
+                                             refine_threshold=threshold)
+        self.assertTrue(scores.refined.any())
+        self.assertTrue(np.allclose(scores.estimate[scores.refined],
+                                    expected[scores.refined]))
+        self.assertTrue(((scores.lower >= threshold)
+                         == (expected >= threshold)).all())
+        self.assertTrue(((scores.upper >= threshold)
+                         == (expected >= threshold)).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
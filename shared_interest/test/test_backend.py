@@ -0,0 +1,63 @@
+"""Tests for PyTorch tensor handling."""
+
+import unittest
+import numpy as np
+import torch
+
+from shared_interest import backend
+from shared_interest.scoring_functions import iou_coverage
+from shared_interest.shared_interest import shared_interest
+from shared_interest.util import binarize, binarize_percentile, flatten
+
+
+class TestTensorInputs(unittest.TestCase):
+    """Tests passing torch tensors to Shared Interest."""
+
+    def setUp(self):
+        random_state = np.random.RandomState(0)
+        self.ground_truth_features = np.zeros((4, 20, 30), dtype=np.uint8)
+        self.ground_truth_features[:, 5:15, 10:25] = 1
+        self.saliency = random_state.randn(4, 3, 20, 30).astype(np.float32)
+
+    def test_zero_copy_views(self):
+        """Tests that CPU tensors are viewed rather than copied."""
+        tensor = torch.from_numpy(self.saliency)
+        self.assertTrue(np.shares_memory(backend.to_numpy(tensor),
+                                         self.saliency))
+        self.assertIs(backend.to_numpy(self.saliency), self.saliency)
+
+    def test_tensor_scores(self):
+        """Tests that tensor inputs give tensor scores matching numpy."""
+        saliency_features = binarize_percentile(flatten(self.saliency), 0.8)
+        expected_scores = shared_interest(self.ground_truth_features,
+                                          saliency_features, score='all')
+
+        ground_truth = torch.from_numpy(self.ground_truth_features)
+        tensor_saliency = binarize_percentile(
+            flatten(torch.from_numpy(self.saliency)), 0.8)
+        self.assertIsInstance(tensor_saliency, torch.Tensor)
+        self.assertTrue((tensor_saliency.numpy() == saliency_features).all())
+
+        scores = shared_interest(ground_truth, tensor_saliency, score='all')
+        for name, values in scores.items():
+            self.assertIsInstance(values, torch.Tensor)
+            self.assertTrue(np.allclose(values.numpy(), expected_scores[name]))
+        scores = iou_coverage(ground_truth, saliency_features)
+        self.assertIsInstance(scores, torch.Tensor)
+        self.assertTrue(np.allclose(scores.numpy(),
+                                    expected_scores['iou_coverage']))
+
+    def test_tensor_out_buffer(self):
+        """Tests that binarize writes into a tensor out buffer."""
+        out = torch.zeros((4, 20, 30), dtype=torch.uint8)
+        binarize(torch.from_numpy(self.saliency), percentile=0.8, out=out)
+        self.assertTrue((out.numpy() == binarize(self.saliency,
+                                                 percentile=0.8)).all())
+        with self.assertRaises(ValueError):
+            binarize(torch.from_numpy(self.saliency), percentile=0.8,
+                     out=torch.zeros((4, 20, 30), dtype=torch.uint8,
+                                     device='meta'))
+
+
+if __name__ == '__main__':
+    unittest.main()
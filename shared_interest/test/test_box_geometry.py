@@ -0,0 +1,51 @@
+"""Tests for bounding box geometry."""
+
+import unittest
+import numpy as np
+import torch
+from torchvision import transforms
+
+from shared_interest.datasets.box_geometry import rasterize_boxes
+from shared_interest.datasets.box_geometry import transform_boxes
+
+
+class TestTransformBoxes(unittest.TestCase):
+    """Tests for transform_boxes."""
+
+    def setUp(self):
+        self.images = [
+            ((375, 500), [(10, 20, 300, 200), (250, 100, 500, 375)]),
+            ((500, 333), [(0, 0, 333, 500)]),
+            ((120, 90), [(30, 40, 31, 41), (60, 0, 90, 10)]),
+            ((224, 224), [(5, 7, 100, 220)]),
+        ]
+        self.geometries = [(256, 224), (224, 224), ((300, 200), 150),
+                           (None, 224), (100, (160, 120)), (256, None)]
+
+    def test_matches_nearest_transform(self):
+        """Tests against rasterizing and transforming the full-size mask."""
+        for image_size, boxes in self.images:
+            full_mask = torch.from_numpy(rasterize_boxes(np.array(boxes),
+                                                         *image_size))
+            for resize, crop in self.geometries:
+                transform = []
+                if resize is not None:
+                    transform.append(transforms.Resize(
+                        resize,
+                        interpolation=transforms.InterpolationMode.NEAREST))
+                if crop is not None:
+                    transform.append(transforms.CenterCrop(crop))
+                expected_mask = transforms.Compose(transform)(
+                    full_mask.unsqueeze(0)).squeeze(0)
+
+                output_boxes, output_size = transform_boxes(
+                    boxes, image_size, resize=resize, crop=crop)
+                mask = rasterize_boxes(output_boxes, *output_size)
+                self.assertTupleEqual(mask.shape, tuple(expected_mask.shape))
+                self.assertTrue((mask == expected_mask.numpy()).all(),
+                                'Mismatch for %s resized to %s and cropped to \
+                                %s.' %(image_size, resize, crop))
+
+
+if __name__ == '__main__':
+    unittest.main()
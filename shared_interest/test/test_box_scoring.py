@@ -0,0 +1,165 @@
+"""Tests for box-based Shared Interest scoring."""
+
+import unittest
+import numpy as np
+import torch
+
+from shared_interest.box_scoring import box_shared_interest
+from shared_interest.box_scoring import object_shared_interest
+from shared_interest.datasets.box_geometry import rasterize_boxes
+from shared_interest.shared_interest import shared_interest
+
+
+class TestBoxSharedInterest(unittest.TestCase):
+    """Tests for box_shared_interest."""
+
+    def setUp(self):
+        self.shape = (4, 40, 50)
+        # Plain, overlapping, nested, and clipped and empty boxes.
+        self.boxes = [np.array([[0, 0, 10, 10]]),
+                      np.array([[5, 5, 30, 20], [20, 10, 45, 35]]),
+                      np.array([[10, 10, 20, 20], [12, 12, 18, 18]]),
+                      np.array([[-5, 30, 60, 50], [3, 3, 3, 9]])]
+        self.ground_truth_features = np.zeros(self.shape, dtype=int)
+        for i, instance_boxes in enumerate(self.boxes):
+            for x_min, y_min, x_max, y_max in instance_boxes:
+                self.ground_truth_features[i, max(y_min, 0):y_max,
+                                           max(x_min, 0):x_max] = 1
+
+        random_state = np.random.RandomState(0)
+        self.continuous_saliency_features = random_state.rand(*self.shape)
+        self.binary_saliency_features = (self.continuous_saliency_features
+                                         > 0.6).astype(int)
+
+    def test_matches_dense_scores(self):
+        """Tests that box scores match scores on the rasterized masks."""
+        scores = box_shared_interest(self.boxes, self.binary_saliency_features,
+                                     score='all')
+        for name, values in scores.items():
+            expected_scores = shared_interest(self.ground_truth_features,
+                                              self.binary_saliency_features,
+                                              score=name)
+            self.assertTrue(np.allclose(values, expected_scores),
+                            'Expected: %s got: %s' %(str(expected_scores),
+                                                     str(values)))
+
+        scores = box_shared_interest(self.boxes,
+                                     self.continuous_saliency_features,
+                                     score='saliency_coverage')
+        expected_scores = shared_interest(self.ground_truth_features,
+                                          self.continuous_saliency_features,
+                                          score='saliency_coverage')
+        self.assertIs(type(scores), np.ndarray)
+        self.assertTrue(np.allclose(scores, expected_scores))
+
+    def test_chunks(self):
+        """Tests batches of several chunks with varying numbers of boxes."""
+        random_state = np.random.RandomState(1)
+        height, width = 24, 31
+        boxes = []
+        for i in range(37):
+            corners = random_state.randint(-4, 36, size=(i % 5, 2, 2))
+            boxes.append(np.concatenate([corners.min(axis=1),
+                                         corners.max(axis=1)], axis=1))
+        ground_truth_features = np.stack([rasterize_boxes(instance_boxes,
+                                                          height, width)
+                                          for instance_boxes in boxes])
+        saliency_features = random_state.randn(len(boxes), height,
+                                               width).astype(np.float32)
+        binary_saliency_features = saliency_features > 0.5
+        with np.errstate(invalid='ignore'):
+            for saliency, score in [(binary_saliency_features, 'all'),
+                                    (saliency_features,
+                                     ['saliency_coverage'])]:
+                scores = box_shared_interest(boxes, saliency, score=score)
+                expected_scores = shared_interest(ground_truth_features,
+                                                  saliency, score=score)
+                for name, values in scores.items():
+                    self.assertTrue(np.allclose(values, expected_scores[name],
+                                                equal_nan=True))
+
+    def test_offsets(self):
+        """Tests boxes given as a flat array with offsets."""
+        offsets = np.cumsum([0] + [len(boxes) for boxes in self.boxes])
+        scores = box_shared_interest(np.concatenate(self.boxes),
+                                     self.binary_saliency_features,
+                                     offsets=offsets)
+        expected_scores = box_shared_interest(self.boxes,
+                                              self.binary_saliency_features)
+        self.assertTrue(np.allclose(scores, expected_scores))
+
+    def test_invalid_inputs(self):
+        """Tests box_shared_interest on invalid inputs."""
+        with self.assertRaises(ValueError):
+            box_shared_interest(self.boxes, self.continuous_saliency_features,
+                                score='iou_coverage')
+        with self.assertRaises(ValueError):
+            box_shared_interest(self.boxes[:-1], self.binary_saliency_features)
+
+
+class TestObjectSharedInterest(unittest.TestCase):
+    """Tests for object_shared_interest."""
+
+    def setUp(self):
+        self.shape = (3, 30, 40)
+        self.boxes = [np.array([[0, 0, 10, 10], [5, 5, 30, 20]]),
+                      np.zeros((0, 4), dtype=int),
+                      np.array([[-5, 20, 50, 40], [3, 3, 3, 9],
+                                [10, 10, 20, 20]])]  # clipped, empty, plain
+        random_state = np.random.RandomState(0)
+        self.saliency_features = random_state.rand(*self.shape)
+
+    def test_matches_per_box_scores(self):
+        """Tests each object's scores against its rasterized box."""
+        binary_saliency_features = (self.saliency_features > 0.6).astype(int)
+        with np.errstate(invalid='ignore'):
+            for saliency, score in [(binary_saliency_features, 'all'),
+                                    (self.saliency_features,
+                                     ['saliency_coverage'])]:
+                scores, offsets = object_shared_interest(self.boxes, saliency,
+                                                         score=score)
+                self.assertListEqual(offsets.tolist(), [0, 2, 2, 5])
+                for i, instance_boxes in enumerate(self.boxes):
+                    for j, (x_min, y_min, x_max, y_max) in \
+                            enumerate(instance_boxes):
+                        mask = np.zeros((1,) + self.shape[1:], dtype=int)
+                        mask[0, max(y_min, 0):y_max, max(x_min, 0):x_max] = 1
+                        expected = shared_interest(mask, saliency[i:i + 1],
+                                                   score=score)
+                        for name, values in scores.items():
+                            self.assertTrue(np.allclose(
+                                values[offsets[i] + j], expected[name],
+                                equal_nan=True))
+
+    def test_chunks(self):
+        """Tests batches of several chunks against one box per instance."""
+        random_state = np.random.RandomState(1)
+        boxes = []
+        for i in range(37):
+            corners = random_state.randint(-4, 44, size=(i % 4, 2, 2))
+            boxes.append(np.concatenate([corners.min(axis=1),
+                                         corners.max(axis=1)], axis=1))
+        saliency_features = random_state.rand(len(boxes), *self.shape[1:])
+        scores, offsets = object_shared_interest(boxes, saliency_features,
+                                                 score='saliency_coverage')
+        instances = np.repeat(np.arange(len(boxes)), np.diff(offsets))
+        expected_scores = box_shared_interest(
+            np.concatenate(boxes), saliency_features[instances],
+            score='saliency_coverage', offsets=np.arange(len(instances) + 1))
+        self.assertTrue(np.allclose(scores, expected_scores, equal_nan=True))
+
+    def test_tensor_inputs(self):
+        """Tests that tensor saliency gives tensor scores and offsets."""
+        binary_saliency_features = (self.saliency_features > 0.6).astype(int)
+        expected = object_shared_interest(self.boxes, binary_saliency_features)
+        scores = object_shared_interest(
+            self.boxes, torch.from_numpy(binary_saliency_features))
+        self.assertIsInstance(scores.scores, torch.Tensor)
+        self.assertIsInstance(scores.offsets, torch.Tensor)
+        self.assertTrue(np.allclose(scores.scores.numpy(), expected.scores,
+                                    equal_nan=True))
+        self.assertListEqual(scores.offsets.tolist(), expected.offsets.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
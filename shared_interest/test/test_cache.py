@@ -0,0 +1,153 @@
+"""Tests for the score cache."""
+
+import tempfile
+import unittest
+import numpy as np
+
+from shared_interest.cache import ScoreCache
+from shared_interest.masks import PackedMask, RLEMask
+from shared_interest.shared_interest import shared_interest
+from shared_interest.util import binarize_percentile, binarize_std
+
+
+class TestScoreCache(unittest.TestCase):
+    """Tests for ScoreCache."""
+
+    def setUp(self):
+        random_state = np.random.RandomState(0)
+        self.ground_truth_features = (random_state.rand(6, 12, 10)
+                                      > 0.5).astype(int)
+        self.saliency_features = random_state.rand(6, 12, 10)
+        self.binary_saliency = binarize_std(self.saliency_features)
+
+    def test_scores(self):
+        """Tests cached scores and per-instance hits."""
+        cache = ScoreCache()
+        for score in ['iou_coverage', 'all']:
+            expected = shared_interest(self.ground_truth_features,
+                                       self.binary_saliency, score=score)
+            scores = cache.shared_interest(self.ground_truth_features,
+                                           self.binary_saliency, score=score)
+            if isinstance(expected, dict):
+                for name in expected:
+                    self.assertTrue(np.allclose(scores[name], expected[name]))
+            else:
+                self.assertTrue(np.allclose(scores, expected))
+        self.assertEqual(cache.stats['misses'], 12)
+
+        # Only the two new instances miss.
+        saliency = self.binary_saliency.copy()
+        saliency[[1, 4]] = 1 - saliency[[1, 4]]
+        scores = cache.shared_interest(self.ground_truth_features, saliency)
+        self.assertTrue(np.allclose(
+            scores, shared_interest(self.ground_truth_features, saliency)))
+        self.assertEqual(cache.stats['hits'], 4)
+        self.assertEqual(cache.stats['misses'], 14)
+
+    def test_binarize(self):
+        """Tests cached binarization in both output formats."""
+        cache = ScoreCache()
+        for _ in range(2):
+            self.assertTrue((cache.binarize_std(self.saliency_features)
+                             == self.binary_saliency).all())
+            packed = cache.binarize_percentile(self.saliency_features, 0.7,
+                                               packed=True)
+            self.assertTrue((packed.unpack() == binarize_percentile(
+                self.saliency_features, 0.7)).all())
+        self.assertEqual(cache.stats['misses'], 12)
+        self.assertEqual(cache.stats['hits'], 12)
+
+    def test_memory_eviction(self):
+        """Tests that the in-memory tier stays within its size limit."""
+        cache = ScoreCache(max_bytes=3 * 8)
+        cache.shared_interest(self.ground_truth_features, self.binary_saliency)
+        self.assertEqual(cache.stats['entries'], 3)
+        self.assertEqual(cache.stats['evictions'], 3)
+        cache.shared_interest(self.ground_truth_features[3:],
+                              self.binary_saliency[3:])
+        self.assertEqual(cache.stats['hits'], 3)
+
+    def test_ids_and_empty_batches(self):
+        """Tests keying instances by caller ids and empty batches."""
+        cache = ScoreCache()
+        ids = np.arange(6)
+        expected = shared_interest(self.ground_truth_features,
+                                   self.binary_saliency)
+        scores = cache.shared_interest(self.ground_truth_features,
+                                       self.binary_saliency, ids=ids)
+        self.assertTrue(np.allclose(scores, expected))
+        # Hits are found by id without looking at the features.
+        scores = cache.shared_interest(self.ground_truth_features[::-1],
+                                       self.binary_saliency[::-1],
+                                       ids=list(range(5, -1, -1)))
+        self.assertTrue(np.allclose(scores, expected[::-1]))
+        self.assertEqual(cache.stats['hits'], 6)
+        with self.assertRaises(ValueError):
+            cache.shared_interest(self.ground_truth_features,
+                                  self.binary_saliency, ids=ids[:-1])
+
+        self.assertEqual(cache.shared_interest(
+            self.ground_truth_features[:0], self.binary_saliency[:0],
+            score='all')['iou_coverage'].shape, (0,))
+        self.assertEqual(cache.binarize_std(self.saliency_features[:0]).shape,
+                         (0, 12, 10))
+
+    def test_keyword_arguments_and_masks(self):
+        """Tests keys of keyword arguments and of mask inputs."""
+        cache = ScoreCache()
+        cache.shared_interest(self.ground_truth_features, self.binary_saliency)
+        # workers does not change the scores, but validate is part of the key.
+        cache.shared_interest(self.ground_truth_features, self.binary_saliency,
+                              workers=2)
+        self.assertEqual(cache.stats['hits'], 6)
+        cache.shared_interest(self.ground_truth_features, self.binary_saliency,
+                              validate=False)
+        self.assertEqual(cache.stats['misses'], 12)
+
+        expected = shared_interest(self.ground_truth_features,
+                                   self.binary_saliency)
+        for mask_type in [PackedMask.pack, RLEMask.encode]:
+            for _ in range(2):
+                scores = cache.shared_interest(
+                    mask_type(self.ground_truth_features),
+                    mask_type(self.binary_saliency))
+                self.assertTrue(np.allclose(scores, expected))
+        self.assertEqual(cache.stats['misses'], 24)
+        self.assertEqual(cache.stats['hits'], 18)
+
+    def test_disk_tier(self):
+        """Tests that the disk tier is shared across caches and bounded."""
+        with tempfile.TemporaryDirectory() as directory:
+            ScoreCache(directory=directory).shared_interest(
+                self.ground_truth_features, self.binary_saliency)
+            cache = ScoreCache(directory=directory)
+            self.assertEqual(cache.stats['disk_entries'], 6)
+            self.assertEqual(cache.stats['disk_segments'], 1)
+            scores = cache.shared_interest(self.ground_truth_features,
+                                           self.binary_saliency)
+            self.assertTrue(np.allclose(scores, shared_interest(
+                self.ground_truth_features, self.binary_saliency)))
+            self.assertEqual(cache.stats['disk_hits'], 6)
+            self.assertEqual(cache.stats['misses'], 0)
+
+            # Each batch of misses is one segment; the oldest are evicted.
+            segment_size = cache.stats['disk_bytes']
+            cache = ScoreCache(directory=directory,
+                               max_disk_bytes=2 * segment_size)
+            for i in range(3):
+                cache.shared_interest(self.ground_truth_features[i:i + 1],
+                                      self.binary_saliency[i:i + 1],
+                                      score='all')
+            self.assertGreater(cache.stats['disk_evictions'], 0)
+            self.assertLessEqual(cache.stats['disk_bytes'], 2 * segment_size)
+            self.assertEqual(ScoreCache(directory=directory).stats,
+                             dict(cache.stats, hits=0, disk_hits=0, misses=0,
+                                  evictions=0, disk_evictions=0, entries=0,
+                                  bytes=0))
+            cache.clear()
+            self.assertEqual(ScoreCache(directory=directory)
+                             .stats['disk_entries'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+"""Tests for the command-line scoring pipeline."""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from shared_interest.cli import main
+from shared_interest.datasets.imagenet import ImageNet
+from shared_interest.shared_interest import shared_interest
+from shared_interest.test.test_annotation_index import write_dataset
+from shared_interest.util import binarize_percentile, binarize_std
+
+
+class TestCommandLine(unittest.TestCase):
+    """Tests for main."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        random_state = np.random.RandomState(0)
+        self.ground_truth = (random_state.rand(10, 8, 6) > 0.5).astype(np.uint8)
+        self.saliency = random_state.rand(10, 2, 8, 6)
+        self.ground_truth_file = self._save('ground_truth.npy',
+                                            self.ground_truth)
+        self.saliency_files = [self._save('saliency_0.npy', self.saliency[:3]),
+                               self._save('saliency_1.npy', self.saliency[3:])]
+        self.output = os.path.join(self.directory.name, 'output')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _save(self, name, array):
+        path = os.path.join(self.directory.name, name)
+        np.save(path, array)
+        return path
+
+    def _run(self, *args):
+        with contextlib.redirect_stdout(io.StringIO()), \
+                contextlib.redirect_stderr(io.StringIO()):
+            return main(list(args))
+
+    def test_scores_and_resume(self):
+        """Tests merged scores and that a rerun only scores missing chunks."""
+        arguments = ['--saliency'] + self.saliency_files + [
+            '--ground-truth', self.ground_truth_file, '--binarize', 'std',
+            '--score', 'all', '--output', self.output, '--chunk-size', '4',
+            '--workers', '2']
+        self.assertEqual(self._run(*arguments), 0)
+        expected = shared_interest(self.ground_truth,
+                                   binarize_std(self.saliency.sum(axis=1)),
+                                   score='all')
+        with np.load(os.path.join(self.output, 'scores.npz')) as scores:
+            for name, values in expected.items():
+                self.assertTrue(np.allclose(scores[name], values))
+
+        # Simulate an interruption before the second chunk was recorded.
+        chunk_file = os.path.join(self.output, 'scores_000001.npz')
+        os.remove(chunk_file)
+        first_chunk_time = os.stat(os.path.join(
+            self.output, 'scores_000000.npz')).st_mtime_ns
+        self.assertEqual(self._run(*arguments), 0)
+        self.assertTrue(os.path.isfile(chunk_file))
+        self.assertEqual(os.stat(os.path.join(
+            self.output, 'scores_000000.npz')).st_mtime_ns, first_chunk_time)
+        with open(os.path.join(self.output, 'checkpoint.json')) as f:
+            self.assertListEqual(json.load(f)['done'], [0, 1, 2])
+
+        # Options that differ from the checkpoint are a usage error.
+        with self.assertRaises(SystemExit):
+            self._run(*(arguments[:-4] + ['--chunk-size', '5']))
+
+    def test_continuous_saliency(self):
+        """Tests continuous saliency without binarization."""
+        arguments = ['--saliency'] + self.saliency_files + [
+            '--ground-truth', self.ground_truth_file, '--output', self.output]
+        with self.assertRaises(SystemExit):
+            self._run(*arguments)
+        self.assertFalse(os.path.exists(self.output))
+
+        self.assertEqual(self._run(*(arguments + ['--score',
+                                                  'saliency_coverage'])), 0)
+        expected = shared_interest(self.ground_truth, self.saliency.sum(axis=1),
+                                   score='saliency_coverage')
+        with np.load(os.path.join(self.output, 'scores.npz')) as scores:
+            self.assertTrue(np.allclose(scores['saliency_coverage'], expected))
+
+    def test_annotation_ground_truth(self):
+        """Tests ground truth rasterized from ImageNet annotations."""
+        annotations = {('1', 'a'): (20, 30, [(0, 0, 10, 10)]),
+                       ('1', 'b'): (25, 15, [(2, 3, 8, 20)]),
+                       ('2', 'c'): (30, 40, [(10, 5, 40, 30)])}
+        image_path, ground_truth_path = write_dataset(self.directory.name,
+                                                      annotations)
+        saliency = np.random.RandomState(0).rand(3, 12, 12)
+        saliency_file = self._save('saliency.npy', saliency)
+        arguments = ['--saliency', saliency_file, '--images', image_path,
+                     '--annotations', ground_truth_path, '--resize', '16',
+                     '--crop', '12', '--binarize', 'percentile', '--score',
+                     'iou_coverage', '--output', self.output]
+        self.assertEqual(self._run(*arguments), 0)
+
+        # Resuming with other annotations would mix their scores.
+        other_annotations = os.path.join(self.directory.name, 'other')
+        shutil.copytree(ground_truth_path, other_annotations)
+        arguments[arguments.index(ground_truth_path)] = other_annotations
+        with self.assertRaises(SystemExit):
+            self._run(*arguments)
+
+        dataset = ImageNet(image_path, ground_truth_path,
+                           ground_truth_resize=16, ground_truth_crop=12)
+        ground_truth = np.stack([dataset[i][1].numpy()
+                                 for i in range(len(dataset))])
+        with np.load(os.path.join(self.output, 'scores.npz')) as scores:
+            self.assertListEqual(list(scores), ['iou_coverage'])
+            self.assertTrue(np.allclose(
+                scores['iou_coverage'],
+                shared_interest(ground_truth,
+                                binarize_percentile(saliency, 0.8))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""Tests for the ImageFolder file index."""
+
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import unittest
+from PIL import Image
+from torchvision.datasets import ImageFolder
+
+from shared_interest.datasets.file_index import FileIndex, build_file_index
+from shared_interest.datasets.file_index import load_file_index
+from shared_interest.datasets.imagenet import ImageNet
+from shared_interest.test.test_annotation_index import write_dataset
+
+
+class TestFileIndex(unittest.TestCase):
+    """Tests for FileIndex."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.annotations = {
+            ('1', 'a'): (20, 30, [(0, 0, 10, 10)]),
+            ('1', 'b'): (25, 15, [(2, 3, 8, 20), (5, 5, 15, 25)]),
+            ('10', 'c'): (10, 10, []),
+            ('2', 'd'): (30, 40, [(10, 5, 40, 30)]),
+        }
+        self.image_path, self.ground_truth_path = write_dataset(
+            self.directory.name, self.annotations)
+        self.index_path = os.path.join(self.directory.name, 'file_index')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_matches_image_folder(self):
+        """Tests that the index holds ImageFolder's samples in order."""
+        index = build_file_index(self.image_path, self.index_path)
+        image_folder = ImageFolder(self.image_path)
+        self.assertListEqual(list(index), image_folder.samples)
+        self.assertListEqual(index.classes, image_folder.classes)
+        self.assertListEqual(index.keys().tolist(),
+                             ['1/a', '1/b', '10/c', '2/d'])
+
+        index = pickle.loads(pickle.dumps(FileIndex(self.index_path)))
+        self.assertListEqual(list(index), image_folder.samples)
+
+    def test_validation(self):
+        """Tests that changes to the tree rebuild the index."""
+        index = load_file_index(self.image_path, self.index_path)
+        self.assertTrue(index.is_current())
+        self.assertEqual(len(index), 4)
+        Image.new('RGB', (5, 5)).save(os.path.join(self.image_path, '2',
+                                                   'e.JPEG'))
+        self.assertFalse(index.is_current())
+        index = load_file_index(self.image_path, self.index_path)
+        self.assertTrue(index.is_current())
+        self.assertEqual(len(index), 5)
+
+    def test_imagenet_with_file_index(self):
+        """Tests that ImageNet returns the same items with a file index."""
+        dataset = ImageNet(self.image_path, self.ground_truth_path)
+        indexed_dataset = ImageNet(self.image_path, self.ground_truth_path,
+                                   file_index=self.index_path)
+        self.assertListEqual(list(indexed_dataset.imgs), dataset.imgs)
+        self.assertListEqual(indexed_dataset.targets.tolist(), dataset.targets)
+        for i in range(len(dataset)):
+            _, ground_truth, label = dataset[i]
+            _, indexed_ground_truth, indexed_label = indexed_dataset[i]
+            self.assertEqual(label, indexed_label)
+            self.assertTrue((ground_truth == indexed_ground_truth).all())
+        unpickled_dataset = pickle.loads(pickle.dumps(indexed_dataset))
+        self.assertEqual(unpickled_dataset.imgs[3], dataset.imgs[3])
+
+    def test_lazy_torch_import(self):
+        """Tests that importing the dataset modules does not import torch."""
+        code = 'import sys; import shared_interest.datasets.imagenet, \
+            shared_interest.datasets.file_index; print("torch" in sys.modules)'
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         cwd=os.path.dirname(os.path.dirname(
+                                             os.path.dirname(__file__))))
+        self.assertEqual(output.strip(), b'False')
+
+
+if __name__ == '__main__':
+    unittest.main()
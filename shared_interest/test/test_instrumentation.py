@@ -0,0 +1,85 @@
+"""Tests for per-stage instrumentation."""
+
+import json
+import tracemalloc
+import unittest
+import numpy as np
+
+from shared_interest import instrumentation
+from shared_interest.shared_interest import shared_interest
+from shared_interest.util import binarize_std
+
+
+class TestInstrumentation(unittest.TestCase):
+    """Tests for the instrumentation recorder."""
+
+    def setUp(self):
+        random_state = np.random.RandomState(0)
+        self.ground_truth = (random_state.rand(4, 20, 20) > 0.5).astype(float)
+        self.saliency = random_state.rand(4, 20, 20)
+
+    def test_disabled_by_default(self):
+        """Tests that stages are no-ops when instrumentation is off."""
+        self.assertFalse(instrumentation.is_enabled())
+        self.assertIs(instrumentation.stage('a'), instrumentation.stage('b'))
+        self.assertDictEqual(instrumentation.report(), {})
+
+    def test_instrument(self):
+        """Tests the stages recorded inside an instrument block."""
+        with instrumentation.instrument(trace_memory=True) as recorder:
+            shared_interest(self.ground_truth, self.saliency,
+                            score='saliency_coverage')
+            binarize_std(self.saliency)
+        self.assertFalse(instrumentation.is_enabled())
+
+        report = recorder.report()
+        self.assertSetEqual(set(report),
+                            {'shared_interest.convert',
+                             'shared_interest.validate', 'shared_interest.abs',
+                             'shared_interest.score', 'util.binarize_std'})
+        self.assertEqual(report['shared_interest.validate']['bytes'],
+                         self.ground_truth.nbytes + self.saliency.nbytes)
+        for stage in report.values():
+            self.assertEqual(stage['count'], 1)
+            self.assertGreater(stage['seconds'], 0)
+        # binarize_std allocates a normalized copy and the mask.
+        self.assertGreaterEqual(report['util.binarize_std']['peak_bytes'],
+                                self.saliency.nbytes)
+        self.assertDictEqual(json.loads(recorder.to_json()), report)
+
+    def test_nested_peaks(self):
+        """Tests that an enclosing stage's peak includes nested stages."""
+        with instrumentation.instrument(trace_memory=True) as recorder:
+            with instrumentation.stage('outer'):
+                with instrumentation.stage('inner'):
+                    array = np.ones(100000)
+                del array
+                array = np.ones(1000)
+        report = recorder.report()
+        self.assertGreaterEqual(report['inner']['peak_bytes'], 800000)
+        self.assertGreaterEqual(report['outer']['peak_bytes'],
+                                report['inner']['peak_bytes'])
+
+    def test_global_switch(self):
+        """Tests enabling and disabling instrumentation globally."""
+        recorder = instrumentation.enable()
+        try:
+            shared_interest(self.ground_truth, self.ground_truth)
+            shared_interest(self.ground_truth, self.ground_truth)
+        finally:
+            self.assertIs(instrumentation.disable(), recorder)
+        self.assertEqual(recorder.report()['shared_interest.score']['count'],
+                         2)
+        self.assertEqual(recorder.report()['shared_interest.score']
+                         ['peak_bytes'], 0)
+
+        # Tracing started by enable is stopped by disable.
+        tracing = tracemalloc.is_tracing()
+        instrumentation.enable(trace_memory=True)
+        self.assertTrue(tracemalloc.is_tracing())
+        instrumentation.disable()
+        self.assertEqual(tracemalloc.is_tracing(), tracing)
+
+
+if __name__ == '__main__':
+    unittest.main()
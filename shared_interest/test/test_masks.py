@@ -0,0 +1,162 @@
+"""Tests for mask representations."""
+
+import unittest
+import numpy as np
+
+from shared_interest.masks import PackedMask, RLEMask
+from shared_interest.scoring_functions import iou_coverage, saliency_coverage, ground_truth_coverage
+from shared_interest.shared_interest import shared_interest
+from shared_interest.util import binarize_percentile, binarize_std
+
+
+class TestPackedMask(unittest.TestCase):
+    """Tests for PackedMask."""
+
+    def setUp(self):
+        self.shape = (5, 25, 30)
+        self.ground_truth_features = np.zeros(self.shape).astype(int)
+        self.ground_truth_features[0, 0:10, 0:10] = 1
+        self.ground_truth_features[1, 10:25, 20:30] = 1
+        self.ground_truth_features[2, 0:25, 0:30] = 1
+        self.ground_truth_features[3, 0:1, 0:1] = 1
+        self.ground_truth_features[4, 5:10, 5:10] = 1
+
+        self.saliency_features = np.zeros(self.shape).astype(int)
+        self.saliency_features[0, 5:15, 5:15] = 1    # overlapping regions
+        self.saliency_features[1, 5:25, 10:30] = 1   # ground truth in saliency
+        self.saliency_features[2, 5:10, 5:10] = 1    # saliency in ground truth
+        self.saliency_features[3, 10:15, 15:25] = 1  # no overlap
+        self.saliency_features[4, 5:10, 5:10] = 1    # identical regions
+
+    def test_pack_unpack(self):
+        """Tests packing and unpacking round trips."""
+        packed = PackedMask.pack(self.ground_truth_features)
+        self.assertTupleEqual(packed.shape, self.shape)
+        self.assertEqual(packed.bits.shape[1] % 8, 0)
+        self.assertLess(packed.nbytes, self.ground_truth_features.nbytes / 8)
+        self.assertTrue((packed.unpack() == self.ground_truth_features).all())
+        self.assertTrue((packed[1:3].unpack()
+                         == self.ground_truth_features[1:3]).all())
+
+    def test_counts(self):
+        """Tests popcount based set sizes."""
+        ground_truth = PackedMask.pack(self.ground_truth_features)
+        saliency = PackedMask.pack(self.saliency_features)
+        self.assertTrue((ground_truth.count()
+                         == self.ground_truth_features.sum(axis=(1, 2))).all())
+        self.assertTrue(
+            (ground_truth.intersection_count(saliency)
+             == (self.ground_truth_features
+                 & self.saliency_features).sum(axis=(1, 2))).all())
+        self.assertTrue(
+            (ground_truth.union_count(saliency)
+             == (self.ground_truth_features
+                 | self.saliency_features).sum(axis=(1, 2))).all())
+
+    def test_packed_scoring(self):
+        """Tests scoring functions and shared interest on packed masks."""
+        ground_truth = PackedMask.pack(self.ground_truth_features)
+        saliency = PackedMask.pack(self.saliency_features)
+        for score_function in [iou_coverage, saliency_coverage,
+                               ground_truth_coverage]:
+            expected_scores = score_function(self.ground_truth_features,
+                                             self.saliency_features)
+            scores = score_function(ground_truth, saliency)
+            self.assertTrue(np.allclose(scores, expected_scores),
+                            'Expected: %s got: %s' %(str(expected_scores),
+                                                     str(scores)))
+            scores = shared_interest(ground_truth, self.saliency_features,
+                                     score=score_function.__name__)
+            self.assertTrue(np.allclose(scores, expected_scores))
+
+        scores = shared_interest(ground_truth, saliency, score='all')
+        for name, values in scores.items():
+            expected_scores = shared_interest(self.ground_truth_features,
+                                              self.saliency_features,
+                                              score=name)
+            self.assertTrue(np.allclose(values, expected_scores))
+
+    def test_packed_binarize(self):
+        """Tests that the binarizers emit packed masks."""
+        saliency = np.random.RandomState(0).rand(*self.shape)
+        for binarize, argument in [(binarize_percentile, 0.8),
+                                   (binarize_std, 1)]:
+            packed = binarize(saliency, argument, packed=True)
+            self.assertIsInstance(packed, PackedMask)
+            self.assertTrue((packed.unpack()
+                             == binarize(saliency, argument)).all())
+
+
+class TestRLEMask(unittest.TestCase):
+    """Tests for RLEMask."""
+
+    def setUp(self):
+        self.shape = (4, 12, 10)
+        self.ground_truth_features = np.zeros(self.shape).astype(int)
+        self.ground_truth_features[0, 0:5, 0:5] = 1    # starts with a 1
+        self.ground_truth_features[1, 3:12, 2:10] = 1  # ends with a 1
+        self.ground_truth_features[2, 4:6, 4:6] = 1
+        self.ground_truth_features[2, 8:10, 1:9] = 1   # several regions
+
+        self.saliency_features = np.zeros(self.shape).astype(int)
+        self.saliency_features[0, 2:8, 2:8] = 1
+        self.saliency_features[1] = 1                  # a single run of 1s
+        self.saliency_features[2, 0:12, 3:5] = 1       # empty in instance 3
+
+    def test_encode_decode(self):
+        """Tests COCO-style counts and round trips."""
+        mask = RLEMask.encode(np.array([[[0, 1], [1, 1]], [[1, 0], [0, 0]]]))
+        self.assertListEqual(mask.counts.tolist(), [1, 3, 0, 1, 3])
+        self.assertListEqual(mask.offsets.tolist(), [0, 2, 5])
+
+        mask = RLEMask.encode(self.ground_truth_features)
+        self.assertTupleEqual(mask.shape, self.shape)
+        self.assertTrue((mask.decode() == self.ground_truth_features).all())
+        self.assertTrue((mask[[2, 0]].decode()
+                         == self.ground_truth_features[[2, 0]]).all())
+        self.assertTrue((mask[1:3].decode()
+                         == self.ground_truth_features[1:3]).all())
+
+    def test_counts(self):
+        """Tests run-merging set sizes."""
+        ground_truth = RLEMask.encode(self.ground_truth_features)
+        saliency = RLEMask.encode(self.saliency_features)
+        self.assertTrue((ground_truth.count()
+                         == self.ground_truth_features.sum(axis=(1, 2))).all())
+        self.assertTrue(
+            (ground_truth.intersection_count(saliency)
+             == (self.ground_truth_features
+                 & self.saliency_features).sum(axis=(1, 2))).all())
+        self.assertTrue(
+            (ground_truth.union_count(saliency)
+             == (self.ground_truth_features
+                 | self.saliency_features).sum(axis=(1, 2))).all())
+
+    def test_rle_scoring(self):
+        """Tests scoring functions and shared interest on RLE masks."""
+        ground_truth = RLEMask.encode(self.ground_truth_features)
+        saliency = RLEMask.encode(self.saliency_features)
+        with np.errstate(invalid='ignore'):
+            for score_function in [iou_coverage, saliency_coverage,
+                                   ground_truth_coverage]:
+                expected_scores = score_function(self.ground_truth_features,
+                                                 self.saliency_features)
+                scores = score_function(ground_truth, saliency)
+                self.assertTrue(np.allclose(scores, expected_scores,
+                                            equal_nan=True))
+            scores = shared_interest(ground_truth, saliency, score='all')
+            for name, values in scores.items():
+                expected_scores = shared_interest(self.ground_truth_features,
+                                                  self.saliency_features,
+                                                  score=name)
+                self.assertTrue(np.allclose(values, expected_scores,
+                                            equal_nan=True))
+
+        # RLE masks can be split into shards and scored in parallel.
+        scores = shared_interest(ground_truth[:3], saliency[:3], workers=2)
+        self.assertTrue(np.allclose(scores, iou_coverage(
+            self.ground_truth_features[:3], self.saliency_features[:3])))
+
+
+if __name__ == '__main__':
+    unittest.main()
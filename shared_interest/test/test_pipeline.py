@@ -0,0 +1,81 @@
+"""Tests for the overlapped evaluation pipeline."""
+
+import time
+import unittest
+import numpy as np
+
+from shared_interest.pipeline import evaluate, run_pipeline
+from shared_interest.shared_interest import shared_interest
+from shared_interest.util import binarize_std, flatten
+
+
+class TestPipeline(unittest.TestCase):
+    """Tests for run_pipeline and evaluate."""
+
+    def test_evaluate(self):
+        """Tests that pipelined scores equal serial scores."""
+        random_state = np.random.RandomState(0)
+        batches = [(random_state.rand(4, 3, 10, 10),
+                    (random_state.rand(4, 10, 10) > 0.5).astype(int),
+                    np.arange(4)) for _ in range(5)]
+        scores, stats = evaluate(batches, lambda images, labels: images * 2,
+                                 score='all', preprocess=binarize_std)
+        images, ground_truth, _ = [np.concatenate(arrays)
+                                   for arrays in zip(*batches)]
+        expected = shared_interest(ground_truth,
+                                   binarize_std(flatten(images * 2)),
+                                   score='all')
+        for name, values in expected.items():
+            self.assertTrue(np.allclose(scores[name], values))
+        self.assertListEqual(list(stats),
+                             ['load', 'saliency', 'preprocess', 'score'])
+        for stage in stats.values():
+            self.assertEqual(stage['items'], 5)
+
+    def test_overlap(self):
+        """Tests that the stages run concurrently."""
+        def slow(item):
+            time.sleep(0.02)
+            return item
+
+        start = time.perf_counter()
+        results, stats = run_pipeline(range(10), [('a', slow), ('b', slow),
+                                                  ('c', slow)])
+        wall_time = time.perf_counter() - start
+        self.assertListEqual(results, list(range(10)))
+        busy_time = sum(stage['seconds'] for stage in stats.values())
+        self.assertLess(wall_time, 0.8 * busy_time)
+
+    def test_backpressure(self):
+        """Tests that the source cannot run ahead of a slow consumer."""
+        produced, consumed = [], []
+
+        def source():
+            for item in range(20):
+                produced.append(item)
+                yield item
+
+        def slow(item):
+            consumed.append(item)
+            time.sleep(0.005)
+            # The source thread holds one item, and one queue holds at most
+            # queue_size items.
+            self.assertLessEqual(len(produced) - len(consumed), 2)
+            return item
+
+        results, _ = run_pipeline(source(), [('slow', slow)], queue_size=1)
+        self.assertEqual(len(results), 20)
+
+    def test_error_propagation(self):
+        """Tests that a failing stage stops the pipeline and raises."""
+        def fail(item):
+            if item == 3:
+                raise KeyError(item)
+            return item
+
+        with self.assertRaises(KeyError):
+            run_pipeline(range(100), [('fail', fail), ('next', lambda x: x)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""Tests for the score store."""
+
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from shared_interest.score_store import ScoreStore
+
+
+class TestScoreStore(unittest.TestCase):
+    """Tests for ScoreStore."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = ScoreStore(self.directory.name)
+        self.image_ids = ['a', 'b', 'c', 'd']
+        self.labels = ['n01', 'n01', 'n02', 'n02']
+        self.predictions = ['n01', 'n02', 'n02', 'n01']
+        self.scores = {'iou_coverage': np.array([0.5, 0.1, 0.9, 0.3]),
+                       'ground_truth_coverage': np.array([0.6, 0.2, 1.0, 0.4]),
+                       'saliency_coverage': np.array([0.7, 0.3, 0.8, 0.5])}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_write_and_query(self):
+        """Tests appending rows and querying them."""
+        self.store.write(self.image_ids, self.labels, self.predictions,
+                         'gradients', self.scores)
+        self.store.write(self.image_ids, self.labels, self.predictions,
+                         'integrated_gradients',
+                         {name: values / 2
+                          for name, values in self.scores.items()})
+        self.assertEqual(len(self.store), 8)
+
+        lowest = self.store.lowest('iou_coverage', k=2, label='n01',
+                                   method='gradients')
+        self.assertListEqual(lowest['image_id'].tolist(), ['b', 'a'])
+        self.assertTrue(np.allclose(lowest['iou_coverage'], [0.1, 0.5]))
+
+        highest = self.store.highest('ground_truth_coverage', k=3)
+        self.assertListEqual(highest['image_id'].tolist(), ['c', 'a', 'c'])
+        self.assertListEqual(highest['method'].tolist(),
+                             ['gradients', 'gradients',
+                              'integrated_gradients'])
+
+        rows = self.store.rows(method='gradients', correct=False)
+        self.assertListEqual(self.store.records(rows)['image_id'].tolist(),
+                             ['b', 'd'])
+        self.assertEqual(len(self.store.rows(label='n03')), 0)
+
+    def test_incremental_update(self):
+        """Tests that rewriting an image and method updates it in place."""
+        self.store.write(self.image_ids, self.labels, self.predictions,
+                         'gradients', self.scores)
+        self.store.lowest('iou_coverage', label='n02')  # builds the indexes
+        self.store.write(['b', 'e'], ['n01', 'n03'], ['n01', 'n03'],
+                         'gradients',
+                         {name: np.array([0.95, 0.05])
+                          for name in self.scores})
+
+        store = ScoreStore(self.directory.name)
+        self.assertEqual(len(store), 5)
+        records = store.records(store.rows(label='n01'))
+        self.assertListEqual(records['image_id'].tolist(), ['a', 'b'])
+        self.assertTrue(np.allclose(records['iou_coverage'], [0.5, 0.95]))
+        self.assertListEqual(
+            store.lowest('iou_coverage', k=1)['image_id'].tolist(), ['e'])
+        self.assertListEqual(
+            store.lowest('iou_coverage', label='n03')['image_id'].tolist(),
+            ['e'])
+
+        with self.assertRaises(ValueError):
+            store.write(['f'], ['n01'], ['n01'], 'gradients',
+                        {'iou_coverage': [0.5]})
+
+    def test_saved_indexes(self):
+        """Tests that queries never write and saved indexes are reused."""
+        manifest_file = os.path.join(self.directory.name, 'manifest.json')
+        for i, image_id in enumerate(self.image_ids):
+            self.store.write([image_id], [self.labels[i]],
+                             [self.predictions[i]], 'gradients',
+                             {name: values[i:i + 1]
+                              for name, values in self.scores.items()})
+        with open(manifest_file) as f:
+            manifest = f.read()
+        self.assertListEqual(self.store.rows(label='n02').tolist(), [2, 3])
+        with open(manifest_file) as f:
+            self.assertEqual(f.read(), manifest)
+
+        self.store.save_indexes()
+        store = ScoreStore(self.directory.name)
+        self.assertListEqual(store.rows(label='n02').tolist(), [2, 3])
+        self.assertListEqual(store.vocabulary('image_id').tolist(),
+                             self.image_ids)
+        store.write(['c', 'e'], ['n02', 'n02'], ['n02', 'n02'], 'gradients',
+                    {name: np.array([0.2, 0.4]) for name in self.scores})
+        self.assertListEqual(store.rows(label='n02').tolist(), [2, 3, 4])
+        self.assertEqual(len(store), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
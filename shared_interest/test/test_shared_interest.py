@@ -3,7 +3,9 @@
 import unittest
 import numpy as np
 
+from shared_interest import scoring_functions
 from shared_interest.shared_interest import shared_interest
+from shared_interest.util import binarize_std
 
 
 class TestSharedInterest(unittest.TestCase):
@@ -109,6 +111,40 @@ class TestSharedInterest(unittest.TestCase):
                 str(ground_truth_coverage_shared_interest)))
 
 
+    def test_shared_interest_multiple_scores(self):
+        """Tests computing several scores in one call."""
+        scores = shared_interest(self.ground_truth_features,
+                                 self.binary_saliency_features,
+                                 score='all')
+        self.assertSetEqual(set(scores), {'iou_coverage',
+                                          'ground_truth_coverage',
+                                          'saliency_coverage'})
+        for name, values in scores.items():
+            expected_scores = shared_interest(self.ground_truth_features,
+                                              self.binary_saliency_features,
+                                              score=name)
+            self.assertTrue(np.allclose(values, expected_scores),
+                            'Expected: %s got: %s' %(str(expected_scores),
+                                                     str(values)))
+
+        scores = shared_interest(self.ground_truth_features,
+                                 self.continuous_saliency_features,
+                                 score=['saliency_coverage'])
+        expected_scores = np.array([0.25, 0.25, 1.0, 0.0, 1.0])
+        self.assertListEqual(list(scores), ['saliency_coverage'])
+        self.assertTrue(np.allclose(scores['saliency_coverage'],
+                                    expected_scores))
+
+        with self.assertRaises(ValueError):
+            shared_interest(self.ground_truth_features,
+                            self.continuous_saliency_features,
+                            score='all')
+        with self.assertRaises(ValueError):
+            shared_interest(self.ground_truth_features,
+                            self.binary_saliency_features,
+                            score=['iou_coverage', 'score'])
+
+
     def test_shared_interest_invalid_inputs(self):
         """Tests shared interest on invalid inputs."""
         # Invalid score function
@@ -140,6 +176,77 @@ class TestSharedInterest(unittest.TestCase):
             shared_interest(self.continuous_saliency_features,
                             self.binary_saliency_features)
 
+    def test_registered_scoring_function(self):
+        """Tests registering a custom scoring function."""
+        @scoring_functions.register_scoring_function('saliency_size')
+        def saliency_size(ground_truth_features, saliency_features):
+            return np.sum(saliency_features, axis=(1, 2)).astype(float)
+
+        try:
+            scores = shared_interest(self.ground_truth_features,
+                                     self.binary_saliency_features,
+                                     score=['iou_coverage', 'saliency_size'])
+            expected_scores = self.binary_saliency_features.sum(axis=(1, 2))
+            self.assertTrue(np.allclose(scores['saliency_size'],
+                                        expected_scores))
+            self.assertIn('saliency_size',
+                          shared_interest(self.ground_truth_features,
+                                          self.binary_saliency_features,
+                                          score='all'))
+            with self.assertRaises(ValueError):
+                shared_interest(self.ground_truth_features,
+                                self.continuous_saliency_features,
+                                score='saliency_size')
+        finally:
+            del scoring_functions.SCORING_FUNCTIONS['saliency_size']
+
+    def test_validation(self):
+        """Tests the validation fast paths and opt-out."""
+        expected_scores = shared_interest(self.ground_truth_features,
+                                          self.binary_saliency_features)
+        scores = shared_interest(self.ground_truth_features.astype(bool),
+                                 self.binary_saliency_features.astype(float))
+        self.assertTrue(np.allclose(scores, expected_scores))
+        scores = shared_interest(self.ground_truth_features,
+                                 self.binary_saliency_features,
+                                 validate=False)
+        self.assertTrue(np.allclose(scores, expected_scores))
+
+        # Continuous values inside [0, 1] and NaNs are not binary.
+        with self.assertRaises(ValueError):
+            shared_interest(self.ground_truth_features,
+                            self.continuous_saliency_features)
+        with self.assertRaises(ValueError):
+            bad_saliency_region = self.binary_saliency_features.astype(float)
+            bad_saliency_region[0, 0, 0] = np.nan
+            shared_interest(self.ground_truth_features, bad_saliency_region)
+
+        # Negative integers and overwritten binarizer masks are not binary.
+        with self.assertRaises(ValueError):
+            bad_saliency_region = self.binary_saliency_features.copy()
+            bad_saliency_region[0, 0, 0] = -1
+            shared_interest(self.ground_truth_features, bad_saliency_region)
+        with self.assertRaises(ValueError):
+            bad_saliency_region = binarize_std(
+                self.continuous_saliency_features)
+            bad_saliency_region.fill(7)
+            shared_interest(self.ground_truth_features, bad_saliency_region)
+
+    def test_parallel_scoring(self):
+        """Tests that sharded scoring matches serial scoring."""
+        expected_scores = shared_interest(self.ground_truth_features,
+                                          self.binary_saliency_features,
+                                          score='all')
+        for workers in [2, 3, 8]:
+            scores = shared_interest(self.ground_truth_features,
+                                     self.binary_saliency_features,
+                                     score='all', workers=workers)
+            for name in expected_scores:
+                self.assertTrue((scores[name] == expected_scores[name]).all())
+        with self.assertRaises(ValueError):
+            shared_interest(self.ground_truth_features,
+                            self.continuous_saliency_features, workers=2)
+
 
 if __name__ == '__main__':
     unittest.main()
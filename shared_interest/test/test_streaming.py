@@ -0,0 +1,76 @@
+"""Tests for streaming Shared Interest."""
+
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from shared_interest.shared_interest import shared_interest
+from shared_interest.streaming import _iter_chunks, iter_shared_interest
+from shared_interest.streaming import streaming_shared_interest
+
+
+class TestStreamingSharedInterest(unittest.TestCase):
+    """Tests for streaming Shared Interest."""
+
+    def setUp(self):
+        random_state = np.random.RandomState(0)
+        self.shape = (23, 20, 20)
+        self.ground_truth_features = (random_state.rand(*self.shape)
+                                      > 0.5).astype(int)
+        self.saliency_features = (random_state.rand(*self.shape)
+                                  > 0.7).astype(int)
+
+    def test_array_inputs(self):
+        """Tests streaming over in-memory arrays."""
+        chunks = list(iter_shared_interest(self.ground_truth_features,
+                                           self.saliency_features,
+                                           chunk_size=5))
+        self.assertListEqual([len(chunk) for chunk in chunks], [5, 5, 5, 5, 3])
+
+        expected_scores = shared_interest(self.ground_truth_features,
+                                          self.saliency_features,
+                                          score='all')
+        scores = streaming_shared_interest(self.ground_truth_features,
+                                           self.saliency_features,
+                                           score='all', chunk_size=5)
+        for name in expected_scores:
+            self.assertTrue(np.allclose(scores[name], expected_scores[name]))
+
+    def test_file_and_iterable_inputs(self):
+        """Tests streaming over .npy files and iterables of batches."""
+        expected_scores = shared_interest(self.ground_truth_features,
+                                          self.saliency_features)
+        with tempfile.TemporaryDirectory() as directory:
+            ground_truth_file = os.path.join(directory, 'ground_truth.npy')
+            np.save(ground_truth_file, self.ground_truth_features)
+            saliency_batches = (self.saliency_features[i:i + 4]
+                                for i in range(0, self.shape[0], 4))
+            scores = streaming_shared_interest(ground_truth_file,
+                                               saliency_batches,
+                                               chunk_size=6)
+        self.assertIs(type(scores), np.ndarray)
+        self.assertTrue(np.allclose(scores, expected_scores),
+                        'Expected: %s got: %s' %(str(expected_scores),
+                                                 str(scores)))
+
+        # Chunks inside one batch are views of it rather than copies.
+        chunks = list(_iter_chunks(iter([self.saliency_features[:10],
+                                         self.saliency_features[10:]]), 6))
+        self.assertListEqual([len(chunk) for chunk in chunks], [6, 6, 6, 5])
+        self.assertTrue(np.shares_memory(chunks[0], self.saliency_features))
+        self.assertFalse(np.shares_memory(chunks[1], self.saliency_features))
+        self.assertTrue(np.shares_memory(chunks[2], self.saliency_features))
+        self.assertTrue((np.concatenate(chunks)
+                         == self.saliency_features).all())
+
+    def test_mismatched_inputs(self):
+        """Tests that inputs of different lengths raise an error."""
+        with self.assertRaises(ValueError):
+            streaming_shared_interest(self.ground_truth_features,
+                                      self.saliency_features[:-1],
+                                      chunk_size=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
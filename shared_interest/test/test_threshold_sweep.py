@@ -0,0 +1,52 @@
+"""Tests for threshold sweeps."""
+
+import unittest
+import numpy as np
+
+from shared_interest.shared_interest import shared_interest
+from shared_interest.threshold_sweep import percentile_sweep, sweep_auc
+from shared_interest.util import binarize_percentile
+
+
+class TestPercentileSweep(unittest.TestCase):
+    """Tests for percentile_sweep."""
+
+    def setUp(self):
+        random_state = np.random.RandomState(0)
+        self.shape = (6, 30, 20)
+        self.ground_truth_features = np.zeros(self.shape, dtype=int)
+        self.ground_truth_features[:, 5:20, 5:15] = 1
+        self.saliency_features = random_state.rand(*self.shape)
+        self.saliency_features[1, 10:15] = 0.5  # ties
+        self.saliency_features[2] = 0.3         # constant map
+        self.percentiles = np.linspace(0, 1, 11)
+
+    def test_matches_binarize_percentile(self):
+        """Tests the sweep against binarizing and scoring each percentile."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scores = percentile_sweep(self.ground_truth_features,
+                                      self.saliency_features, self.percentiles,
+                                      score='all')
+        for name, values in scores.items():
+            self.assertTupleEqual(values.shape, (self.shape[0],
+                                                 len(self.percentiles)))
+            for j, percentile in enumerate(self.percentiles):
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    expected_scores = shared_interest(
+                        self.ground_truth_features,
+                        binarize_percentile(self.saliency_features, percentile),
+                        score=name)
+                self.assertTrue(
+                    np.allclose(values[:, j], expected_scores, equal_nan=True),
+                    'Expected: %s got: %s' %(str(expected_scores),
+                                             str(values[:, j])))
+
+    def test_sweep_auc(self):
+        """Tests the area under constant score curves."""
+        scores = np.array([[1.0, 1.0, 1.0], [0.0, 0.5, 1.0]])
+        self.assertTrue(np.allclose(sweep_auc(scores, [0, 0.5, 1]),
+                                    [1.0, 0.5]))
+
+
+if __name__ == '__main__':
+    unittest.main()
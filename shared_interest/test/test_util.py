@@ -0,0 +1,59 @@
+"""Tests for utility functions."""
+
+import unittest
+import numpy as np
+
+from shared_interest.util import binarize, binarize_percentile, binarize_std
+from shared_interest.util import flatten
+
+
+class TestBinarize(unittest.TestCase):
+    """Tests for the fused binarize."""
+
+    def setUp(self):
+        random_state = np.random.RandomState(0)
+        self.batch = random_state.randn(6, 3, 30, 40)
+        self.batch[2] = 1.0  # constant map
+
+    def test_matches_binarizers(self):
+        """Tests binarize against flatten followed by the binarizers."""
+        saliency = flatten(self.batch)
+        for dtype in ['float32', 'float64']:
+            for percentile in [0.0, 0.5, 0.9, 1.0]:
+                with np.errstate(invalid='ignore'):
+                    expected_mask = binarize_percentile(saliency, percentile)
+                mask = binarize(self.batch, percentile=percentile, dtype=dtype)
+                self.assertEqual(mask.dtype, np.uint8)
+                self.assertTrue((mask == expected_mask).all())
+            for num_std in [0, 1, 2]:
+                with np.errstate(invalid='ignore'):
+                    expected_mask = binarize_std(saliency, num_std)
+                mask = binarize(self.batch, num_std=num_std, dtype=dtype)
+                self.assertTrue((mask == expected_mask).all())
+
+    def test_out_buffer(self):
+        """Tests writing the mask into a preallocated buffer."""
+        out = np.empty((6, 30, 40), dtype=bool)
+        mask = binarize(self.batch, percentile=0.9, out=out)
+        self.assertIs(mask, out)
+        self.assertTrue((mask == binarize(self.batch, percentile=0.9)).all())
+        with self.assertRaises(ValueError):
+            binarize(self.batch)
+
+    def test_parallel_binarize(self):
+        """Tests that sharded binarization matches serial binarization."""
+        saliency = flatten(np.delete(self.batch, 2, axis=0))
+        self.assertTrue((binarize_percentile(saliency, 0.7, workers=4)
+                         == binarize_percentile(saliency, 0.7)).all())
+        self.assertTrue((binarize_std(saliency, 1, workers=4)
+                         == binarize_std(saliency, 1)).all())
+        self.assertTrue((binarize(self.batch, num_std=1, workers=4)
+                         == binarize(self.batch, num_std=1)).all())
+        out = np.zeros((len(self.batch),) + self.batch.shape[2:],
+                       dtype=np.uint8)
+        self.assertIs(binarize(self.batch, num_std=1, out=out, workers=4), out)
+        self.assertTrue((out == binarize(self.batch, num_std=1)).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
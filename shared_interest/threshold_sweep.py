@@ -0,0 +1,105 @@
+"""Shared Interest scores across many saliency binarization thresholds."""
+
+import numpy as np
+
+from shared_interest import backend
+from shared_interest import scoring_functions
+from shared_interest.shared_interest import _convert_to_numpy, _is_binary
+from shared_interest.shared_interest import _score_names
+from shared_interest.util import normalize_0to1
+
+
+@backend.accepts_tensors
+def percentile_sweep(ground_truth_features, saliency_features, percentiles,
+                     score='iou_coverage'):
+    """
+    Returns the Shared Interest scores of the saliency binarized at each of
+        the given percentiles. The result for percentile p equals
+        shared_interest(ground_truth_features,
+                        util.binarize_percentile(saliency_features, p)),
+        but each saliency map is sorted once and the scores of every threshold
+        are read from cumulative sums of the ground truth in saliency order.
+
+    Args:
+    ground_truth_features: A binary array of size (batch_size, height, width)
+        representing the ground truth features.
+    saliency_features: A continuous array of size (batch_size, height, width)
+        representing the saliency features.
+    percentiles: A sequence of num_thresholds floats in range 0 to 1, as used
+        by util.binarize_percentile.
+    score: A score name, a list of score names, or 'all'. See shared_interest.
+
+    Raises:
+        ValueError if score is not a valid scoring function.
+        ValueError if ground_truth_features is not binary.
+
+    Returns:
+    A numpy array of size (batch_size, num_thresholds) of shared interest
+        scores. If score is a list or 'all', a dictionary mapping each score
+        name to its numpy array of size (batch_size, num_thresholds).
+    """
+    ground_truth_features = _convert_to_numpy(ground_truth_features)
+    saliency_features = _convert_to_numpy(saliency_features)
+    score_names = _score_names(score)
+    if not _is_binary(ground_truth_features):
+        raise ValueError('ground_truth_features must be binary array.')
+    if ground_truth_features.shape != saliency_features.shape:
+        raise ValueError('ground_truth_features and saliency_features must \
+                         be the same shape.')
+    percentiles = np.atleast_1d(np.asarray(percentiles, dtype=np.float64))
+
+    # Sort each saliency map once and carry the ground truth along with it.
+    batch_size = saliency_features.shape[0]
+    normalized = normalize_0to1(saliency_features).reshape(batch_size, -1)
+    order = np.argsort(normalized, axis=1)
+    sorted_saliency = np.take_along_axis(normalized, order, axis=1)
+    sorted_ground_truth = np.take_along_axis(
+        ground_truth_features.reshape(batch_size, -1), order, axis=1)
+    del order, normalized
+
+    # ground_truth_suffix[i, k] is the ground truth size among the features of
+    # instance i whose saliency rank is at least k.
+    num_features = sorted_saliency.shape[1]
+    ground_truth_suffix = np.zeros((batch_size, num_features + 1))
+    np.cumsum(sorted_ground_truth[:, ::-1], axis=1,
+              out=ground_truth_suffix[:, num_features - 1::-1])
+
+    # Features at or above the threshold are exactly the top of the sort.
+    thresholds = np.percentile(sorted_saliency, percentiles * 100, axis=1).T
+    first_selected = np.empty(thresholds.shape, dtype=np.int64)
+    for i in range(batch_size):
+        first_selected[i] = np.searchsorted(sorted_saliency[i], thresholds[i])
+    first_selected[np.isnan(thresholds)] = num_features
+
+    intersection = np.take_along_axis(ground_truth_suffix, first_selected,
+                                      axis=1)
+    ground_truth_size = np.broadcast_to(ground_truth_suffix[:, :1],
+                                        intersection.shape)
+    saliency_mass = (num_features - first_selected).astype(np.float64)
+    statistics = {'intersection': intersection,
+                  'union': ground_truth_size + saliency_mass - intersection,
+                  'ground_truth_size': ground_truth_size,
+                  'saliency_mass': saliency_mass}
+
+    results = scoring_functions._scores_from_statistics(statistics,
+                                                        score_names)
+    if isinstance(score, str) and score != 'all':
+        return results[score]
+    return results
+
+
+def sweep_auc(scores, percentiles):
+    """
+    Returns the area under each instance's score curve from percentile_sweep,
+        computed with the trapezoidal rule over the percentiles.
+
+    Args:
+    scores: A numpy array of size (batch_size, num_thresholds) of scores.
+    percentiles: The sequence of num_thresholds percentiles the scores were
+        computed at, in increasing order.
+
+    Returns: A numpy array of size (batch_size) of areas under the curves.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    widths = np.diff(np.asarray(percentiles, dtype=np.float64))
+    return np.sum((scores[:, 1:] + scores[:, :-1]) / 2 * widths, axis=1)
@@ -2,7 +2,13 @@
 
 import numpy as np
 
+from shared_interest import backend
+from shared_interest import instrumentation
+from shared_interest import parallel
+from shared_interest.masks import PackedMask
 
+
+@backend.accepts_tensors
 def flatten(batch):
     """
     Flattens saliency by summing the channel dimension.
@@ -16,6 +22,7 @@ def flatten(batch):
     return np.sum(batch, axis=1)
 
 
+@backend.accepts_tensors
 def normalize_0to1(batch):
     """
     Normalize a batch such that every value is in the range 0 to 1.
@@ -33,7 +40,8 @@ def normalize_0to1(batch):
     return normalized_batch
 
 
-def binarize_percentile(batch, percentile):
+@backend.accepts_tensors
+def binarize_percentile(batch, percentile, packed=False, workers=None):
     """
     Creates binary mask by thresholding at percentile.
 
@@ -41,17 +49,29 @@ def binarize_percentile(batch, percentile):
     batch: 4D numpy array (batch, height, width).
     percentile: float in range 0 to 1. Values above the percentile value are 
         set to 1. Values below the percentile value are set to 0.
+    packed: If True, returns the mask as a PackedMask. Defaults to False.
+    workers: None or the number of threads to binarize shards of the batch on.
+        Defaults to None.
 
-    Returns: A 4D numpy array with dtype uint8 with all values set to 0 or 1.
+    Returns: A 4D numpy array with dtype uint8 with all values set to 0 or 1,
+        or a PackedMask if packed is True.
     """
-    batch_size = batch.shape[0]
-    batch_normalized = normalize_0to1(batch)
-    percentile = np.percentile(batch_normalized, percentile * 100, axis=(1, 2)).reshape(batch_size, 1, 1)
-    binary_mask = (batch_normalized >= percentile).astype('uint8')
-    return binary_mask
-
-
-def binarize_std(batch, num_std=1):
+    if workers is not None and workers > 1:
+        return parallel.map_shards(binarize_percentile, [batch], workers,
+                                   percentile=percentile, packed=packed)
+    with instrumentation.stage('util.binarize_percentile', batch):
+        batch_size = batch.shape[0]
+        batch_normalized = normalize_0to1(batch)
+        percentile = np.percentile(batch_normalized, percentile * 100,
+                                   axis=(1, 2)).reshape(batch_size, 1, 1)
+        binary_mask = batch_normalized >= percentile
+        if packed:
+            return PackedMask.pack(binary_mask)
+        return binary_mask.astype('uint8')
+
+
+@backend.accepts_tensors
+def binarize_std(batch, num_std=1, packed=False, workers=None):
     """
     Creates binary mask by thresholding at num_std standard deviations above
     the mean.
@@ -60,13 +80,118 @@ def binarize_std(batch, num_std=1):
     batch: 3D numpy array (batch, height, width).
     num_std: int in range 0 to 3. Values above the (mean + num_std * std) value
         are set to 1. Values below are set to 0.
+    packed: If True, returns the mask as a PackedMask. Defaults to False.
+    workers: None or the number of threads to binarize shards of the batch on.
+        Defaults to None.
 
-    Returns: A 3D numpy array with dtype uint8 with all values set to 0 or 1.
+    Returns: A 3D numpy array with dtype uint8 with all values set to 0 or 1,
+        or a PackedMask if packed is True.
+    """
+    if workers is not None and workers > 1:
+        return parallel.map_shards(binarize_std, [batch], workers,
+                                   num_std=num_std, packed=packed)
+    with instrumentation.stage('util.binarize_std', batch):
+        batch_size = batch.shape[0]
+        batch_normalized = normalize_0to1(batch)
+        mean = np.mean(batch_normalized, axis=(1, 2)).reshape(batch_size, 1, 1)
+        std = np.std(batch_normalized, axis=(1, 2)).reshape(batch_size, 1, 1)
+        threshold = mean + num_std * std
+        binary_mask = batch_normalized >= threshold
+        if packed:
+            return PackedMask.pack(binary_mask)
+        return binary_mask.astype('uint8')
+
+
+@backend.accepts_tensors
+def binarize(batch, percentile=None, num_std=None, dtype='float64', out=None,
+             packed=False, workers=None):
+    """
+    Creates binary mask from raw saliency in one fused pass. Equivalent to
+    binarize_percentile(flatten(batch), percentile) or
+    binarize_std(flatten(batch), num_std) in the default float64 precision,
+    but the threshold is found on the raw values, so no normalized copy is
+    made, and the percentile is found by O(n) selection into a single
+    reusable row buffer instead of a full percentile computation.
+
+    Args:
+    batch: 4D numpy array (batch, channels, height, width) or 3D numpy array
+        (batch, height, width) of raw saliency.
+    percentile: float in range 0 to 1, as in binarize_percentile. Exactly one
+        of percentile and num_std must be given.
+    num_std: number of standard deviations, as in binarize_std.
+    dtype: the working precision of the channel sum and thresholds. float32
+        halves the working memory, but features within rounding of the
+        threshold can then be selected differently than by the other
+        binarizers. Defaults to float64.
+    out: None or a uint8 or bool numpy array (batch, height, width) that the
+        mask is written into. Defaults to None.
+    packed: If True, returns the mask as a PackedMask. Defaults to False.
+    workers: None or the number of threads to binarize shards of the batch on.
+        Defaults to None.
+
+    Returns: A 3D numpy array with dtype uint8 with all values set to 0 or 1,
+        out if it was given, or a PackedMask if packed is True.
+    """
+    if (percentile is None) == (num_std is None):
+        raise ValueError('Exactly one of percentile and num_std must be given.')
+    batch = np.asarray(batch)
+    if workers is not None and workers > 1:
+        mask = out
+        if mask is None:
+            mask = np.empty(batch.shape[:1] + batch.shape[-2:], dtype=np.uint8)
+        parallel.map_shards(
+            lambda batch, out: binarize(batch, percentile=percentile,
+                                        num_std=num_std, dtype=dtype, out=out),
+            [batch, mask], workers, collect=False)
+        if packed:
+            return PackedMask.pack(mask)
+        return mask
+    with instrumentation.stage('util.binarize', batch):
+        if batch.ndim == 4:
+            saliency = np.sum(batch, axis=1, dtype=dtype)
+        else:
+            saliency = np.asarray(batch, dtype=dtype)
+        batch_size = saliency.shape[0]
+        flat = saliency.reshape(batch_size, -1)
+
+        if percentile is not None:
+            thresholds, valid = _percentile_thresholds(flat, percentile)
+        else:
+            mean = np.mean(flat, axis=1)
+            std = np.std(flat, axis=1)
+            thresholds, valid = mean + num_std * std, std > 0
+
+        mask = out
+        if mask is None:
+            mask = np.empty(saliency.shape, dtype=np.uint8)
+        np.greater_equal(saliency, thresholds.reshape(batch_size, 1, 1),
+                         out=mask)
+        # Constant maps normalize to NaN, which the other binarizers never
+        # select.
+        mask[~valid] = 0
+        if packed:
+            return PackedMask.pack(mask)
+        return mask
+
+
+def _percentile_thresholds(flat, percentile):
+    """
+    Returns the per-row percentile of a 2D array, interpolated linearly like
+    np.percentile, and whether each row is non-constant.
     """
-    batch_size = batch.shape[0]
-    batch_normalized = normalize_0to1(batch)
-    mean = np.mean(batch_normalized, axis=(1, 2)).reshape(batch_size, 1, 1)
-    std = np.std(batch_normalized, axis=(1, 2)).reshape(batch_size, 1, 1)
-    threshold = mean + num_std * std
-    binary_mask = (batch_normalized >= threshold).astype('uint8')
-    return binary_mask
\ No newline at end of file
+    num_features = flat.shape[1]
+    position = percentile * (num_features - 1)
+    lower = int(np.floor(position))
+    upper = min(lower + 1, num_features - 1)
+    fraction = position - lower
+    kth = sorted({0, lower, upper, num_features - 1})
+
+    thresholds = np.empty(flat.shape[0], dtype=flat.dtype)
+    valid = np.empty(flat.shape[0], dtype=bool)
+    row = np.empty(num_features, dtype=flat.dtype)
+    for i in range(flat.shape[0]):
+        row[:] = flat[i]
+        row.partition(kth)
+        thresholds[i] = row[lower] + (row[upper] - row[lower]) * fraction
+        valid[i] = row[-1] > row[0]
+    return thresholds, valid